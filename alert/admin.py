@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.http import HttpRequest
-from alert.models import stra_Alert, Strategy, Merchant, User, Exchange, ContractCode, OrderRecord, TimeCycle
+from alert.models import stra_Alert, Strategy, Merchant, User, Exchange, ContractCode, OrderRecord, TimeCycle, FillRecord
 from django.contrib.auth.admin import UserAdmin
 import logging
 from import_export.admin import ImportExportModelAdmin, ExportActionModelAdmin
@@ -366,3 +366,22 @@ class OrderRecordAdmin(admin.ModelAdmin):
     formatted_filled_time.admin_order_field = 'filled_time'
 
 admin.site.register(OrderRecord, OrderRecordAdmin)
+
+
+@admin.register(FillRecord)
+class FillRecordAdmin(admin.ModelAdmin):
+    """成交明细只读界面"""
+    list_display = ['coin', 'oid', 'cloid', 'side', 'price', 'size', 'fee', 'fee_token', 'direction', 'fill_time']
+    list_filter = ['coin', 'side', 'direction']
+    search_fields = ['oid', 'cloid', 'coin']
+    list_per_page = 50
+    ordering = ('-fill_time',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
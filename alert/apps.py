@@ -7,5 +7,8 @@ class AlertConfig(AppConfig):
     verbose_name = '交易管理'
     
     def ready(self):
+        # 注册参考数据缓存的失效处理（post_save/post_delete）
+        import alert.core.ref_cache  # noqa: F401
+
         # 应用启动时初始化
         initialize_application()
\ No newline at end of file
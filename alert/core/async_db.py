@@ -1,13 +1,75 @@
+import copy
+import os
 import threading
+import uuid
 from queue import Queue, Empty
 import logging
-from django.db import transaction, DatabaseError
+from django.conf import settings
+from django.apps import apps
+from django.db import transaction, DatabaseError, InterfaceError, OperationalError
 import time
-import threading
+from alert.core.db_journal import WriteJournal
 
 logger = logging.getLogger(__name__)
 
+# OrderRecord 保存时记录的关键字段
+ORDER_RECORD_KEY_FIELDS = ('order_id', 'status', 'fee', 'filled_time', 'filled_quantity', 'filled_price', 'order_type')
+
+
+class PendingWrite:
+    """
+    待写入的数据
+    已有记录按 (模型, 主键) 合并：同一行的多次保存只保留每个字段的最新值，写入时只更新这些字段
+    """
+
+    def __init__(self, model_instance, fields, values, seq=None):
+        self.model_instance = model_instance
+        self.fields = fields    # 需要更新的字段名集合，新对象为 None
+        self.values = values    # 字段名 -> 入队时的值
+        self.seqs = [seq] if seq is not None else []    # 对应的预写日志序号
+
+    def merge(self, fields, values, seq=None):
+        """合并同一行的后续保存，后入队的值覆盖先入队的值"""
+        if seq is not None:
+            self.seqs.append(seq)
+        if self.fields is None:
+            # 尚未写入的新对象，写入时使用实例的最新值
+            return
+        self.fields |= fields
+        self.values.update(values)
+
+    def merge_older(self, fields, values, seq):
+        """合并从预写日志重放的更早的保存，已有的较新值不被覆盖"""
+        self.seqs.append(seq)
+        if self.fields is None:
+            return
+        self.fields |= fields
+        for name, value in values.items():
+            self.values.setdefault(name, value)
+
+    def build_instance(self):
+        """构造用于写入的对象副本，不修改调用方持有的实例；信号对象在这里生成数据库记录"""
+        if self.fields is None:
+            to_model = getattr(self.model_instance, 'to_model', None)
+            return to_model() if to_model is not None else self.model_instance
+        instance = copy.copy(self.model_instance)
+        instance._state = copy.copy(self.model_instance._state)
+        for field in instance._meta.concrete_fields:
+            if field.name in self.values:
+                setattr(instance, field.attname, self.values[field.name])
+        return instance
+
+
 class AsyncDatabaseHandler:
+    """
+    异步数据库写入
+    写入线程每个周期最多收集 batch_size 个对象或等待 batch_wait_ms 毫秒，在一个事务中提交：
+    新对象按模型 bulk_create，已有对象按 (模型, 字段) 分组 bulk_update；
+    同一行在写入前的多次保存合并为一次只更新相关字段的写入；
+    批量提交失败时逐个保存，避免一条坏数据拖垮整批；
+    启用预写日志时每次保存先追加到本地日志，按 journal_sync 设置落盘，重启后重放未写入的记录，
+    内存中待写入的行数超过 max_pending 时新的保存只保留在日志中，等队列空闲后再从日志加载
+    """
     _instance = None
     _lock = threading.Lock()
 
@@ -19,97 +81,493 @@ class AsyncDatabaseHandler:
 
     def __init__(self):
         if not hasattr(self, 'initialized'):
+            config = getattr(settings, 'ASYNC_DB_CONFIG', {})
+            self.batch_size = config.get('batch_size', 100)
+            self.batch_wait = config.get('batch_wait_ms', 50) / 1000
+            self.verify_writes = config.get('verify_writes', False)
+            self.max_pending = config.get('max_pending', 10000)
+
+            # 队列中只放写入键，数据保存在 _pending 中，写入前同一键的保存会被合并
             self.save_queue = Queue()
+            self._pending = {}
+            self._pending_lock = threading.Lock()
             self._should_run = True
+
+            # 预写日志：_live_seqs 为已加载到内存（等待或正在写入）的记录序号
+            self.journal = None
+            self._live_seqs = set()
+            self._needs_replay = False
+            if config.get('journal_enabled', True):
+                journal_path = config.get('journal_path') or os.path.join(settings.BASE_DIR, 'data', 'async_db.journal')
+                try:
+                    self.journal = WriteJournal(journal_path,
+                                                sync_mode=config.get('journal_sync', 'interval'),
+                                                sync_interval=config.get('journal_sync_interval_ms', 20) / 1000,
+                                                compact_bytes=config.get('journal_compact_mb', 8) * 1024 * 1024)
+                    self._needs_replay = self.journal.outstanding > 0
+                except OSError as e:
+                    logger.error(f"无法打开数据库预写日志 {journal_path}，仅使用内存队列: {str(e)}")
             self.initialized = True
-            
+
             # 启动数据库处理线程
             self.processing_thread = threading.Thread(target=self._process_saves,
                                                    name="AsyncDBHandler")
             self.processing_thread.daemon = True
             self.processing_thread.start()
-            
-            logger.info("数据库处理线程已启动")
 
-    def async_save(self, model_instance):
-        """异步保存数据库对象"""
+            logger.info(f"数据库处理线程已启动 (批量大小: {self.batch_size}, 批量等待: {self.batch_wait * 1000:.0f}毫秒)")
+
+    def async_save(self, model_instance, update_fields=None):
+        """
+        异步保存数据库对象
+        :param model_instance: 模型实例，或提供 to_model() 的对象（如 SignalEnvelope，由写入线程生成新记录）
+        :param update_fields: 已有记录需要更新的字段，None 表示所有字段；新对象忽略此参数
+                              支持变更跟踪的模型只写入实际变化的字段，没有变化时不写入
+        """
         if not self._should_run:
             logger.warning("数据库处理器已停止，无法保存新数据")
             return False
 
         try:
-            self.save_queue.put(model_instance, timeout=5)
-            logger.debug(f"数据已加入保存队列: {model_instance.__class__.__name__}")
+            seq, key = self._enqueue(model_instance, update_fields)
+            self._wait_durable(seq)
+            if key is not None:
+                self.save_queue.put(key, timeout=5)
+                logger.debug(f"数据已加入保存队列: {model_instance.__class__.__name__}")
             return True
         except Exception as e:
             logger.error(f"添加到保存队列时出错: {str(e)}")
             return False
 
+    def async_save_many(self, model_instances):
+        """
+        异步保存一组数据库对象
+        所有对象连续放入队列，通常在同一个批次中写入（新对象为一次 bulk_create）；journal_sync 为 always 时只等待一次落盘
+        :return: 每个对象是否成功加入队列的列表
+        """
+        if not self._should_run:
+            logger.warning("数据库处理器已停止，无法保存新数据")
+            return [False] * len(model_instances)
+
+        results = []
+        keys = []
+        last_seq = None
+        for model_instance in model_instances:
+            try:
+                seq, key = self._enqueue(model_instance)
+                if seq is not None:
+                    last_seq = seq
+                if key is not None:
+                    keys.append(key)
+                results.append(True)
+            except Exception as e:
+                logger.error(f"添加到保存队列时出错: {str(e)}")
+                results.append(False)
+
+        try:
+            self._wait_durable(last_seq)
+            for key in keys:
+                self.save_queue.put(key, timeout=5)
+            logger.debug(f"{len(keys)} 个对象已加入保存队列")
+        except Exception as e:
+            logger.error(f"添加到保存队列时出错: {str(e)}")
+            return [False] * len(model_instances)
+        return results
+
+    def _wait_durable(self, seq):
+        """journal_sync 为 always 时等待预写日志落盘后再返回，其他方式由日志的后台线程定期落盘"""
+        if seq is not None and self.journal.sync_mode == 'always':
+            self.journal.sync(seq)
+
+    def _enqueue(self, model_instance, update_fields=None):
+        """
+        追加预写日志并登记待写入数据，不等待落盘
+        :return: (日志序号, 需要放入队列的写入键)；没有日志时序号为 None，合并到已有写入或暂存于日志时写入键为 None
+        """
+        model = model_instance.__class__
+        if self._is_new(model_instance):
+            # 新对象用实例上的令牌合并多次保存，重放预写日志时也使用同一个键
+            key = ('new', self._save_token(model_instance))
+            fields = None
+            values = {}
+        else:
+            key = (model._meta.label, model_instance.pk)
+            dirty = self._dirty_fields(model_instance, update_fields)
+            if dirty is not None:
+                if not dirty:
+                    logger.debug(f"{model.__name__}(id={model_instance.pk}) 没有变化的字段，跳过保存")
+                    return None, None
+                update_fields = dirty
+            fields = self._update_fields(model_instance, update_fields)
+            # 记录入队时的字段值，之后调用方继续修改实例不影响本次写入
+            values = {
+                field.name: getattr(model_instance, field.attname)
+                for field in model._meta.concrete_fields if field.name in fields
+            }
+
+        with self._pending_lock:
+            # 在锁内追加日志，保证日志中同一行的记录顺序与合并顺序一致
+            seq = self._journal_append(model_instance, key, fields, values)
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending.merge(fields, values, seq)
+                self._track_seq(seq)
+                logger.debug(f"合并待保存数据: {model.__name__}(id={getattr(model_instance, 'pk', None)})，字段: {sorted(pending.fields or ())}")
+                return seq, None
+            if seq is not None and len(self._pending) >= self.max_pending:
+                # 内存中待写入的数据过多（通常是数据库不可用），只保留在日志中
+                self._needs_replay = True
+                logger.warning(f"待写入数据超过 {self.max_pending} 条，{model.__name__} 暂存于预写日志")
+                return seq, None
+            self._pending[key] = PendingWrite(model_instance, fields, values, seq)
+            self._track_seq(seq)
+            return seq, key
+
+    @staticmethod
+    def _is_new(model_instance):
+        """是否需要新增记录；提供 to_model() 的对象总是新增"""
+        if hasattr(model_instance, 'to_model'):
+            return True
+        return model_instance.pk is None or model_instance._state.adding
+
+    @staticmethod
+    def _save_token(model_instance):
+        """新对象的写入键令牌，保存在对象上，同一对象的多次保存使用同一个令牌"""
+        if hasattr(model_instance, 'save_token'):
+            if not model_instance.save_token:
+                model_instance.save_token = uuid.uuid4().hex
+            return model_instance.save_token
+        return model_instance.__dict__.setdefault('_async_save_token', uuid.uuid4().hex)
+
+    def _journal_append(self, model_instance, key, fields, values):
+        """
+        追加一条预写日志记录（调用方持有 _pending_lock）
+        :return: 记录序号，未启用日志时返回 None
+        """
+        if self.journal is None:
+            return None
+        if hasattr(model_instance, 'to_model'):
+            return self.journal.append(model_instance.MODEL_LABEL, list(key), None, None,
+                                       model_instance.field_values())
+        model = model_instance.__class__
+        if fields is None:
+            # 新对象记录所有字段的当前值
+            values = {field.name: getattr(model_instance, field.attname)
+                      for field in model._meta.concrete_fields
+                      if not (field.primary_key and model_instance.pk is None)}
+        return self.journal.append(model._meta.label, list(key), model_instance.pk, fields, values)
+
+    def _track_seq(self, seq):
+        if seq is not None:
+            self._live_seqs.add(seq)
+
+    def _release_seqs(self, seqs, done):
+        """
+        写入结束后释放日志序号
+        :param done: True 表示已写入（或无法写入而放弃），标记为完成；False 表示保留在日志中等待重放
+        """
+        if self.journal is None or not seqs:
+            return
+        with self._pending_lock:
+            self._live_seqs.difference_update(seqs)
+            if not done:
+                self._needs_replay = True
+        if done:
+            self.journal.mark_done(seqs)
+
+    @staticmethod
+    def _instance_from_record(record):
+        """根据预写日志记录构造模型实例和字段值"""
+        model = apps.get_model(record['model'])
+        fields_by_name = {field.name: field for field in model._meta.concrete_fields}
+        values = {name: fields_by_name[name].to_python(value)
+                  for name, value in record['values'].items() if name in fields_by_name}
+        instance = model()
+        for name, value in values.items():
+            setattr(instance, fields_by_name[name].attname, value)
+        if record['fields'] is None:
+            instance._async_save_token = record['key'][1]
+            if hasattr(instance, 'save_token') and not instance.save_token:
+                instance.save_token = record['key'][1]
+            return instance, None, {}
+        instance.pk = fields_by_name[model._meta.pk.name].to_python(record['pk'])
+        instance._state.adding = False
+        return instance, set(record['fields']), values
+
+    @staticmethod
+    def _committed_tokens(records):
+        """
+        查询新增记录中已经写入数据库的写入键
+        事务提交后、完成标记写入日志前崩溃时，这些记录会被重放；模型有 save_token 字段时按写入键去重，避免重复新增
+        :return: {(模型标签, 写入键), ...}
+        """
+        tokens_by_model = {}
+        for record in records:
+            if record.get('fields') is None and record.get('key'):
+                tokens_by_model.setdefault(record['model'], []).append(record['key'][1])
+
+        committed = set()
+        for model_label, tokens in tokens_by_model.items():
+            model = apps.get_model(model_label)
+            if not any(field.name == 'save_token' for field in model._meta.concrete_fields):
+                continue
+            for token in model.objects.filter(save_token__in=tokens).values_list('save_token', flat=True):
+                committed.add((model_label, token))
+        return committed
+
+    def _replay_journal(self):
+        """从预写日志加载未写入的记录到内存队列，最多加载到 max_pending 条；已写入数据库的新增记录直接标记为完成"""
+        with self._pending_lock:
+            self._needs_replay = False
+            exclude = set(self._live_seqs)
+            limit = self.max_pending - len(self._pending)
+        if limit <= 0:
+            self._needs_replay = True
+            return
+
+        records = self.journal.pending_records(exclude=exclude, limit=limit)
+        if not records:
+            return
+        committed = self._committed_tokens(records)
+        queued = []
+        skipped = []
+        with self._pending_lock:
+            for record in records:
+                if record.get('fields') is None and (record['model'], record['key'][1]) in committed:
+                    skipped.append(record['seq'])
+                    continue
+                try:
+                    instance, fields, values = self._instance_from_record(record)
+                except Exception as e:
+                    logger.error(f"无法重放预写日志记录 {record.get('seq')}，已丢弃: {str(e)}")
+                    self.journal.mark_done([record['seq']])
+                    continue
+                key = tuple(record['key'])
+                seq = record['seq']
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = PendingWrite(instance, fields, values, seq)
+                    queued.append(key)
+                elif pending.seqs and seq < min(pending.seqs):
+                    pending.merge_older(fields, values, seq)
+                else:
+                    if fields is None:
+                        # 新对象的较新记录包含全部字段，直接替换
+                        pending.model_instance = instance
+                    pending.merge(fields, values, seq)
+                self._live_seqs.add(seq)
+            if len(records) >= limit:
+                # 日志中可能还有未加载的记录
+                self._needs_replay = True
+        if skipped:
+            self.journal.mark_done(skipped)
+            logger.info(f"预写日志中 {len(skipped)} 条新增记录已写入数据库，跳过重放")
+        for key in queued:
+            self.save_queue.put(key)
+        logger.info(f"从预写日志加载 {len(records) - len(skipped)} 条未写入的记录")
+
+    def _collect_batch(self):
+        """
+        收集一个批次：阻塞等待第一个写入键，之后最多再等待 batch_wait 秒或收满 batch_size 个
+        :return: 写入键列表，队列为空时返回空列表
+        """
+        try:
+            batch = [self.save_queue.get(timeout=1)]
+        except Empty:
+            return []
+
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.save_queue.get(timeout=remaining))
+                else:
+                    batch.append(self.save_queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _dirty_fields(model_instance, update_fields=None):
+        """
+        变更跟踪模型中需要写入的字段
+        :param update_fields: 调用方指定的字段，只保留其中实际变化的字段
+        :return: 字段名集合；模型不支持变更跟踪或没有加载基准时返回 None
+        """
+        get_dirty_fields = getattr(model_instance, 'get_dirty_fields', None)
+        dirty = get_dirty_fields() if get_dirty_fields else None
+        if dirty is None or update_fields is None:
+            return dirty
+        return {field.name for field in model_instance._meta.concrete_fields
+                if field.name in dirty and (field.name in update_fields or field.attname in update_fields)}
+
+    @staticmethod
+    def _mark_saved(pending):
+        """
+        事务提交后，以写入的字段值作为调用方实例新的比较基准，之后的保存只写入新的变化；
+        写入失败时基准不变，这些字段仍是变化的字段，下次保存时会重新写入
+        """
+        model_instance = pending.model_instance
+        if pending.fields is not None and hasattr(model_instance, 'snapshot_fields'):
+            model_instance.snapshot_fields(values=pending.values)
+
+    @staticmethod
+    def _update_fields(model_instance, update_fields=None):
+        """
+        已有对象需要更新的字段
+        :param update_fields: 指定的字段，None 表示除主键外的所有字段；auto_now 字段总是更新
+        """
+        fields = set()
+        for field in model_instance._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            if update_fields is None or field.name in update_fields or field.attname in update_fields \
+                    or getattr(field, 'auto_now', False):
+                fields.add(field.name)
+        return fields
+
+    def _take_pending(self, keys):
+        """取出本批次的待写入数据，之后的保存会进入新的写入"""
+        with self._pending_lock:
+            return [self._pending.pop(key) for key in keys if key in self._pending]
+
+    @staticmethod
+    def _apply_auto_now(model_instance, fields):
+        """bulk_update 不会调用 save()，需要手动刷新 auto_now 字段"""
+        for field in model_instance._meta.concrete_fields:
+            if field.name in fields and getattr(field, 'auto_now', False):
+                field.pre_save(model_instance, False)
+
+    def _commit_batch(self, batch):
+        """在一个事务中提交整个批次"""
+        new_objects = {}      # 模型 -> [对象]
+        updates = {}          # (模型, 字段) -> [对象]
+        for model_instance, fields in batch:
+            model = model_instance.__class__
+            if fields is None:
+                new_objects.setdefault(model, []).append(model_instance)
+            else:
+                self._apply_auto_now(model_instance, fields)
+                updates.setdefault((model, tuple(sorted(fields))), []).append(model_instance)
+
+        with transaction.atomic():
+            for model, objects in new_objects.items():
+                model.objects.bulk_create(objects)
+                logger.debug(f"批量新增 {model.__name__}: {len(objects)} 条")
+            for (model, fields), objects in updates.items():
+                model.objects.bulk_update(objects, fields)
+                logger.debug(f"批量更新 {model.__name__}: {len(objects)} 条，字段: {fields}")
+
+        for model_instance, _ in batch:
+            self._log_saved(model_instance)
+
+    def _save_one(self, model_instance, fields):
+        """单独保存一个对象（批量提交失败时使用）"""
+        with transaction.atomic():
+            if fields is None:
+                model_instance.save()
+            else:
+                model_instance.save(update_fields=fields)
+        self._log_saved(model_instance)
+
+    @staticmethod
+    def _log_saved(model_instance):
+        """记录保存结果，OrderRecord 记录关键字段"""
+        model_name = model_instance.__class__.__name__
+        model_str = f"{model_name}(id={getattr(model_instance, 'id', None)})"
+        if model_name == 'OrderRecord':
+            key_fields = {field: getattr(model_instance, field, None) for field in ORDER_RECORD_KEY_FIELDS}
+            logger.info(f"成功保存 {model_str}，关键字段: {key_fields}")
+        else:
+            logger.debug(f"成功保存数据: {model_str}")
+
+    def _verify_batch(self, batch):
+        """调试模式：一次查询回读本批次的 OrderRecord，确认关键字段已写入"""
+        order_records = [obj for obj, _ in batch
+                         if obj.__class__.__name__ == 'OrderRecord' and obj.pk is not None]
+        if not order_records:
+            return
+        model = order_records[0].__class__
+        saved = model.objects.filter(pk__in=[obj.pk for obj in order_records]).values('id', *ORDER_RECORD_KEY_FIELDS)
+        for row in saved:
+            logger.info(f"回读 OrderRecord(id={row['id']})，保存后的关键字段: {row}")
+
+    def _process_batch(self, keys):
+        """
+        提交一个批次，失败时逐个保存
+        :param keys: 写入键列表
+        :return: 是否出现数据库错误
+        """
+        pendings = self._take_pending(keys)
+        batch = [(pending.build_instance(), pending.fields) for pending in pendings]
+        if not batch:
+            return False
+        try:
+            self._commit_batch(batch)
+            for pending in pendings:
+                self._mark_saved(pending)
+            self._release_seqs([seq for pending in pendings for seq in pending.seqs], done=True)
+            if self.verify_writes:
+                self._verify_batch(batch)
+            return False
+        except Exception as e:
+            logger.error(f"批量保存 {len(batch)} 个对象失败，改为逐个保存: {str(e)}", exc_info=True)
+
+        database_error = False
+        for (model_instance, fields), pending in zip(batch, pendings):
+            try:
+                self._save_one(model_instance, fields)
+                self._mark_saved(pending)
+                self._release_seqs(pending.seqs, done=True)
+            except (OperationalError, InterfaceError) as e:
+                # 连接类错误，保留在预写日志中，稍后重放
+                database_error = True
+                self._release_seqs(pending.seqs, done=False)
+                logger.error(f"数据库连接错误，保存 {model_instance.__class__.__name__} 失败: {str(e)}")
+            except DatabaseError as e:
+                # 数据本身无法写入（如约束错误），重放也会失败，从日志中移除；
+                # 调用方实例的基准没有更新，这些字段仍是变化的字段，下次保存时重新写入
+                database_error = True
+                self._release_seqs(pending.seqs, done=True)
+                logger.error(f"数据库错误，保存 {model_instance.__class__.__name__} 失败，"
+                             f"字段保持为未保存: {sorted(fields or ())}: {str(e)}")
+            except Exception as e:
+                self._release_seqs(pending.seqs, done=True)
+                logger.error(f"保存 {model_instance.__class__.__name__} 时出错，"
+                             f"字段保持为未保存: {sorted(fields or ())}: {str(e)}", exc_info=True)
+        return database_error
+
     def _process_saves(self):
         """处理数据库保存队列"""
         consecutive_errors = 0
         max_consecutive_errors = 3
-        
-        while self._should_run:
-            try:
-                # 从队列获取对象，设置1秒超时
-                model_instance = self.save_queue.get(timeout=1)
-                
-                # 记录保存前的对象信息
-                model_name = model_instance.__class__.__name__
-                model_id = getattr(model_instance, 'id', None)
-                model_str = f"{model_name}(id={model_id})"
-                
-                # 如果是OrderRecord，记录关键字段
-                if model_name == 'OrderRecord':
-                    key_fields = {
-                        'order_id': getattr(model_instance, 'order_id', None),
-                        'oid': getattr(model_instance, 'oid', None),
-                        'status': getattr(model_instance, 'status', None),
-                        'fee': getattr(model_instance, 'fee', None),
-                        'filled_time': getattr(model_instance, 'filled_time', None),
-                        'filled_quantity': getattr(model_instance, 'filled_quantity', None),
-                        'order_type': getattr(model_instance, 'order_type', None)
-                    }
-                    logger.info(f"准备保存 {model_str}，关键字段: {key_fields}")
-                else:
-                    logger.debug(f"准备保存 {model_str}")
-                
-                # 在事务中保存对象
-                with transaction.atomic():
-                    model_instance.save()
-                    
-                    # 如果是OrderRecord，再次检查关键字段是否已保存
-                    if model_name == 'OrderRecord':
-                        saved_instance = model_instance.__class__.objects.get(id=model_id)
-                        saved_fields = {
-                            'order_id': getattr(saved_instance, 'order_id', None),
-                            'oid': getattr(saved_instance, 'oid', None),
-                            'status': getattr(saved_instance, 'status', None),
-                            'fee': getattr(saved_instance, 'fee', None),
-                            'filled_time': getattr(saved_instance, 'filled_time', None),
-                            'filled_quantity': getattr(saved_instance, 'filled_quantity', None),
-                            'filled_price': getattr(saved_instance, 'filled_price', None),
-                            'order_type': getattr(saved_instance, 'order_type', None)
-                        }
-                        logger.info(f"成功保存 {model_str}，保存后的关键字段: {saved_fields}")
-                    else:
-                        logger.debug(f"成功保存数据: {model_str}")
-                
-                # 重置错误计数
-                consecutive_errors = 0
-                
-                # 标记任务完成
-                self.save_queue.task_done()
-                
-            except Empty:
+
+        while self._should_run or not self.save_queue.empty():
+            if self._needs_replay and self.save_queue.empty():
+                try:
+                    self._replay_journal()
+                except Exception as e:
+                    logger.error(f"重放预写日志出错: {str(e)}", exc_info=True)
+
+            batch = self._collect_batch()
+            if not batch:
                 # 队列为空，正常情况
                 consecutive_errors = 0
                 continue
-            except DatabaseError as e:
+
+            try:
+                database_error = self._process_batch(batch)
+            except Exception as e:
+                database_error = False
+                logger.error(f"数据库处理线程出错: {str(e)}", exc_info=True)
+            finally:
+                # 标记任务完成
+                for _ in batch:
+                    self.save_queue.task_done()
+
+            if database_error:
                 consecutive_errors += 1
-                logger.error(f"数据库错误: {str(e)}", exc_info=True)
-                
                 # 如果连续错误次数过多，暂停一段时间
                 if consecutive_errors >= max_consecutive_errors:
                     logger.warning(f"检测到连续{consecutive_errors}次数据库错误，暂停60秒")
@@ -117,37 +575,38 @@ class AsyncDatabaseHandler:
                     consecutive_errors = 0
                 else:
                     time.sleep(1)  # 短暂暂停
-                    
-            except Exception as e:
-                consecutive_errors += 1
-                logger.error(f"数据库处理线程出错: {str(e)}", exc_info=True)
-                time.sleep(0.1)  # 短暂暂停避免频繁错误
-                # 标记任务完成，避免队列阻塞
-                try:
-                    self.save_queue.task_done()
-                    logger.warning(f"由于错误，标记任务为完成状态: {str(e)}")
-                except Exception as task_error:
-                    logger.error(f"标记任务完成时出错: {str(task_error)}")
+            else:
+                consecutive_errors = 0
 
     def stop(self):
         """停止数据库处理"""
         logger.info("正在停止数据库处理器...")
         self._should_run = False
-        
+
         try:
             # 等待所有任务完成，设置超时时间
-            if self.save_queue.all_tasks_done.wait(timeout=30):
+            deadline = time.time() + 30
+            with self.save_queue.all_tasks_done:
+                while self.save_queue.unfinished_tasks and time.time() < deadline:
+                    self.save_queue.all_tasks_done.wait(timeout=deadline - time.time())
+                all_done = not self.save_queue.unfinished_tasks
+            if all_done:
                 logger.info("所有数据库保存任务已完成")
             else:
                 logger.warning("等待数据库保存任务完成超时")
-            
+
             if self.processing_thread.is_alive():
                 self.processing_thread.join(timeout=30)
-                
+
+            if self.journal is not None:
+                if self.journal.outstanding:
+                    logger.warning(f"预写日志中还有 {self.journal.outstanding} 条记录未写入，将在下次启动时重放")
+                self.journal.close()
+
             logger.info("数据库处理器已成功停止")
-            
+
         except Exception as e:
             logger.error(f"停止数据库处理器时出错: {str(e)}", exc_info=True)
 
 # 创建全局单例实例
-async_db_handler = AsyncDatabaseHandler()
\ No newline at end of file
+async_db_handler = AsyncDatabaseHandler()
@@ -4,7 +4,7 @@ from datetime import datetime
 from django.db import transaction
 from alert.core.async_db import async_db_handler
 from alert.models import OrderRecord
-from alert.trade.hyper_order import HyperliquidTrader
+from alert.trade.hyperliquid_api import get_trader
 from decimal import Decimal
 
 logger = logging.getLogger(__name__)
@@ -38,8 +38,8 @@ def update_order_details_async(order_record_id):
             logger.info(f"订单 {order_record.order_id} 已取消，无需更新详情")
             return
         
-        # 获取订单详情
-        trader = HyperliquidTrader()
+        # 获取共享的交易接口
+        trader = get_trader()
         
         # 先查询最新的订单状态
         try:
@@ -159,52 +159,14 @@ def update_order_details_async(order_record_id):
             if has_key_fields:
                 # 异步保存
                 try:
+                    # OrderRecord 跟踪字段变更，只更新实际变化的字段，避免覆盖其他线程的写入
+                    changed_fields = order_record.get_dirty_fields()
                     async_db_handler.async_save(order_record)
-                    logger.info(f"订单 {order_record.order_id} 详细信息已异步更新")
+                    logger.info(f"订单 {order_record.order_id} 详细信息已异步更新，字段: {sorted(changed_fields or [])}")
                 except Exception as e:
                     logger.error(f"保存订单记录时出错: {str(e)}")
                     import traceback
                     logger.error(f"详细错误: {traceback.format_exc()}")
-                    
-                    # 尝试使用原始SQL更新
-                    try:
-                        from django.db import connection
-                        with connection.cursor() as cursor:
-                            # 构建更新SQL
-                            update_fields = []
-                            params = []
-                            
-                            if "fee" in order_details and order_details["fee"] is not None:
-                                update_fields.append("fee = %s")
-                                params.append(float(order_details["fee"]))
-                            
-                            if "filled_quantity" in order_details and order_details["filled_quantity"] is not None:
-                                update_fields.append("filled_quantity = %s")
-                                params.append(float(order_details["filled_quantity"]))
-                            
-                            # 对于filled_time，直接使用NULL，避免类型转换问题
-                            if "filled_time" in order_details and order_details["filled_time"] is not None:
-                                update_fields.append("filled_time = NULL")
-                            
-                            # 更新order_type
-                            update_fields.append("order_type = %s")
-                            if order_record.is_stop_loss:
-                                params.append("CLOSE")
-                            else:
-                                params.append("CLOSE" if order_record.reduce_only else "OPEN")
-                            
-                            # 如果有实际成交价格，更新filled_price字段
-                            if "filled_price" in order_details and order_details["filled_price"] is not None:
-                                update_fields.append("filled_price = %s")
-                                params.append(float(order_details["filled_price"]))
-                            
-                            if update_fields:
-                                sql = f"UPDATE order_record SET {', '.join(update_fields)} WHERE id = %s"
-                                params.append(order_record_id)
-                                cursor.execute(sql, params)
-                                logger.info(f"使用原始SQL更新订单记录成功: {sql} {params}")
-                    except Exception as e2:
-                        logger.error(f"使用原始SQL更新订单记录时出错: {str(e2)}")
             else:
                 logger.warning(f"订单 {order_record.order_id} 未获取到任何关键字段 (缺失: {', '.join(missing_fields)})，不保存更新")
         else:
@@ -225,7 +187,7 @@ def get_order_details(trader, symbol, cloid, order_status):
     
     该函数使用 query_order_by_cloid 方法直接查询订单状态，避免不必要的历史成交记录查询。
     对于已成交的订单，会从订单状态中提取成交价格、数量和时间信息，
-    仅在需要获取手续费时才会查询历史成交记录。
+    手续费和成交均价从本地成交索引中读取。
     
     :param trader: 交易对象
     :param symbol: 交易对符号
@@ -258,12 +220,12 @@ def get_order_details(trader, symbol, cloid, order_status):
             # 查询订单状态
             logger.debug(f"调用API查询订单状态: wallet_address={mask_sensitive_info(trader.wallet_address)}, cloid={cloid_obj}")
             order_status_result = trader.info.query_order_by_cloid(trader.wallet_address, cloid_obj)
-            logger.debug(f"订单详细信息查询结果: {order_status_result}")
+            logger.debug("订单详细信息查询结果: %s", order_status_result)
             
             # 检查订单状态结果是否包含 order 字段
             if order_status_result and order_status_result.get('status') == 'order' and order_status_result.get('order'):
                 order_info = order_status_result['order']
-                logger.debug(f"解析订单状态: {order_info}")
+                logger.debug("解析订单状态: %s", order_info)
                 
                 # 解析订单详细信息
                 result = {"status": "success", "source": "query_order_by_cloid"}
@@ -275,7 +237,7 @@ def get_order_details(trader, symbol, cloid, order_status):
                 
                 # 打印完整的订单结构，以便调试
                 logger.info(f"外层订单状态: {order_status_str}")
-                logger.info(f"内层order结构: {inner_order_data}")
+                logger.info("内层order结构: %s", inner_order_data)
                 
                 # 如果内层结构中有status字段，使用它作为真正的订单状态
                 if 'status' in inner_order_data:
@@ -286,7 +248,7 @@ def get_order_details(trader, symbol, cloid, order_status):
                 order_data = inner_order_data.get('order', inner_order_data)
                 
                 # 打印最终使用的order_data
-                logger.info(f"最终使用的order_data: {order_data}")
+                logger.info("最终使用的order_data: %s", order_data)
                 
                 # 如果订单已成交或部分成交
                 if order_status_str in ['filled', 'closed', 'partial_fill']:
@@ -362,8 +324,12 @@ def get_order_details(trader, symbol, cloid, order_status):
                         result["fee"] = Decimal(str(order_data["fee"]))
                         logger.info(f"从订单状态中获取到手续费: {result['fee']}")
                     
-                    # 如果需要手续费的精确值，可以在订单成交后通过其他方式更新
-                    # 例如，可以通过定期任务或其他方式获取手续费并更新订单记录
+                    # 从本地成交索引补充手续费和成交均价（已累计拆分成交）
+                    order_fills = trader.fills_store.get_order_fills(cloid=cloid, sync=True)
+                    if order_fills:
+                        result["fee"] = Decimal(str(order_fills["fee"]))
+                        result["filled_price"] = Decimal(str(order_fills["avg_price"]))
+                        logger.info(f"从成交索引获取到手续费: {result['fee']}, 成交均价: {result['filled_price']}")
                     
                     return result
                 
@@ -405,7 +371,7 @@ def manually_update_order_details(order_record_id):
         logger.debug(f"获取到订单记录: order_id={order_record.order_id}, symbol={order_record.symbol}, status={order_record.status}")
         
         # 获取订单详情
-        trader = HyperliquidTrader()
+        trader = get_trader()
         order_details = get_order_details(trader, order_record.symbol, order_record.cloid, order_record.status)  # 使用交易所订单号查询
         
         if order_details and order_details["status"] == "success":
@@ -486,6 +452,7 @@ def manually_update_order_details(order_record_id):
             # 如果有更新，保存
             if has_updates:
                 try:
+                    # 只更新实际变化的字段
                     order_record.save()
                     update_message = "更新了以下字段: " + ", ".join(updates)
                     logger.info(f"订单 {order_record.order_id} 详细信息已手动更新: {update_message}")
@@ -0,0 +1,253 @@
+import json
+import os
+import threading
+import logging
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class WriteJournal:
+    """
+    异步数据库队列的预写日志
+    每次入队的写入追加一行 JSON 记录，写入数据库后追加完成标记，所有记录都完成时截断文件；启动时重放未完成的记录
+    检查点：持续有写入时未完成的记录数不会归零，日志超过 compact_bytes 且已完成的记录不少于一半时，
+    只保留未完成的记录重写日志，文件大小和重放时间与未完成的记录数相关，而不是随运行时间增长
+    落盘方式（sync_mode）：
+        always   - 调用方调用 sync() 等待落盘，同时等待的线程共享一次 fsync
+        interval - 后台线程每 sync_interval 秒对新追加的记录执行一次 fsync（组提交），调用方不等待；
+                   进程或机器崩溃时可能丢失最后一个周期内的记录
+        off      - 后台线程只把缓冲区写入操作系统，不执行 fsync，只能防止进程崩溃
+    记录格式: {"seq": 序号, "model": 模型标签, "key": 写入键, "pk": 主键, "fields": 更新字段, "values": 字段值}
+    完成标记: {"done": [序号, ...]}
+    """
+
+    SYNC_MODES = ('always', 'interval', 'off')
+
+    def __init__(self, path, sync_mode='interval', sync_interval=0.02, compact_bytes=8 * 1024 * 1024):
+        if sync_mode not in self.SYNC_MODES:
+            raise ValueError(f"无效的预写日志落盘方式: {sync_mode}")
+        self.path = path
+        self.sync_mode = sync_mode
+        self.sync_interval = sync_interval
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._syncing = False
+        self._synced_seq = 0
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # 启动时统计未完成的记录，之后的序号从文件中最大的序号继续
+        done, last_seq, self._outstanding = self._scan()
+        self._seq = last_seq
+        self._synced_seq = last_seq
+        # 当前日志文件中的写入记录数和已完成的记录数，用于判断是否需要压缩
+        self._records_in_file = self._outstanding + len(done)
+        self._done_in_file = len(done)
+        self._file = open(path, 'a', encoding='utf8')
+        if not self._outstanding:
+            self._truncate()
+
+        self._closed = threading.Event()
+        self._flush_thread = None
+        if sync_mode != 'always':
+            self._flush_thread = threading.Thread(target=self._flush_loop, name="WriteJournalFlush")
+            self._flush_thread.daemon = True
+            self._flush_thread.start()
+        logger.info(f"数据库预写日志已打开: {path}，落盘方式: {sync_mode}，未完成记录: {self._outstanding}")
+
+    @property
+    def outstanding(self):
+        """尚未写入数据库的记录数"""
+        return self._outstanding
+
+    def append(self, model_label, key, pk, fields, values):
+        """
+        追加一条写入记录（只写入文件缓冲区，调用 sync 后才落盘）
+        :return: 记录序号
+        """
+        with self._lock:
+            self._seq += 1
+            record = {
+                'seq': self._seq,
+                'model': model_label,
+                'key': key,
+                'pk': pk,
+                'fields': sorted(fields) if fields is not None else None,
+                'values': values,
+            }
+            self._file.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self._outstanding += 1
+            self._records_in_file += 1
+            return self._seq
+
+    def sync(self, seq):
+        """
+        等待指定序号之前的记录落盘
+        同一时间只有一个线程执行 fsync，其他线程等待并共享这次 fsync 的结果
+        """
+        with self._lock:
+            while self._synced_seq < seq:
+                if self._syncing:
+                    self._synced.wait()
+                    continue
+                self._syncing = True
+                target = self._seq
+                try:
+                    self._file.flush()
+                    fd = self._file.fileno()
+                    self._lock.release()
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        self._lock.acquire()
+                    self._synced_seq = max(self._synced_seq, target)
+                finally:
+                    self._syncing = False
+                    self._synced.notify_all()
+
+    def _flush_loop(self):
+        """后台落盘：每 sync_interval 秒处理一次新追加的记录"""
+        while not self._closed.wait(self.sync_interval):
+            try:
+                if self.sync_mode == 'interval':
+                    if self._synced_seq < self._seq:
+                        self.sync(self._seq)
+                else:
+                    with self._lock:
+                        if not self._file.closed:
+                            self._file.flush()
+            except Exception as e:
+                logger.error(f"预写日志落盘出错: {str(e)}")
+
+    def mark_done(self, seqs):
+        """记录已写入数据库的序号，所有记录都完成时截断文件，已完成的记录过多时压缩文件"""
+        if not seqs:
+            return
+        with self._lock:
+            self._outstanding -= len(seqs)
+            if self._outstanding <= 0:
+                self._outstanding = 0
+                self._truncate()
+                return
+            self._file.write(json.dumps({'done': sorted(seqs)}, separators=(',', ':')) + '\n')
+            self._file.flush()
+            self._done_in_file += len(seqs)
+            if self._done_in_file * 2 >= self._records_in_file \
+                    and os.fstat(self._file.fileno()).st_size >= self.compact_bytes:
+                self._compact()
+
+    def pending_records(self, exclude=(), limit=None):
+        """
+        读取未完成的写入记录，按序号从小到大返回
+        :param exclude: 需要跳过的序号（已在内存中等待写入）
+        :param limit: 最多返回的记录数
+        """
+        with self._lock:
+            self._file.flush()
+        # 一次读取同一个文件句柄，压缩替换文件时读到的仍是一致的快照
+        done = set()
+        records = []
+        for record in self._read():
+            if 'done' in record:
+                done.update(record['done'])
+            elif 'seq' in record and record['seq'] not in exclude:
+                records.append(record)
+        records = [record for record in records if record['seq'] not in done]
+        return records[:limit] if limit is not None else records
+
+    def close(self):
+        self._closed.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join(timeout=5)
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def _truncate(self):
+        """清空日志文件（调用方持有锁）"""
+        self._file.flush()
+        self._file.truncate(0)
+        os.fsync(self._file.fileno())
+        self._records_in_file = 0
+        self._done_in_file = 0
+        logger.debug("数据库预写日志已全部写入，截断日志文件")
+
+    def _compact(self):
+        """
+        只保留未完成的记录重写日志文件（调用方持有锁）
+        先写入临时文件并落盘，再原子替换原文件，压缩过程中崩溃时原文件保持完整
+        """
+        while self._syncing:
+            # 等待正在进行的 fsync 结束，避免关闭它正在使用的文件
+            self._synced.wait()
+        self._file.flush()
+        done, _, _ = self._scan()
+        temp_path = self.path + '.compact'
+        kept = 0
+        with open(self.path, 'r', encoding='utf8') as source, open(temp_path, 'w', encoding='utf8') as target:
+            for line in source:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if 'seq' in record and record['seq'] not in done:
+                    target.write(line)
+                    kept += 1
+            target.flush()
+            os.fsync(target.fileno())
+        self._file.close()
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf8')
+        self._fsync_directory()
+        removed = self._records_in_file - kept
+        self._records_in_file = kept
+        self._done_in_file = 0
+        self._outstanding = kept
+        # 保留的记录已随新文件落盘
+        self._synced_seq = self._seq
+        logger.info(f"数据库预写日志已压缩: 移除 {removed} 条已完成的记录，保留 {kept} 条")
+
+    def _fsync_directory(self):
+        """替换文件后同步目录项，部分平台不支持对目录 fsync 时忽略"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _read(self):
+        """逐行读取日志，忽略崩溃时写了一半的最后一行"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning(f"跳过无法解析的预写日志记录: {line[:100]}")
+
+    def _scan(self):
+        """
+        扫描日志文件
+        :return: (已完成的序号集合, 最大序号, 未完成的记录数)
+        """
+        done = set()
+        seqs = 0
+        last_seq = 0
+        for record in self._read():
+            if 'done' in record:
+                done.update(record['done'])
+            elif 'seq' in record:
+                seqs += 1
+                last_seq = max(last_seq, record['seq'])
+        return done, last_seq, max(seqs - len(done), 0)
@@ -1,5 +1,7 @@
+import os
 import sys
 import logging
+import threading
 import functools
 from functools import wraps
 
@@ -29,6 +31,18 @@ def is_runserver_command():
             return True
     return False
 
+# ASGI/WSGI 入口（order7/asgi.py、order7/wsgi.py）设置该环境变量，标记当前进程是对外服务的进程
+SERVER_PROCESS_ENV = 'ORDER7_SERVER_PROCESS'
+
+def is_server_process():
+    """
+    检查当前进程是否为对外服务的进程（runserver，或由 uvicorn/daphne/gunicorn 等加载的 ASGI/WSGI 应用）
+    
+    Returns:
+        bool: 如果是服务进程，返回 True，否则返回 False
+    """
+    return is_runserver_command() or bool(os.environ.get(SERVER_PROCESS_ENV))
+
 def skip_during_migrations(func):
     """
     装饰器：在数据库迁移命令执行期间跳过被装饰的函数
@@ -65,8 +79,17 @@ def initialize_channels(force=False):
         return False
     
     try:
-        # 这里添加渠道初始化的代码
-        # 例如：初始化 HyperliquidTrader 等
+        # 预热交易接口会话池，后续下单和查询复用同一个Info/Exchange
+        from alert.trade.hyperliquid_api import trader_pool
+        if not trader_pool.warm_up():
+            return False
+
+        # 订阅账户推送，订单成交后立即处理
+        from django.conf import settings
+        if settings.ORDER_MONITOR_CONFIG.get('push_updates', True):
+            from alert.core.ordertask import order_monitor
+            order_monitor.start_push_updates()
+
         if not is_migration_command():
             logger.info("渠道初始化成功完成")
         return True
@@ -118,11 +141,13 @@ def patch_hyperliquid_trader():
             self.info = None
             self.exchange = None
             self.exchange_instance = None
-            self._ws = None
-            self._ws_connected = False
-            self._ws_lock = None
-            self._ws_thread = None
-            self._ws_should_run = False
+            self._ws_manager = None
+            self._account_listeners = []
+            self._account_stream_started = False
+            self._schedule_lock = threading.Lock()
+            self._scheduled_cancel_time = None
+            self._order_epoch = 0
+            self._orders_in_flight = 0
         
         # 替换 __init__ 方法
         HyperliquidTrader.__init__ = new_init
@@ -132,6 +157,22 @@ def patch_hyperliquid_trader():
     except Exception as e:
         logger.error(f"修补 HyperliquidTrader 时出错: {str(e)}")
 
+def warm_up_signal_index():
+    """
+    从数据库预热最近信号索引，重复信号判断不再每次查询数据库
+
+    Returns:
+        bool: 预热是否成功
+    """
+    try:
+        from alert.core.signal_index import last_signal_index
+        last_signal_index.warm_up()
+        return True
+    except Exception as e:
+        # 预热失败时索引按需从数据库加载
+        logger.error(f"最近信号索引预热失败: {str(e)}")
+        return False
+
 # 应用启动时的初始化函数
 @skip_channel_init
 def initialize_application():
@@ -144,9 +185,10 @@ def initialize_application():
     # 首先修补 HyperliquidTrader 类
     patch_hyperliquid_trader()
     
-    # 只在 runserver 命令时初始化渠道
-    if is_runserver_command():
+    # 只在服务进程中初始化渠道（runserver 或 ASGI/WSGI 服务器）
+    if is_server_process():
         initialize_channels()
+        warm_up_signal_index()
     elif is_migration_command():
         logger.debug("数据库迁移期间跳过应用初始化")
     else:
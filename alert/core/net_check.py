@@ -3,6 +3,7 @@ import threading
 import time
 import ssl
 import json
+import random
 import websocket
 from typing import Optional, Callable, Dict, Any, List
 
@@ -11,30 +12,39 @@ logger = logging.getLogger(__name__)
 class WebSocketManager:
     """
     WebSocket连接管理器
-    负责WebSocket连接的生命周期管理，包括：
-    1. 按需建立连接
-    2. 闲置自动断开
-    3. 连接错误重试
-    4. 消息处理
+    维护一条长期保持的多路复用连接，包括：
+    1. 订阅登记表（引用计数），同一订阅只发送一次，最后一个订阅者取消时才退订
+    2. 断线后按带随机抖动的指数退避重连，重连后自动恢复所有订阅
+    3. 应用层心跳，长时间收不到消息时主动断开重连
+    4. 按频道分发消息，未登记处理函数的频道交给 on_message
+    5. 闲置断开（idle_timeout > 0 时，默认关闭）
+    心跳和闲置检查由同一个调度线程按最近的到期时间执行；
+    等待连接的调用方在锁外等待连接事件，不阻塞其他调用方
     """
     
     def __init__(self, 
                  url: str, 
                  on_message: Optional[Callable[[Dict[str, Any]], None]] = None,
-                 idle_timeout: int = 60,
+                 idle_timeout: int = 0,
                  max_retries: int = 3,
                  ping_interval: int = 30,
-                 ping_timeout: int = 10):
+                 ping_timeout: int = 10,
+                 heartbeat_interval: int = 30,
+                 reconnect_base_delay: float = 1,
+                 reconnect_max_delay: float = 60):
         """
         初始化WebSocket管理器
         
         Args:
             url: WebSocket服务器URL
-            on_message: 消息处理回调函数
-            idle_timeout: 闲置超时时间（秒），超过此时间无活动将自动断开连接
-            max_retries: 连接失败时的最大重试次数
+            on_message: 消息处理回调函数（没有登记频道处理函数的消息）
+            idle_timeout: 闲置超时时间（秒），超过此时间无活动将自动断开连接，0表示保持长连接
+            max_retries: 没有订阅时连续连接失败的最大重试次数，有订阅时一直重连
             ping_interval: ping间隔时间（秒）
             ping_timeout: ping超时时间（秒）
+            heartbeat_interval: 应用层心跳间隔（秒），0表示不发送心跳
+            reconnect_base_delay: 重连的初始退避时间（秒）
+            reconnect_max_delay: 重连的最大退避时间（秒）
         """
         self.url = url
         self.on_message_callback = on_message
@@ -42,6 +52,9 @@ class WebSocketManager:
         self.max_retries = max_retries
         self.ping_interval = ping_interval
         self.ping_timeout = ping_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = reconnect_max_delay
         
         # WebSocket连接状态
         self._ws = None
@@ -49,31 +62,60 @@ class WebSocketManager:
         self._ws_lock = threading.Lock()
         self._ws_thread = None
         self._ws_should_run = False
+        self._stop_event = threading.Event()
+        # 连接建立时置位，断开时清除
+        self._connected_event = threading.Event()
+        self._monitor_thread = None
+        # 连接建立的次数，用于判断一次连接尝试是否成功
+        self._open_count = 0
         
         # 闲置管理
-        self._idle_timer = None
         self._last_activity_time = 0
+        # 最后一次收到、发送消息的时间，用于心跳检测
+        self._last_recv_time = 0
+        self._last_send_time = 0
+        
+        # 订阅登记表：订阅键 -> {"message": 订阅消息, "refs": 引用计数}，每次(重新)连接后恢复
+        self._subscriptions = {}
+        # 频道 -> 消息处理函数列表
+        self._handlers = {}
         
         logger.info(f"WebSocketManager初始化完成，URL: {url}, 闲置超时: {idle_timeout}秒")
     
+    @staticmethod
+    def _subscription_key(subscription_data):
+        """订阅键：订阅内容的规范JSON"""
+        if isinstance(subscription_data, dict):
+            subscription = subscription_data.get("subscription", subscription_data)
+            return json.dumps(subscription, sort_keys=True, separators=(",", ":"))
+        return str(subscription_data)
+    
+    @staticmethod
+    def _subscription_channel(subscription_data):
+        """订阅对应的频道（默认为订阅类型）"""
+        if isinstance(subscription_data, dict):
+            return (subscription_data.get("subscription") or {}).get("type")
+        return None
+    
     def _on_ws_open(self, ws):
         """WebSocket连接建立时的回调"""
         with self._ws_lock:
             self._ws_connected = True
+            self._open_count += 1
             self._last_activity_time = time.time()
+            self._last_recv_time = time.time()
         
         logger.info(f"WebSocket连接已建立: {self.url}")
         
-        # 不再需要重新订阅功能
-        
-        # 启动闲置计时器
-        self._start_idle_timer()
+        # 恢复登记表中的订阅（包括断线重连后），然后唤醒等待连接的调用方
+        self._resubscribe(ws)
+        self._connected_event.set()
     
     def _on_ws_close(self, ws, close_status_code, close_msg):
         """WebSocket连接关闭时的回调"""
         with self._ws_lock:
             self._ws_connected = False
-            self._cancel_idle_timer()
+            self._connected_event.clear()
         
         close_info = f"状态码: {close_status_code}" if close_status_code else "无状态码"
         close_info += f", 消息: {close_msg}" if close_msg else ", 无消息"
@@ -87,19 +129,31 @@ class WebSocketManager:
             logger.warning(f"WebSocket错误: {error}")
     
     def _on_ws_message(self, ws, message):
-        """WebSocket消息处理"""
+        """WebSocket消息处理，按频道分发"""
         try:
             # 更新最后活动时间
             self._last_activity_time = time.time()
-            # 重置闲置计时器
-            self._reset_idle_timer()
+            self._last_recv_time = self._last_activity_time
             
             # 解析消息
             data = json.loads(message)
+            channel = data.get("channel") if isinstance(data, dict) else None
+            if channel == "pong":
+                return
+            if channel == "subscriptionResponse":
+                logger.debug(f"WebSocket订阅确认: {data.get('data')}")
+                return
             logger.debug(f"收到WebSocket消息: {data}")
             
-            # 调用用户定义的回调函数
-            if self.on_message_callback:
+            handlers = self._handlers.get(channel)
+            if handlers:
+                for handler in handlers:
+                    try:
+                        handler(data)
+                    except Exception as e:
+                        logger.warning(f"处理WebSocket频道 {channel} 的消息时出错: {str(e)}")
+            elif self.on_message_callback:
+                # 调用用户定义的回调函数
                 self.on_message_callback(data)
                 
         except Exception as e:
@@ -107,14 +161,15 @@ class WebSocketManager:
     
     def _ws_connect(self):
         """
-        建立WebSocket连接，包含重试机制
+        保持WebSocket连接：连接断开后按带抖动的指数退避重连，
+        有订阅时一直重连，没有订阅时连续失败 max_retries 次后停止
         """
-        retry_count = 0
-        retry_delay = 2  # 初始重试延迟（秒）
+        failures = 0
         
-        while retry_count < self.max_retries and self._ws_should_run:
+        while self._ws_should_run:
+            open_count = self._open_count
             try:
-                logger.debug(f"正在连接WebSocket (尝试 {retry_count+1}/{self.max_retries}): {self.url}")
+                logger.debug(f"正在连接WebSocket: {self.url}")
                 
                 # 创建WebSocket连接
                 self._ws = websocket.WebSocketApp(
@@ -125,141 +180,162 @@ class WebSocketManager:
                     on_close=self._on_ws_close
                 )
                 
-                # 更健壮的WebSocket设置
+                # 重连由本循环处理，以便重连后恢复订阅
                 self._ws.run_forever(
                     sslopt={"cert_reqs": ssl.CERT_NONE},
                     ping_interval=self.ping_interval,
                     ping_timeout=self.ping_timeout,
                     skip_utf8_validation=True,
-                    reconnect=5  # 启用内部重连机制
+                    reconnect=0
                 )
-                
-                # 如果run_forever返回，说明连接已关闭
                 logger.debug("WebSocket run_forever已退出")
-                break
-                
-            except ConnectionResetError as e:
-                retry_count += 1
-                logger.warning(f"WebSocket连接被重置 (尝试 {retry_count}/{self.max_retries}): {str(e)}")
-                if retry_count < self.max_retries:
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # 指数退避策略
                 
             except Exception as e:
-                retry_count += 1
-                logger.error(f"WebSocket连接出错 (尝试 {retry_count}/{self.max_retries}): {str(e)}")
-                if retry_count < self.max_retries:
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # 指数退避策略
-        
-        # 如果所有重试都失败
-        if retry_count >= self.max_retries:
-            logger.error("WebSocket连接在多次尝试后仍然失败")
+                logger.error(f"WebSocket连接出错: {str(e)}")
+            
             with self._ws_lock:
                 self._ws_connected = False
-    
-    def _start_idle_timer(self):
-        """启动闲置计时器"""
-        with self._ws_lock:
-            # 取消现有计时器
-            self._cancel_idle_timer()
+                self._connected_event.clear()
+                if not self._ws_should_run:
+                    break
+                has_subscriptions = bool(self._subscriptions)
+            
+            # 连接建立过则重新开始退避
+            failures = 1 if self._open_count != open_count else failures + 1
+            if not has_subscriptions and failures >= self.max_retries:
+                logger.error("WebSocket连接在多次尝试后仍然失败")
+                with self._ws_lock:
+                    self._ws_should_run = False
+                break
             
-            # 创建新计时器
-            if self.idle_timeout > 0:
-                self._idle_timer = threading.Timer(self.idle_timeout, self._on_idle_timeout)
-                self._idle_timer.daemon = True
-                self._idle_timer.start()
-                logger.debug(f"启动闲置计时器，{self.idle_timeout}秒后将断开连接")
+            delay = self._backoff_delay(failures)
+            logger.warning(f"WebSocket连接已断开，{delay:.1f}秒后重连（第{failures}次）")
+            self._stop_event.wait(delay)
     
-    def _reset_idle_timer(self):
-        """重置闲置计时器"""
-        if self._idle_timer:
-            self._start_idle_timer()  # 重新启动计时器
+    def _backoff_delay(self, failures):
+        """第 failures 次重连前的等待时间：指数退避，在上限的一半到上限之间随机取值，避免多个进程同时重连"""
+        cap = min(self.reconnect_max_delay, self.reconnect_base_delay * 2 ** (failures - 1))
+        return cap / 2 + random.uniform(0, cap / 2)
     
-    def _cancel_idle_timer(self):
-        """取消闲置计时器"""
-        if self._idle_timer:
-            self._idle_timer.cancel()
-            self._idle_timer = None
+    def _next_check_delay(self):
+        """距离下一次心跳或闲置检查的时间（秒）"""
+        delays = []
+        if self.heartbeat_interval > 0:
+            delays.append(self.heartbeat_interval)
+        if self.idle_timeout > 0:
+            delays.append(self._last_activity_time + self.idle_timeout - time.time())
+        if not delays:
+            # 心跳和闲置断开都关闭时，定期检查配置是否改变
+            return 30
+        return max(min(delays), 0.1)
     
-    def _on_idle_timeout(self):
-        """闲置超时处理"""
-        with self._ws_lock:
-            current_time = time.time()
-            idle_time = current_time - self._last_activity_time
-            
-            if idle_time >= self.idle_timeout and self._ws_connected:
+    def _monitor_loop(self):
+        """
+        调度线程：在最近的到期时间执行心跳和闲置检查，disconnect() 时退出
+        """
+        while not self._stop_event.wait(self._next_check_delay()):
+            if not self._ws_connected:
+                continue
+            if self._idle_expired():
                 logger.info(f"WebSocket连接闲置超过{self.idle_timeout}秒，自动断开连接")
                 self.disconnect()
+                return
+            if self.heartbeat_interval > 0:
+                self._check_heartbeat()
+    
+    def _idle_expired(self):
+        """是否已闲置超时，有订阅时不断开"""
+        if self.idle_timeout <= 0:
+            return False
+        with self._ws_lock:
+            return time.time() - self._last_activity_time >= self.idle_timeout and not self._subscriptions
+    
+    def _check_heartbeat(self):
+        """
+        应用层心跳：服务器按客户端发送的消息判断连接是否存活，即使一直在收到推送，
+        距离上次发送超过半个心跳周期也发送 ping（两次发送的间隔不超过 1.5 个心跳周期）；
+        超过两个心跳周期仍没有收到任何消息（包括 pong），认为连接已失效，断开后由连接线程重连
+        """
+        now = time.time()
+        silent = now - self._last_recv_time
+        ws = self._ws
+        try:
+            if silent >= self.heartbeat_interval * 2 + self.ping_timeout:
+                logger.warning(f"WebSocket已{silent:.0f}秒没有收到消息，断开后重连")
+                ws.close()
+            elif now - self._last_send_time >= self.heartbeat_interval / 2:
+                ws.send(json.dumps({"method": "ping"}))
+                self._last_send_time = now
+        except Exception as e:
+            logger.warning(f"发送WebSocket心跳失败: {str(e)}")
     
-    # 移除订阅相关功能
+    def _resubscribe(self, ws):
+        """连接建立后重新发送登记表中的所有订阅"""
+        with self._ws_lock:
+            subscriptions = [entry["message"] for entry in self._subscriptions.values()]
+        for subscription_data in subscriptions:
+            try:
+                ws.send(json.dumps(subscription_data))
+                self._last_send_time = time.time()
+                logger.info(f"已恢复WebSocket订阅: {subscription_data.get('subscription')}")
+            except Exception as e:
+                logger.error(f"恢复WebSocket订阅失败: {str(e)}")
+    
+    def _start_threads(self):
+        """启动连接线程和调度线程（调用方持有锁）"""
+        self._ws_should_run = True
+        self._stop_event.clear()
+        self._ws_thread = threading.Thread(target=self._ws_connect, name="WebSocketConnect")
+        self._ws_thread.daemon = True
+        self._ws_thread.start()
+        
+        if not (self._monitor_thread and self._monitor_thread.is_alive()):
+            self._monitor_thread = threading.Thread(target=self._monitor_loop, name="WebSocketMonitor")
+            self._monitor_thread.daemon = True
+            self._monitor_thread.start()
     
-    def ensure_connected(self):
+    def connect(self):
         """
-        确保WebSocket连接已建立，仅在需要时建立连接
+        启动连接（不等待），连接线程已在运行（连接中或等待重连）时不做任何操作
         
         Returns:
-            bool: 连接是否成功
+            bool: 当前是否已连接
         """
         with self._ws_lock:
-            # 更新最后活动时间
             self._last_activity_time = time.time()
-            
-            # 如果已经连接，重置闲置计时器并返回
             if self._ws_connected:
-                self._reset_idle_timer()
-                return True
-            
-            # 如果已经有一个线程在尝试连接，但连接尚未建立
-            if not self._ws_connected and self._ws_thread and self._ws_thread.is_alive():
-                logger.debug("WebSocket连接正在进行中，等待连接完成")
-                # 等待连接建立或超时
-                timeout = 8  # 增加超时时间到8秒
-                start_time = time.time()
-                while not self._ws_connected and time.time() - start_time < timeout:
-                    time.sleep(0.2)  # 稍微增加等待间隔，减少CPU使用
-                
-                if not self._ws_connected:
-                    logger.warning("等待现有WebSocket连接超时，将继续执行")
-                    return False
-                return True
-            
-            # 如果没有活跃的连接线程，则创建一个新的
-            if not self._ws_connected and (not self._ws_thread or not self._ws_thread.is_alive()):
-                logger.debug("正在按需建立新的WebSocket连接")
-                
-                # 清理旧线程（如果有）
-                if self._ws_thread:
-                    self._ws_thread = None
-                
-                # 取消任何存在的闲置计时器
-                self._cancel_idle_timer()
-                
-                self._ws_should_run = True
-                self._ws_thread = threading.Thread(target=self._ws_connect)
-                self._ws_thread.daemon = True
-                self._ws_thread.start()
-                
-                # 等待连接建立或超时
-                timeout = 8  # 增加超时时间到8秒
-                start_time = time.time()
-                while not self._ws_connected and time.time() - start_time < timeout:
-                    time.sleep(0.2)  # 稍微增加等待间隔，减少CPU使用
-                
-                if not self._ws_connected:
-                    logger.warning("新的WebSocket连接未能在预期时间内建立，将继续执行")
-                    return False
                 return True
+            if not (self._ws_thread and self._ws_thread.is_alive()):
+                logger.debug("正在建立新的WebSocket连接")
+                self._start_threads()
+            return False
+    
+    def ensure_connected(self, timeout=8):
+        """
+        确保WebSocket连接已建立，连接线程未运行时启动连接，然后在锁外等待连接建立
         
-        return self._ws_connected
+        Args:
+            timeout: 最长等待时间（秒）
+        
+        Returns:
+            bool: 连接是否成功
+        """
+        if self.connect():
+            return True
+        
+        if not self._connected_event.wait(timeout):
+            logger.warning(f"WebSocket连接未能在{timeout}秒内建立，将继续执行")
+            return False
+        return True
     
     def disconnect(self):
         """
-        主动断开WebSocket连接
+        主动断开WebSocket连接，停止重连和心跳（订阅登记表保留，下次连接时恢复）
         """
         with self._ws_lock:
-            self._cancel_idle_timer()
             self._ws_should_run = False
+            self._stop_event.set()
+            self._connected_event.clear()
             
             if self._ws:
                 try:
@@ -297,8 +373,7 @@ class WebSocketManager:
             
             # 更新最后活动时间
             self._last_activity_time = time.time()
-            # 重置闲置计时器
-            self._reset_idle_timer()
+            self._last_send_time = self._last_activity_time
             
             logger.debug(f"WebSocket消息已发送: {message[:100]}...")
             return True
@@ -307,29 +382,90 @@ class WebSocketManager:
             logger.error(f"发送WebSocket消息时出错: {str(e)}")
             return False
     
-    def subscribe(self, subscription_data):
+    def add_handler(self, channel, handler):
         """
-        发送订阅消息（简化版，不再保存订阅列表）
+        登记频道的消息处理函数
+        
+        Args:
+            channel: 频道名称（消息中的 channel 字段）
+            handler: 处理函数 handler(data)，在WebSocket线程中执行
+        """
+        with self._ws_lock:
+            handlers = self._handlers.get(channel, [])
+            if handler not in handlers:
+                # 复制后替换，消息线程遍历时不需要加锁
+                self._handlers[channel] = handlers + [handler]
+    
+    def remove_handler(self, channel, handler):
+        """取消登记频道的消息处理函数"""
+        with self._ws_lock:
+            handlers = [h for h in self._handlers.get(channel, []) if h != handler]
+            if handlers:
+                self._handlers[channel] = handlers
+            else:
+                self._handlers.pop(channel, None)
+    
+    def subscribe(self, subscription_data, handler=None, channel=None):
+        """
+        订阅（登记到订阅登记表，每次重新连接后自动恢复）
+        相同的订阅只向服务器发送一次，引用计数加一
         
         Args:
             subscription_data: 订阅数据
+            handler: 该订阅频道的消息处理函数，可选
+            channel: 处理函数登记的频道，默认为订阅类型
         
         Returns:
-            bool: 发送是否成功
+            bool: 订阅是否已生效（连接未建立时返回 False，连接建立后自动发送）
         """
-        # 直接发送消息，不保存订阅列表
-        return self.send(subscription_data)
+        if handler is not None:
+            self.add_handler(channel or self._subscription_channel(subscription_data), handler)
+        
+        key = self._subscription_key(subscription_data)
+        with self._ws_lock:
+            entry = self._subscriptions.get(key)
+            if entry is None:
+                entry = self._subscriptions[key] = {"message": subscription_data, "refs": 0}
+            entry["refs"] += 1
+            first = entry["refs"] == 1
+            connected = self._ws_connected
+        
+        if not connected:
+            # 连接建立时会在 _on_ws_open 中统一发送登记表中的订阅
+            return self.ensure_connected()
+        if first:
+            return self.send(subscription_data)
+        return True
     
-    def unsubscribe(self, subscription_data):
+    def unsubscribe(self, subscription_data, handler=None, channel=None):
         """
-        发送取消订阅消息（简化版）
+        取消订阅，引用计数减一，最后一个订阅者取消时才向服务器发送取消订阅消息
         
         Args:
             subscription_data: 订阅数据
+            handler: subscribe 时登记的消息处理函数，可选
+            channel: 处理函数登记的频道，默认为订阅类型
         
         Returns:
-            bool: 发送是否成功
+            bool: 发送是否成功（不需要发送时返回 True）
         """
+        if handler is not None:
+            self.remove_handler(channel or self._subscription_channel(subscription_data), handler)
+        
+        key = self._subscription_key(subscription_data)
+        with self._ws_lock:
+            entry = self._subscriptions.get(key)
+            if entry is None:
+                return True
+            entry["refs"] -= 1
+            if entry["refs"] > 0:
+                return True
+            del self._subscriptions[key]
+            connected = self._ws_connected
+        
+        if not connected:
+            return True
+        
         # 构建取消订阅消息
         if isinstance(subscription_data, dict):
             unsubscribe_data = subscription_data.copy()
@@ -341,6 +477,16 @@ class WebSocketManager:
         # 发送取消订阅消息
         return self.send(unsubscribe_data)
     
+    def subscriptions(self):
+        """
+        当前的订阅
+        
+        Returns:
+            dict: 订阅内容 -> 引用计数
+        """
+        with self._ws_lock:
+            return {key: entry["refs"] for key, entry in self._subscriptions.items()}
+    
     def is_connected(self):
         """
         检查WebSocket是否已连接
@@ -360,21 +506,21 @@ class WebSocketManager:
         """
         with self._ws_lock:
             self.idle_timeout = timeout
-            logger.info(f"WebSocket闲置超时已设置为{timeout}秒")
-            
-            # 如果已连接，重置计时器
-            if self._ws_connected:
-                self._reset_idle_timer()
+            self._last_activity_time = time.time()
+        logger.info(f"WebSocket闲置超时已设置为{timeout}秒")
 
 
-def create_hyperliquid_ws_manager(env="mainnet", on_message=None, idle_timeout=60):
+def create_hyperliquid_ws_manager(env="mainnet", on_message=None, idle_timeout=0, heartbeat_interval=30,
+                                  reconnect_max_delay=60):
     """
     创建Hyperliquid WebSocket管理器
     
     Args:
         env: 环境，"mainnet"或"testnet"
         on_message: 消息处理回调函数
-        idle_timeout: 闲置超时时间（秒）
+        idle_timeout: 闲置超时时间（秒），0表示保持长连接
+        heartbeat_interval: 心跳间隔（秒），服务器60秒没有收到消息会断开连接
+        reconnect_max_delay: 重连的最大退避时间（秒）
         
     Returns:
         WebSocketManager: WebSocket管理器实例
@@ -383,7 +529,9 @@ def create_hyperliquid_ws_manager(env="mainnet", on_message=None, idle_timeout=6
     return WebSocketManager(
         url=ws_url,
         on_message=on_message,
-        idle_timeout=idle_timeout
+        idle_timeout=idle_timeout,
+        heartbeat_interval=heartbeat_interval,
+        reconnect_max_delay=reconnect_max_delay
     )
 
 
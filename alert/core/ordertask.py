@@ -1,376 +1,862 @@
 import logging
 import time
-import datetime
+import heapq
+import itertools
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.utils import timezone
 from alert.models import OrderRecord
-from alert.trade.hyperliquid_api import HyperliquidTrader
+from alert.trade.hyperliquid_api import get_trader
+from alert.trade.fills_store import normalize_cloid
 import threading
 from alert.core.async_db import async_db_handler  # 导入异步数据库处理模块
 
 logger = logging.getLogger(__name__)
 
+
+def _is_canceled_push_status(push_status: str) -> bool:
+    """推送的订单状态是否表示订单已被撤销或拒绝（canceled、marginCanceled、rejected等）"""
+    push_status = (push_status or "").lower()
+    return "cancel" in push_status or "rejected" in push_status
+
+
+class MonitoredOrder:
+    """单个被监控订单的运行状态"""
+
+    def __init__(self, order_record_id: int):
+        self.order_record_id = order_record_id
+        self.order_record = None
+        self.start_time = time.monotonic()
+        self.last_status = "UNKNOWN"
+        self.last_filled = 0
+        self.check_count = 0
+        self.cancelling = False          # 是否已进入撤单阶段
+        self.cancel_retry_count = 0
+        self.detected_partial_fill = False
+        self.seen_open = False           # 是否曾在挂单列表中出现过
+        self.push_status = None          # 最近一次推送的订单状态（orderUpdates）
+        self.push_pending = False        # 是否有尚未处理的推送事件
+        self.schedule_seq = None         # 当前有效的调度序号，用于忽略过期的调度项
+
+    @property
+    def elapsed_time(self) -> float:
+        return time.monotonic() - self.start_time
+
+
 class OrderMonitor:
-    """订单监控任务"""
+    """
+    订单监控任务
+    所有订单共享一个调度线程：按下次检查时间维护一个最小堆，
+    有订单到期时运行一个轮询批次（一次挂单查询 + 一次增量成交同步），
+    对所有被监控订单比对状态并分发到对应的处理方法，
+    API调用次数只与轮询频率有关，与订单数量无关。
+    下止损单、更新订单详情等成交后续处理交给工作线程池并行执行，不阻塞轮询批次。
+    启用账户推送后，成交/撤单推送会立即触发处理，轮询降级为低频对账。
+    expiry_mode 为 server 时由交易所定时撤单负责超时撤单，本地只做对账和兜底
+    """
     
     def __init__(self):
-        self.trader = HyperliquidTrader()
-        self._monitor_count = 0
-        self._monitor_lock = threading.Lock()
-        self._batch_orders_cache = {}
-        self._cache_lock = threading.Lock()
-        self._last_batch_query_time = 0
+        self._orders = {}                 # order_record_id -> MonitoredOrder
+        self._heap = []                   # (due_time, seq, order_record_id)
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = None
+        self._scheduler_thread = None
+        self._should_run = True
+        self._tick_running = False        # 同一时间只运行一个轮询批次
+        self._last_tick_time = 0.0
+        self._cloid_index = {}            # cloid -> order_record_id
+        self._oid_index = {}              # 交易所订单号 -> order_record_id
+        self._push_enabled = False
+        self._push_pending = False        # 有推送事件待处理时不受最小轮询间隔限制
+        self._server_expiry_safe = False  # 账户挂单是否全部为受监控的限价单（定时撤单会撤销全部挂单）
+        self._server_expiry_epoch = None  # 计算 _server_expiry_safe 时挂单快照的订单纪元
         
+    @property
+    def trader(self):
+        """共享的交易接口，首次使用时才创建，避免模块导入时建立连接"""
+        return get_trader()
+
     def get_config(self) -> dict:
         """获取配置"""
         return {
             'cancel_timeout': settings.ORDER_MANAGEMENT['default']['cancel_timeout'],
             'retry_interval': settings.ORDER_MANAGEMENT['default']['retry_interval'],
+            'max_retries': settings.ORDER_MANAGEMENT['default']['max_retries'],
+            'expiry_mode': settings.ORDER_MANAGEMENT['default'].get('expiry_mode', 'client'),
+            'server_expiry_tolerance': settings.ORDER_MANAGEMENT['default'].get('server_expiry_tolerance', 5),
+            'server_expiry_grace': settings.ORDER_MANAGEMENT['default'].get('server_expiry_grace', 5),
             'monitor': settings.ORDER_MONITOR_CONFIG
         }
 
-    def _get_order_status_batch(self, orders_to_check):
+    def _get_order_status_batch(self, states):
         """
-        批量获取订单状态
-        :param orders_to_check: 要检查的订单列表 [(symbol, order_id), ...]
-        :return: {order_id: status_dict, ...}
+        批量获取订单状态：一次挂单查询 + 一次增量成交同步，与本地监控订单比对
+        :param states: 要检查的订单状态列表 [MonitoredOrder, ...]
+        :return: {order_record_id: status_dict, ...}，查询失败时返回 None
         """
-        current_time = time.time()
-        cache_ttl = 2  # 缓存有效期（秒）
-        
-        # 如果距离上次查询时间不足TTL，直接返回缓存
-        if current_time - self._last_batch_query_time < cache_ttl:
-            with self._cache_lock:
-                return self._batch_orders_cache.copy()
-        
+        trader = self.trader
+        # 先取订单纪元再查挂单：快照之后提交的订单会使基于该快照的定时撤单失效
+        order_epoch = trader.order_epoch
+        open_result = trader.get_open_orders_by_cloid()
+        if open_result["status"] != "success":
+            logger.error(f"批量查询挂单失败: {open_result.get('error')}")
+            return None
+        open_orders = open_result["orders"]
+
+        # 只有账户挂单全部是受监控的非止损订单时，才能使用会撤销全部挂单的交易所定时撤单
+        with self._condition:
+            managed_keys = set()
+            for monitored in self._orders.values():
+                order_record = monitored.order_record
+                if order_record is not None and not order_record.is_stop_loss:
+                    managed_keys.add(normalize_cloid(order_record.cloid))
+                    managed_keys.add(f"oid:{order_record.order_id}")
+            self._server_expiry_safe = all(key in managed_keys for key in open_orders)
+            self._server_expiry_epoch = order_epoch
+
         try:
-            # 批量查询订单
-            with self._cache_lock:
-                self._last_batch_query_time = current_time
-                self._batch_orders_cache = {}
-                
-                # 按币种分组订单
-                orders_by_coin = {}
-                for symbol, order_id in orders_to_check:
-                    coin = symbol.split('-')[0] if '-' in symbol else symbol
-                    if coin not in orders_by_coin:
-                        orders_by_coin[coin] = []
-                    orders_by_coin[coin].append(int(order_id))  # 确保order_id是整数
-                
-                # 批量查询每个币种的订单
-                for coin, order_ids in orders_by_coin.items():
-                    try:
-                        # 使用info.user_state获取用户订单状态
-                        user_state = self.trader.info.user_state(self.trader.wallet_address)
-                        if user_state and isinstance(user_state, dict):
-                            orders = user_state.get('orders', [])
-                            for order in orders:
-                                order_id = int(order.get('oid', 0))
-                                if order_id in order_ids:
-                                    # 解析订单状态
-                                    status = order.get('status', '')
-                                    filled = float(order.get('filled', 0))
-                                    total = float(order.get('sz', 0))
-                                    
-                                    self._batch_orders_cache[order_id] = {
-                                        'status': 'success',
-                                        'order_status': status,
-                                        'filled_quantity': filled,
-                                        'total_quantity': total
-                                    }
-                    except Exception as e:
-                        logger.error(f"查询币种 {coin} 的订单状态失败: {str(e)}")
-                        continue
-                
-                return self._batch_orders_cache.copy()
-                
+            # 挂单快照之后强制同步，快照前成交离开挂单列表的订单一定能在成交索引中找到
+            trader.fills_store.sync(force=True)
         except Exception as e:
-            logger.error(f"批量查询订单状态失败: {str(e)}")
-            logger.exception(e)
-            return {}
+            # 同步失败时仍可使用已有的成交索引
+            logger.error(f"增量同步成交失败: {str(e)}")
+
+        results = {}
+        for state in states:
+            order_record = state.order_record
+            cloid = normalize_cloid(order_record.cloid)
+            quantity = float(order_record.quantity or 0)
+            order_fills = trader.fills_store.get_order_fills(cloid=cloid, oid=order_record.order_id)
+            filled_quantity = order_fills["filled_quantity"] if order_fills else 0.0
+
+            open_order = open_orders.get(cloid) or open_orders.get(f"oid:{order_record.order_id}")
+            if open_order:
+                state.seen_open = True
+                self._reconcile_order_id(state, open_order)
+                orig_size = float(open_order.get("origSz", quantity) or quantity)
+                remaining = float(open_order.get("sz", 0))
+                # 成交索引可能略滞后，以挂单剩余数量为准
+                filled_quantity = max(filled_quantity, orig_size - remaining)
+                order_status = "PARTIALLY_FILLED" if filled_quantity > 0 else "PENDING"
+            elif order_fills and filled_quantity >= quantity - 1e-9:
+                order_status = "FILLED"
+            elif order_fills:
+                # 已不在挂单列表中且未完全成交：被撤销（有部分成交）
+                order_status = "CANCELED"
+            else:
+                # 不在挂单列表中也没有成交：可能刚成交而成交尚未同步，单独查询交易所确认后再处理
+                order_status = "NOT_FOUND"
+
+            results[state.order_record_id] = {
+                "status": "success",
+                "order_status": order_status,
+                "filled_quantity": filled_quantity,
+                "total_quantity": quantity,
+                "price": order_fills["avg_price"] if order_fills else 0,
+            }
+        return results
+
+    def _get_push_statuses(self, states):
+        """
+        根据推送的订单状态和成交索引得到订单状态，不调用API
+        :param states: 收到推送的订单状态列表 [MonitoredOrder, ...]
+        :return: {order_record_id: status_dict, ...}
+        """
+        fills_store = self.trader.fills_store
+        results = {}
+        for state in states:
+            order_record = state.order_record
+            quantity = float(order_record.quantity or 0)
+            order_fills = fills_store.get_order_fills(cloid=normalize_cloid(order_record.cloid),
+                                                      oid=order_record.order_id)
+            filled_quantity = order_fills["filled_quantity"] if order_fills else 0.0
+            push_status = state.push_status or ""
+
+            if push_status == "open":
+                state.seen_open = True
+            if push_status == "filled" or (order_fills and filled_quantity >= quantity - 1e-9):
+                # 订单推送可能早于成交推送，此时以委托数量作为成交数量
+                order_status = "FILLED"
+                if push_status == "filled":
+                    filled_quantity = max(filled_quantity, quantity)
+            elif _is_canceled_push_status(push_status):
+                order_status = "CANCELED"
+            elif filled_quantity > 0:
+                order_status = "PARTIALLY_FILLED"
+            else:
+                order_status = "PENDING"
+
+            results[state.order_record_id] = {
+                "status": "success",
+                "order_status": order_status,
+                "filled_quantity": filled_quantity,
+                "total_quantity": quantity,
+                "price": order_fills["avg_price"] if order_fills else 0,
+            }
+        return results
+
+    def start_push_updates(self) -> bool:
+        """
+        订阅账户推送，成交和撤单推送到达后立即处理，REST轮询只作为低频对账
+        :return: 推送连接是否已建立
+        """
+        self._ensure_started()
+        self._push_enabled = True
+        return self.trader.start_account_stream(self.on_account_event)
+
+    def is_push_active(self) -> bool:
+        """账户推送是否可用"""
+        return self._push_enabled and self.trader.is_account_stream_connected()
+
+    def on_account_event(self, event_type: str, payload) -> None:
+        """
+        账户推送回调（在WebSocket线程中执行，只标记订单并唤醒调度线程）
+        :param event_type: "order"、"fills" 或 "cancel"
+        :param payload: 推送内容
+        """
+        with self._condition:
+            if event_type == "order":
+                order = payload.get("order", {})
+                state = self._find_state(order.get("cloid"), order.get("oid"))
+                if state is not None:
+                    state.push_status = payload.get("status")
+                    self._mark_pushed(state)
+            elif event_type == "fills":
+                for fill in payload:
+                    state = self._find_state(fill.get("cloid"), fill.get("oid"))
+                    if state is not None:
+                        self._mark_pushed(state)
+            elif event_type == "cancel":
+                state = self._find_state(None, payload.get("oid"))
+                if state is not None:
+                    state.push_status = "canceled"
+                    self._mark_pushed(state)
+
+    def _find_state(self, cloid, oid) -> Optional[MonitoredOrder]:
+        """按cloid或交易所订单号查找被监控的订单（调用方需持有 self._condition）"""
+        order_record_id = None
+        if cloid:
+            order_record_id = self._cloid_index.get(normalize_cloid(cloid))
+        if order_record_id is None and oid is not None:
+            order_record_id = self._oid_index.get(str(oid))
+        return self._orders.get(order_record_id) if order_record_id is not None else None
+
+    def _reconcile_order_id(self, state: MonitoredOrder, open_order: dict) -> None:
+        """附带止损单生效前以cloid作为订单ID，在挂单列表中出现后更新为交易所订单号"""
+        order_record = state.order_record
+        oid = open_order.get("oid")
+        if oid is None or order_record.order_id != order_record.cloid:
+            return
+        with self._condition:
+            self._oid_index.pop(str(order_record.order_id), None)
+            self._oid_index[str(oid)] = state.order_record_id
+        order_record.order_id = str(oid)
+        async_db_handler.async_save(order_record)  # 异步保存，只写入变化的字段
+        logger.info(f"止损单 {order_record.cloid} 已生效，交易所订单号: {oid}")
+
+    def _track_attached_stop(self, order_record, filled_quantity) -> None:
+        """
+        开仓单（全部或部分）成交后，为附带止损单写入止损单记录并加入监控
+        止损单数量为开仓单的已成交数量；交易所订单号在挂单查询中按cloid补全，补全前以cloid作为订单ID
+        """
+        cloid = order_record.attached_stop_cloid
+        stop_record = OrderRecord.objects.filter(cloid=cloid).first()
+        if stop_record is None:
+            from alert.core.ref_cache import ref_cache
+            from alert.trade.hyper_order import calculate_stop_loss_price
+
+            # 触发价格与下单时相同，按开仓委托价格计算
+            symbol_base = order_record.symbol.split('-')[0] if '-' in order_record.symbol else order_record.symbol
+            contract = ref_cache.contract(symbol_base)
+            if contract:
+                trigger_price, _, stop_side = calculate_stop_loss_price(
+                    contract, order_record.side, float(order_record.price)
+                )
+            else:
+                trigger_price = order_record.price
+                stop_side = "sell" if order_record.side == "buy" else "buy"
+            stop_record = OrderRecord.objects.create(
+                order_id=cloid,
+                cloid=cloid,
+                symbol=order_record.symbol,
+                side=stop_side,
+                price=trigger_price,  # 使用触发价格作为价格
+                quantity=filled_quantity,
+                status="PENDING",
+                filled_quantity=None,
+                reduce_only=True,
+                is_stop_loss=True,  # 标记为止损单
+                order_type="CLOSE"
+            )
+            logger.info(f"附带止损单记录已创建: cloid={cloid}, 数量={filled_quantity}")
+        elif float(stop_record.quantity or 0) != float(filled_quantity):
+            # 重启后恢复监控的开仓单成交数量有变化，同步更新止损单数量（包括监控中的实例）
+            with self._condition:
+                state = self._find_state(cloid, None)
+            if state is not None and state.order_record is not None:
+                stop_record = state.order_record
+            stop_record.quantity = filled_quantity
+            async_db_handler.async_save(stop_record)  # 异步保存，只写入变化的字段
+            logger.info(f"附带止损单 {cloid} 数量更新为 {filled_quantity}")
+        self.monitor_order(stop_record.id)
+
+    def _mark_pushed(self, state: MonitoredOrder) -> None:
+        """标记订单收到推送并立即调度（调用方需持有 self._condition）"""
+        if state.cancelling:
+            # 撤单阶段由撤单结果决定订单状态
+            return
+        state.push_pending = True
+        self._push_pending = True
+        self._schedule(state, 0)
+
+    def _ensure_started(self):
+        """首次使用时启动调度线程和工作线程池"""
+        if self._scheduler_thread is not None:
+            return
+        with self._condition:
+            if self._scheduler_thread is not None:
+                return
+            worker_threads = settings.ORDER_MONITOR_CONFIG.get('worker_threads', 4)
+            self._executor = ThreadPoolExecutor(max_workers=worker_threads,
+                                                thread_name_prefix="OrderMonitorWorker")
+            self._scheduler_thread = threading.Thread(target=self._run_scheduler,
+                                                      name="OrderMonitorScheduler")
+            self._scheduler_thread.daemon = True
+            self._scheduler_thread.start()
+            logger.info(f"订单监控调度器已启动 (工作线程数: {worker_threads})")
 
     def monitor_order(self, order_record_id: int) -> None:
         """
-        监控订单状态
+        将订单加入监控，立即返回
         :param order_record_id: 订单记录ID
         """
-        try:
-            # 检查并发限制
-            with self._monitor_lock:
-                if self._monitor_count >= settings.ORDER_MONITOR_CONFIG['max_concurrent']:
-                    logger.warning(f"已达到最大并发监控数量 ({settings.ORDER_MONITOR_CONFIG['max_concurrent']})")
-                    return
-                self._monitor_count += 1
-            
+        self._ensure_started()
+        with self._condition:
+            if order_record_id in self._orders:
+                logger.debug(f"订单记录 {order_record_id} 已在监控中")
+                return
+            state = MonitoredOrder(order_record_id)
+            self._orders[order_record_id] = state
+            self._schedule(state, 0)
+        logger.debug(f"订单记录 {order_record_id} 已加入监控，当前监控数量: {len(self._orders)}")
+
+    def get_monitored_count(self) -> int:
+        """当前监控中的订单数量"""
+        with self._condition:
+            return len(self._orders)
+
+    def _submit_follow_up(self, func, *args) -> None:
+        """
+        将成交后续处理（下止损单、更新订单详情）交给工作线程池，不阻塞轮询批次
+        线程池已关闭时在当前线程执行
+        """
+        def run():
             try:
-                # 获取订单记录
-                order_record = OrderRecord.objects.get(id=order_record_id)
-                logger.info(f"开始监控订单: {order_record.order_id}, 委托时间: {order_record.create_time}")
-                
-                # 获取配置
-                config = self.get_config()
-                monitor_config = config['monitor']
-                cancel_timeout = config['cancel_timeout']
-                
-                # 添加详细日志，输出实际使用的配置值
-                logger.info(f"订单 {order_record.order_id} 监控配置: cancel_timeout={cancel_timeout}秒, "
-                           f"initial_interval={monitor_config['initial_interval']}秒, "
-                           f"normal_interval={monitor_config['normal_interval']}秒, "
-                           f"intensive_interval={monitor_config['intensive_interval']}秒")
-                
-                start_time = datetime.datetime.now()
-                logger.debug(f"订单监控开始时间: {start_time}, 超时时间: {cancel_timeout}秒")
-                
-                cancel_retry_count = 0
-                max_cancel_retries = 2
-                current_interval = monitor_config['initial_interval']
-                
-                # 初始状态检查 - 使用渠道订单号查询
-                initial_status = self.trader.get_order_status(order_record.symbol, order_record.cloid)
-                if initial_status and initial_status["status"] == "success":
-                    if initial_status["order_status"] == "FILLED":
-                        # 订单已成交，直接处理成交逻辑
-                        order_record.status = "FILLED"
-                        order_record.filled_quantity = initial_status["filled_quantity"]
-                        async_db_handler.async_save(order_record)  # 使用异步保存
-                        logger.info(f"订单 {order_record.order_id} 已成交: {initial_status['filled_quantity']}张")
-                        
-                        # 异步更新订单详情（oid、fee、filled_time等）
-                        from alert.core.async_order_record import update_order_details_async
-                        logger.info(f"订单 {order_record.order_id} 已成交，异步更新订单详情")
-                        update_order_details_async(order_record.id)
-                        
-                        # 处理成交后的逻辑
-                        should_end_monitor = self._handle_filled_order(order_record)
-                        if should_end_monitor:
-                            logger.info(f"订单 {order_record.order_id} 处理完成，结束监控线程")
-                            return
-                        else:
-                            logger.info(f"订单 {order_record.order_id} 成交后继续监控")
-                        
-                    elif initial_status["order_status"] in ["PENDING", "PARTIALLY_FILLED"]:
-                        # 如果是 PENDING 状态，保留原始状态
-                        # 如果是 PARTIALLY_FILLED 状态，设置为 PARTIALLY_FILLED
-                        if initial_status["order_status"] == "PARTIALLY_FILLED":
-                            order_record.status = "PARTIALLY_FILLED"
-                            order_record.filled_quantity = initial_status["filled_quantity"]
-                            async_db_handler.async_save(order_record)  # 使用异步保存
-                            logger.info(f"订单 {order_record.order_id} 部分成交，状态: {initial_status['order_status']}")
-                        else:
-                            # PENDING 状态保持不变，不需要更新
-                            logger.info(f"订单 {order_record.order_id} 状态为 PENDING，保持原状态")
-                
-                # 记录上次状态，用于检测状态变化
-                last_status = initial_status["order_status"] if initial_status and initial_status["status"] == "success" else "UNKNOWN"
-                last_filled = initial_status["filled_quantity"] if initial_status and initial_status["status"] == "success" else 0
-                status_check_count = 0
-                
-                # 初始化部分成交检测变量
-                detected_partial_fill = False
-                partial_fill_time = None
-                
-                # 本地计时监控
-                while True:
-                    current_time = datetime.datetime.now()
-                    elapsed_time = (current_time - start_time).total_seconds()
-                    remaining_time = cancel_timeout - elapsed_time
-                    status_check_count += 1
-                    
-                    # 动态调整检查间隔
-                    if remaining_time <= monitor_config['intensive_threshold']:
-                        current_interval = monitor_config['intensive_interval']
-                        if status_check_count % 5 == 0:  # 每5次检查才记录一次日志
-                            logger.debug(f"订单 {order_record.order_id} 接近超时，切换到密集检查模式")
-                    else:
-                        current_interval = monitor_config['normal_interval']
-                    
-                    # 使用渠道订单号查询订单状态
-                    order_status = self.trader.get_order_status(order_record.symbol, order_record.cloid)
-                    
-                    if order_status and order_status["status"] == "success":
-                        current_status = order_status["order_status"]
-                        current_filled = order_status.get("filled_quantity", 0)
-                        
-                        # 只有在状态变化时才记录详细日志
-                        status_changed = current_status != last_status
-                        filled_changed = current_filled != last_filled
-                        
-                        if status_changed or filled_changed:
-                            if current_status == "FILLED":
-                                order_record.status = "FILLED"
-                                order_record.filled_quantity = current_filled
-                                async_db_handler.async_save(order_record)  # 使用异步保存
-                                logger.info(f"订单 {order_record.order_id} 已成交: {current_filled}张")
-                                
-                                # 异步更新订单详情（oid、fee、filled_time等）
-                                from alert.core.async_order_record import update_order_details_async
-                                logger.info(f"订单 {order_record.order_id} 已成交，异步更新订单详情")
-                                update_order_details_async(order_record.id)
-                                
-                                # 处理成交后的逻辑
-                                should_end_monitor = self._handle_filled_order(order_record)
-                                if should_end_monitor:
-                                    logger.info(f"订单 {order_record.order_id} 处理完成，结束监控线程")
-                                    break
-                                else:
-                                    logger.info(f"订单 {order_record.order_id} 成交后继续监控")
-                                
-                            elif current_status == "PARTIALLY_FILLED":
-                                order_record.status = "PARTIALLY_FILLED"
-                                order_record.filled_quantity = current_filled
-                                async_db_handler.async_save(order_record)  # 使用异步保存
-                                logger.info(f"订单 {order_record.order_id} 部分成交: {current_filled}张")
-                                
-                                # 异步更新订单详情（oid、fee、filled_time等）
-                                from alert.core.async_order_record import update_order_details_async
-                                logger.info(f"订单 {order_record.order_id} 部分成交，异步更新订单详情")
-                                update_order_details_async(order_record.id)
-                            elif status_changed:
-                                logger.info(f"订单 {order_record.order_id} 状态变化: {last_status} -> {current_status}")
-                        
-                        # 更新上次状态
-                        last_status = current_status
-                        last_filled = current_filled
-                    
-                    # 检查是否需要撤单
-                    if elapsed_time > cancel_timeout and not order_record.is_stop_loss:
-                        logger.info(f"订单 {order_record.order_id} 已超时 {elapsed_time:.1f}秒，准备撤单")
-                        
-                        # 撤单前再次检查状态
-                        final_check = self.trader.get_order_status(order_record.symbol, order_record.cloid)
-                        if final_check and final_check["status"] == "success":
-                            # 如果订单已完全成交
-                            if final_check["order_status"] == "FILLED":
-                                order_record.status = "FILLED"
-                                order_record.filled_quantity = final_check["filled_quantity"]
-                                async_db_handler.async_save(order_record)  # 使用异步保存
-                                logger.info(f"订单 {order_record.order_id} 在撤单前发现已成交")
-                                
-                                # 异步更新订单详情（oid、fee、filled_time等）
-                                from alert.core.async_order_record import update_order_details_async
-                                logger.info(f"订单 {order_record.order_id} 已成交，异步更新订单详情")
-                                update_order_details_async(order_record.id)
-                                
-                                # 处理成交后的逻辑
-                                should_end_monitor = self._handle_filled_order(order_record)
-                                if should_end_monitor:
-                                    logger.info(f"订单 {order_record.order_id} 处理完成，结束监控线程")
-                                    break
-                                else:
-                                    logger.info(f"订单 {order_record.order_id} 成交后继续监控")
-                            
-                            # 如果订单部分成交
-                            elif final_check["order_status"] == "PARTIALLY_FILLED":
-                                # 标记检测到部分成交
-                                detected_partial_fill = True
-                                
-                                # 更新订单记录
-                                order_record.status = "PARTIALLY_FILLED"
-                                order_record.filled_quantity = final_check["filled_quantity"]
-                                async_db_handler.async_save(order_record)  # 使用异步保存
-                                
-                                logger.info(f"订单 {order_record.order_id} 在超时时仍然是部分成交状态，处理未成交部分")
-                                
-                                # 异步更新订单详情（oid、fee、filled_time等）
-                                from alert.core.async_order_record import update_order_details_async
-                                logger.info(f"订单 {order_record.order_id} 部分成交，异步更新订单详情")
-                                update_order_details_async(order_record.id)
-                                
-                                # 为已成交部分启动止损单
-                                if order_record.filled_quantity > 0:
-                                    logger.info(f"为部分成交订单 {order_record.order_id} 的已成交部分 ({order_record.filled_quantity}张) 启动止损")
-                                    
-                                    # 记录原始数量
-                                    original_quantity = order_record.quantity
-                                    
-                                    # 临时修改订单数量为已成交数量
-                                    order_record.quantity = order_record.filled_quantity
-                                    
-                                    # 导入止损单下单函数
-                                    from alert.trade.hyper_order import place_stop_loss_order
-                                    
-                                    # 下止损单
-                                    success, message = place_stop_loss_order(order_record)
-                                    
-                                    # 恢复原始数量
-                                    order_record.quantity = original_quantity
-                                    
-                                    if success:
-                                        logger.info(f"部分成交订单的止损单已完成: {message}")
-                                    else:
-                                        logger.error(f"部分成交订单的止损单报错: {message}")
-                        
-                        # 执行撤单
-                        while cancel_retry_count < max_cancel_retries:
-                            cancel_result = self.trader.cancel_order_by_id(order_record.symbol, order_record.order_id)
-                            if cancel_result["status"] == "success":
-                                # 更新订单状态
-                                if detected_partial_fill:
-                                    # 如果是部分成交，保持状态为PARTIALLY_FILLED
-                                    logger.info(f"部分成交订单 {order_record.order_id} 的未成交部分已撤单成功")
-                                else:
-                                    # 如果完全未成交，则标记为已取消
-                                    order_record.status = "CANCELLED"
-                                    async_db_handler.async_save(order_record)  # 使用异步保存
-                                    logger.info(f"订单 {order_record.order_id} 撤单成功")
-                                    
-                                    # 已取消的订单不需要再查询详情
-                                    # 注释掉以下代码，避免不必要的API查询
-                                    # from alert.core.async_order_record import update_order_details_async
-                                    # logger.info(f"订单 {order_record.order_id} 已取消，异步更新订单详情")
-                                    # update_order_details_async(order_record.id)
-                                return
-                            
-                            cancel_retry_count += 1
-                            error_msg = cancel_result.get('error', 'Unknown error')
-                            logger.error(f"订单 {order_record.order_id} 撤单失败 (第{cancel_retry_count}次): {error_msg}")
-                            
-                            # 如果撤单失败，等待一段时间后重试
-                            time.sleep(config['retry_interval'])
-                        
-                        # 如果所有撤单尝试都失败
-                        logger.error(f"订单 {order_record.order_id} 撤单失败，已达到最大重试次数")
-                        break
-                    
-                    # 等待下一次检查
-                    time.sleep(current_interval)
-                    
-                    # 每10次检查输出一次调试信息
-                    if status_check_count % 10 == 0:
-                        logger.debug(f"订单 {order_record.order_id} 监控中: 已经过{elapsed_time:.1f}秒，状态={last_status}")
-                
-            except OrderRecord.DoesNotExist:
-                logger.error(f"订单记录不存在: ID={order_record_id}")
+                func(*args)
             except Exception as e:
-                logger.error(f"监控订单时出错: {str(e)}")
+                logger.error(f"订单后续处理 {func.__name__} 出错: {str(e)}")
                 logger.exception(e)
-            finally:
-                # 减少并发计数
-                with self._monitor_lock:
-                    self._monitor_count -= 1
-                    
+
+        try:
+            self._executor.submit(run)
+        except RuntimeError:
+            run()
+
+    def _schedule(self, state: MonitoredOrder, delay: float) -> None:
+        """安排下一次检查（调用方需持有 self._condition）"""
+        seq = next(self._seq)
+        state.schedule_seq = seq
+        heapq.heappush(self._heap, (time.monotonic() + delay, seq, state.order_record_id))
+        self._condition.notify()
+
+    def _run_scheduler(self):
+        """调度线程：有订单到期时合并成一个轮询批次交给工作线程池"""
+        min_tick_interval = settings.ORDER_MONITOR_CONFIG.get('min_tick_interval', 1)
+        while self._should_run:
+            with self._condition:
+                while self._should_run:
+                    if not self._heap or self._tick_running:
+                        self._condition.wait()
+                        continue
+                    due_time = self._heap[0][0]
+                    if not self._push_pending:
+                        due_time = max(due_time, self._last_tick_time + min_tick_interval)
+                    wait_time = due_time - time.monotonic()
+                    if wait_time <= 0:
+                        break
+                    self._condition.wait(wait_time)
+                if not self._should_run:
+                    break
+
+                now = time.monotonic()
+                due_ids = set()
+                while self._heap and self._heap[0][0] <= now:
+                    _, seq, order_record_id = heapq.heappop(self._heap)
+                    state = self._orders.get(order_record_id)
+                    # 忽略已结束或已被重新调度的过期项
+                    if state is not None and state.schedule_seq == seq:
+                        state.schedule_seq = None
+                        due_ids.add(order_record_id)
+                if not due_ids:
+                    continue
+                self._tick_running = True
+                self._push_pending = False
+                self._last_tick_time = now
+
+            try:
+                self._executor.submit(self._run_tick, due_ids)
+            except Exception as e:
+                logger.error(f"提交订单轮询任务失败: {str(e)}")
+                self._finish_tick({order_record_id: settings.ORDER_MONITOR_CONFIG['normal_interval']
+                                   for order_record_id in due_ids})
+
+    def _finish_tick(self, next_delays: dict) -> None:
+        """
+        根据本轮结果重新调度或结束监控
+        :param next_delays: {order_record_id: 下一次检查间隔，None 表示结束监控}
+        """
+        with self._condition:
+            for order_record_id, next_delay in next_delays.items():
+                state = self._orders.get(order_record_id)
+                if state is None:
+                    continue
+                if next_delay is None:
+                    self._forget(state)
+                elif state.schedule_seq is None or state.cancelling:
+                    # 到期的订单和刚进入撤单阶段的订单需要重新调度，其余保留原有调度
+                    self._schedule(state, next_delay)
+            self._tick_running = False
+            self._condition.notify_all()
+
+    def _forget(self, state: MonitoredOrder) -> None:
+        """结束订单监控并清理索引（调用方需持有 self._condition）"""
+        self._orders.pop(state.order_record_id, None)
+        order_record = state.order_record
+        if order_record is not None:
+            self._cloid_index.pop(normalize_cloid(order_record.cloid), None)
+            self._oid_index.pop(str(order_record.order_id), None)
+
+    def _run_tick(self, due_ids: set):
+        """工作线程：执行一个轮询批次"""
+        next_delays = {}
+        try:
+            with self._condition:
+                states = list(self._orders.values())
+
+            ready_states = []
+            cancel_states = []
+            needs_poll = False
+            for state in states:
+                if state.order_record is None:
+                    next_delay = self._load_order(state)
+                    if next_delay is not None:
+                        ready_states.append(state)
+                        needs_poll = True
+                    else:
+                        next_delays[state.order_record_id] = None
+                elif state.cancelling:
+                    # 撤单阶段只在到期时重试撤单
+                    if state.order_record_id in due_ids:
+                        cancel_states.append(state)
+                else:
+                    ready_states.append(state)
+                    if state.order_record_id in due_ids and not state.push_pending:
+                        needs_poll = True
+
+            if needs_poll:
+                # 有订单到了轮询时间：一次REST批量查询覆盖所有订单
+                next_delays.update(self._check_orders(ready_states))
+            else:
+                # 只有推送触发：直接使用推送结果，不调用API
+                pushed_states = [state for state in ready_states if state.push_pending]
+                if pushed_states:
+                    next_delays.update(self._check_orders(pushed_states, from_push=True))
+
+            # 本轮新超时的订单与待重试的订单合并为一次批量撤单
+            cancel_states.extend(state for state in ready_states
+                                 if state.cancelling and next_delays.get(state.order_record_id) is not None)
+            if cancel_states:
+                next_delays.update(self._cancel_orders(cancel_states, self.get_config()))
+
+            self._refresh_server_expiry(next_delays)
         except Exception as e:
-            logger.error(f"订单监控线程异常: {str(e)}")
+            logger.error(f"订单轮询批次出错: {str(e)}")
             logger.exception(e)
+            normal_interval = settings.ORDER_MONITOR_CONFIG['normal_interval']
+            for order_record_id in due_ids:
+                next_delays.setdefault(order_record_id, normal_interval)
+        finally:
+            self._finish_tick(next_delays)
+
+    def _load_order(self, state: MonitoredOrder) -> Optional[float]:
+        """
+        首次检查前加载订单记录
+        :return: 加载失败返回 None
+        """
+        try:
+            state.order_record = OrderRecord.objects.get(id=state.order_record_id)
+        except OrderRecord.DoesNotExist:
+            logger.error(f"订单记录不存在: ID={state.order_record_id}")
+            return None
+        except Exception as e:
+            logger.error(f"加载订单记录 {state.order_record_id} 失败: {str(e)}")
+            return None
+
+        order_record = state.order_record
+        with self._condition:
+            # 建立索引，便于按推送中的cloid/oid找到订单
+            self._cloid_index[normalize_cloid(order_record.cloid)] = state.order_record_id
+            self._oid_index[str(order_record.order_id)] = state.order_record_id
+
+        config = self.get_config()
+        monitor_config = config['monitor']
+        logger.info(f"开始监控订单: {order_record.order_id}, 委托时间: {order_record.create_time}")
+        logger.info(f"订单 {order_record.order_id} 监控配置: cancel_timeout={config['cancel_timeout']}秒, "
+                    f"initial_interval={monitor_config['initial_interval']}秒, "
+                    f"normal_interval={monitor_config['normal_interval']}秒, "
+                    f"intensive_interval={monitor_config['intensive_interval']}秒")
+        return monitor_config['initial_interval']
+
+    def _check_orders(self, states: list, from_push: bool = False) -> dict:
+        """
+        批量检查订单并分发状态变化
+        :param states: 要检查的订单状态列表
+        :param from_push: 是否只使用推送结果（不调用API）
+        :return: {order_record_id: 下一次检查间隔，None 表示结束监控}
+        """
+        config = self.get_config()
+        for state in states:
+            state.push_pending = False
+        if from_push:
+            statuses = self._get_push_statuses(states)
+        else:
+            statuses = self._get_order_status_batch(states)
+        if statuses is None:
+            # 查询失败时保持原有节奏，等待下一轮
+            return {state.order_record_id: self._next_interval(state, config['cancel_timeout']) for state in states}
+
+        handlers = {
+            "FILLED": self._on_filled_status,
+            "PARTIALLY_FILLED": self._on_partially_filled_status,
+            "PENDING": self._on_pending_status,
+            "CANCELED": self._on_canceled_status,
+            "NOT_FOUND": self._on_not_found_status,
+        }
+
+        next_delays = {}
+        for state in states:
+            order_status = statuses[state.order_record_id]
+            try:
+                is_first_check = state.check_count == 0
+                state.check_count += 1
+                handler = handlers.get(order_status["order_status"], self._on_pending_status)
+                if handler(state, order_status, is_first_check):
+                    next_delays[state.order_record_id] = None
+                    continue
+                state.last_status = order_status["order_status"]
+                state.last_filled = order_status["filled_quantity"]
+                if is_first_check:
+                    next_delays[state.order_record_id] = config['monitor']['initial_interval']
+                else:
+                    next_delays[state.order_record_id] = self._after_check(state, order_status, config)
+            except Exception as e:
+                logger.error(f"监控订单 {state.order_record.order_id} 时出错: {str(e)}")
+                logger.exception(e)
+                next_delays[state.order_record_id] = None
+        return next_delays
+
+    def _deadline_ms(self, state: MonitoredOrder, cancel_timeout: float) -> int:
+        """订单的超时撤单时间（毫秒时间戳）"""
+        return int((time.time() + cancel_timeout - state.elapsed_time) * 1000)
+
+    def _covered_by_server_expiry(self, state: MonitoredOrder, config: dict) -> bool:
+        """交易所定时撤单是否会在订单超时时间前后撤销该订单"""
+        server_expiry_time = self.trader.scheduled_cancel_time
+        if server_expiry_time is None or state.order_record.is_stop_loss:
+            return False
+        deadline = self._deadline_ms(state, config['cancel_timeout'])
+        return server_expiry_time <= deadline + config['server_expiry_tolerance'] * 1000
+
+    def _refresh_server_expiry(self, next_delays: dict) -> None:
+        """
+        按当前未超时的订单刷新交易所定时撤单
+        订单超时时间相近时使用最早的超时时间，否则使用最晚的超时时间作为兜底，避免提前撤销较新的订单；
+        账户存在止损单或其他未监控的挂单时清除定时撤单；
+        下单（包括止损单）前交易所接口会先清除定时撤单，挂单快照之后有订单提交时不设置，等下一轮按新快照重新评估
+        """
+        config = self.get_config()
+        if config['expiry_mode'] != 'server':
+            return
+
+        now_ms = int(time.time() * 1000)
+        server_expiry_time = self.trader.scheduled_cancel_time
+
+        with self._condition:
+            states = [state for state in self._orders.values()
+                      if state.order_record is not None and not state.order_record.is_stop_loss
+                      and next_delays.get(state.order_record_id, 0) is not None]
+
+        target = None
+        if states and self._server_expiry_safe:
+            deadlines = sorted(self._deadline_ms(state, config['cancel_timeout']) for state in states)
+            if deadlines[-1] - deadlines[0] <= config['server_expiry_tolerance'] * 1000:
+                target = deadlines[0]
+            else:
+                target = deadlines[-1]
+            # 交易所要求定时撤单时间至少在5秒之后
+            target = max(target, now_ms + 6000)
+
+        if target is None and server_expiry_time is None:
+            return
+        if target is not None and server_expiry_time is not None \
+                and abs(target - server_expiry_time) < 1000:
+            return
+
+        result = self.trader.schedule_cancel(target, epoch=self._server_expiry_epoch)
+        if result["status"] == "success":
+            if target is None:
+                logger.info("已清除交易所定时撤单")
+            else:
+                logger.info(f"交易所定时撤单已设置: {target}，覆盖 {len(states)} 个订单")
+        elif result["status"] == "skipped":
+            logger.debug(f"暂不设置交易所定时撤单: {result.get('error')}")
+        else:
+            logger.warning(f"设置交易所定时撤单失败，使用本地超时撤单: {result.get('error')}")
+
+    def _after_check(self, state: MonitoredOrder, order_status: dict, config: dict) -> Optional[float]:
+        """检查超时，返回下一次检查间隔"""
+        order_record = state.order_record
+        cancel_timeout = config['cancel_timeout']
+        elapsed_time = state.elapsed_time
+
+        if self._covered_by_server_expiry(state, config):
+            # 由交易所定时撤单负责撤单，超过宽限时间仍未撤销时才本地撤单
+            cancel_timeout += config['server_expiry_tolerance'] + config['server_expiry_grace']
+
+        # 检查是否需要撤单
+        if elapsed_time > cancel_timeout and not order_record.is_stop_loss:
+            logger.info(f"订单 {order_record.order_id} 已超时 {elapsed_time:.1f}秒，准备撤单")
+            self._handle_timeout(state, order_status)
+            # 撤单在本轮结束时与其他超时订单合并提交
+            state.cancelling = True
+            return 0
+
+        # 每10次检查输出一次调试信息
+        if state.check_count % 10 == 0:
+            logger.debug(f"订单 {order_record.order_id} 监控中: 已经过{elapsed_time:.1f}秒，状态={state.last_status}")
+
+        return self._next_interval(state, cancel_timeout)
+
+    def _save_fill_progress(self, state: MonitoredOrder, status: str, filled_quantity) -> None:
+        """更新订单成交状态并异步保存"""
+        order_record = state.order_record
+        if not order_record.reduce_only:
+            # 开仓成交后会有止损单挂出，定时撤单不再安全
+            self._server_expiry_safe = False
+        order_record.status = status
+        order_record.filled_quantity = filled_quantity
+        async_db_handler.async_save(order_record)  # 异步保存，只写入变化的字段
+
+        # 在工作线程中更新订单详情（oid、fee、filled_time等）
+        from alert.core.async_order_record import update_order_details_async
+        self._submit_follow_up(update_order_details_async, order_record.id)
+
+    def _on_filled_status(self, state: MonitoredOrder, order_status: dict, is_first_check: bool) -> bool:
+        """
+        处理订单完全成交
+        :return: True 表示结束监控
+        """
+        order_record = state.order_record
+        filled_quantity = order_status["filled_quantity"]
+        logger.info(f"订单 {order_record.order_id} 已成交: {filled_quantity}张，异步更新订单详情")
+        self._save_fill_progress(state, "FILLED", filled_quantity)
+
+        # 成交后的下止损单等处理在工作线程中执行，订单本身结束监控
+        self._submit_follow_up(self._handle_filled_order, order_record)
+        logger.info(f"订单 {order_record.order_id} 已成交，结束监控")
+        return True
+
+    def _on_partially_filled_status(self, state: MonitoredOrder, order_status: dict, is_first_check: bool) -> bool:
+        """处理订单部分成交，成交数量变化时才更新"""
+        order_record = state.order_record
+        filled_quantity = order_status["filled_quantity"]
+        if is_first_check:
+            order_record.status = "PARTIALLY_FILLED"
+            order_record.filled_quantity = filled_quantity
+            async_db_handler.async_save(order_record)  # 异步保存，只写入变化的字段
+            logger.info(f"订单 {order_record.order_id} 部分成交，状态: PARTIALLY_FILLED")
+        elif filled_quantity != state.last_filled:
+            logger.info(f"订单 {order_record.order_id} 部分成交: {filled_quantity}张，异步更新订单详情")
+            self._save_fill_progress(state, "PARTIALLY_FILLED", filled_quantity)
+        return False
+
+    def _on_pending_status(self, state: MonitoredOrder, order_status: dict, is_first_check: bool) -> bool:
+        """处理挂单中的订单"""
+        if is_first_check:
+            # PENDING 状态保持不变，不需要更新
+            logger.info(f"订单 {state.order_record.order_id} 状态为 PENDING，保持原状态")
+        elif order_status["order_status"] != state.last_status:
+            logger.info(f"订单 {state.order_record.order_id} 状态变化: {state.last_status} -> {order_status['order_status']}")
+        return False
+
+    def _on_canceled_status(self, state: MonitoredOrder, order_status: dict, is_first_check: bool) -> bool:
+        """
+        处理已被撤销的订单（交易所撤单或手动撤单）
+        :return: True 表示结束监控
+        """
+        order_record = state.order_record
+        filled_quantity = order_status["filled_quantity"]
+        if filled_quantity > 0:
+            logger.info(f"订单 {order_record.order_id} 已被撤销，已部分成交 {filled_quantity}张")
+            state.detected_partial_fill = True
+            self._save_fill_progress(state, "PARTIALLY_FILLED", filled_quantity)
+            self._submit_follow_up(self._protect_partial_fill, state)
+        else:
+            order_record.status = "CANCELLED"
+            async_db_handler.async_save(order_record)  # 异步保存，只写入变化的字段
+            logger.info(f"订单 {order_record.order_id} 已被撤销")
+        return True
+
+    def _on_not_found_status(self, state: MonitoredOrder, order_status: dict, is_first_check: bool) -> bool:
+        """
+        订单既不在挂单列表中也没有成交记录，单独查询一次交易所确认
+        :return: True 表示结束监控
+        """
+        order_record = state.order_record
+        confirmed = self.trader.get_order_status(order_record.symbol, order_record.cloid)
+        if not confirmed or confirmed["status"] != "success":
+            return False
+        confirmed_status = confirmed["order_status"]
+        if confirmed_status == "FILLED":
+            return self._on_filled_status(state, confirmed, is_first_check)
+        if confirmed_status == "CANCELED":
+            return self._on_canceled_status(state, confirmed, is_first_check)
+        if confirmed_status in ("PENDING", "PARTIALLY_FILLED"):
+            state.seen_open = True
+            order_status.update(confirmed)
+            return False
+        logger.debug(f"订单 {order_record.order_id} 暂未查询到，等待下一轮检查")
+        return False
+
+    def _next_interval(self, state: MonitoredOrder, cancel_timeout: float) -> float:
+        """根据剩余时间计算下一次检查间隔"""
+        monitor_config = settings.ORDER_MONITOR_CONFIG
+        remaining_time = cancel_timeout - state.elapsed_time
+        if self.is_push_active() or self._covered_by_server_expiry(state, self.get_config()):
+            # 推送可用或由交易所定时撤单时，轮询只用于对账
+            interval = monitor_config.get('reconcile_interval', 30)
+        elif remaining_time <= monitor_config['intensive_threshold']:
+            if state.check_count % 5 == 0:  # 每5次检查才记录一次日志
+                logger.debug(f"订单 {state.order_record.order_id} 接近超时，切换到密集检查模式")
+            interval = monitor_config['intensive_interval']
+        else:
+            interval = monitor_config['normal_interval']
+        # 不要越过超时时间点太多
+        if not state.order_record.is_stop_loss and remaining_time > 0:
+            interval = min(interval, remaining_time)
+        return interval
+
+    def _protect_partial_fill(self, state: MonitoredOrder) -> None:
+        """为部分成交的开仓订单的已成交部分下止损单（在工作线程中执行）"""
+        order_record = state.order_record
+        if not order_record.filled_quantity or order_record.reduce_only:
+            return
+        if order_record.attached_stop_cloid:
+            # 附带止损单按开仓单的已成交部分生效，不需要再单独下止损单
+            logger.info(f"部分成交订单 {order_record.order_id} 已附带止损单 {order_record.attached_stop_cloid}")
+            self._track_attached_stop(order_record, order_record.filled_quantity)
+            return
+        logger.info(f"为部分成交订单 {order_record.order_id} 的已成交部分 ({order_record.filled_quantity}张) 启动止损")
+
+        # 止损数量取已成交数量；不临时修改 quantity，轮询批次会并发读取同一个订单记录
+        from alert.trade.hyper_order import place_stop_loss_order
+        success, message = place_stop_loss_order(order_record)
+
+        if success:
+            logger.info(f"部分成交订单的止损单已完成: {message}")
+        else:
+            logger.error(f"部分成交订单的止损单报错: {message}")
+
+    def _handle_timeout(self, state: MonitoredOrder, order_status: dict) -> None:
+        """超时撤单前处理本轮查询到的部分成交"""
+        if order_status["order_status"] != "PARTIALLY_FILLED":
+            return
+        # 标记检测到部分成交
+        state.detected_partial_fill = True
+        logger.info(f"订单 {state.order_record.order_id} 在超时时仍然是部分成交状态，处理未成交部分")
+        self._save_fill_progress(state, "PARTIALLY_FILLED", order_status["filled_quantity"])
+        self._submit_follow_up(self._protect_partial_fill, state)
+
+    def _cancel_orders(self, states: list, config: dict) -> dict:
+        """
+        将本轮所有需要撤单的订单合并为一次批量撤单
+        :return: {order_record_id: 撤单失败需要重试时返回重试间隔，否则为 None}
+        """
+        cancel_result = self.trader.bulk_cancel(
+            [(state.order_record.symbol, state.order_record.order_id) for state in states]
+        )
+        results = cancel_result.get("results") or []
+
+        next_delays = {}
+        for index, state in enumerate(states):
+            if index < len(results):
+                item = results[index]
+            else:
+                item = {"status": "error", "error": cancel_result.get("error", "Unknown error")}
+            next_delays[state.order_record_id] = self._on_cancel_result(state, item, config)
+        return next_delays
+
+    def _on_cancel_result(self, state: MonitoredOrder, cancel_result: dict, config: dict) -> Optional[float]:
+        """
+        处理单个订单的撤单结果
+        :return: 撤单失败需要重试时返回重试间隔，否则返回 None
+        """
+        order_record = state.order_record
+        max_cancel_retries = 2
+
+        if cancel_result["status"] == "success":
+            if state.detected_partial_fill:
+                # 如果是部分成交，保持状态为PARTIALLY_FILLED
+                logger.info(f"部分成交订单 {order_record.order_id} 的未成交部分已撤单成功")
+            else:
+                # 如果完全未成交，则标记为已取消（已取消的订单不需要再查询详情）
+                order_record.status = "CANCELLED"
+                async_db_handler.async_save(order_record)  # 异步保存，只写入变化的字段
+                logger.info(f"订单 {order_record.order_id} 撤单成功")
+            return None
+
+        state.cancel_retry_count += 1
+        error_msg = cancel_result.get('error', 'Unknown error')
+        logger.error(f"订单 {order_record.order_id} 撤单失败 (第{state.cancel_retry_count}次): {error_msg}")
+
+        if state.cancel_retry_count >= max_cancel_retries:
+            logger.error(f"订单 {order_record.order_id} 撤单失败，已达到最大重试次数")
+            return None
+
+        # 撤单失败，等待一段时间后重试（重新调度而不是休眠工作线程）
+        return config['retry_interval']
 
     def _handle_filled_order(self, order_record):
         """
-        处理已成交订单的后续操作
+        处理已成交订单的后续操作（在工作线程中执行，订单本身已结束监控）
         :param order_record: 订单记录对象
-        :return: 如果返回 True，表示应该结束监控线程
         """
         try:
             logger.info(f"处理已成交订单: {order_record.order_id}")
             
             # 判断是开仓还是平仓订单
             if order_record.reduce_only:
-                # 平仓订单成交
+                # 平仓订单成交，不需要再轮询订单状态，也不需要走撤单策略
                 if order_record.is_stop_loss:
                     logger.info(f"止损单 {order_record.order_id} 已成交，完成下单策略")
                 else:
                     logger.info(f"平仓订单 {order_record.order_id} 已成交，完成下单策略")
-                # 不需要再轮询订单状态，也不需要走撤单策略
-                return True
+            elif order_record.attached_stop_cloid:
+                # 止损单已随开仓单一起提交，由交易所在成交后激活
+                logger.info(f"开仓订单 {order_record.order_id} 已成交，附带止损单 {order_record.attached_stop_cloid} 已生效")
+                self._track_attached_stop(order_record, order_record.filled_quantity)
             else:
                 # 开仓订单成交，需要下止损单
                 logger.info(f"开仓订单 {order_record.order_id} 已成交，准备下止损单")
@@ -382,18 +868,22 @@ class OrderMonitor:
                 success, message = place_stop_loss_order(order_record)
                 if success:
                     logger.info(f"止损单已完成: {message}")
-                    # 止损单已成功委托，结束原订单的监控线程
-                    return True
                 else:
                     logger.error(f"止损单报错: {message}")
-                    # 即使止损单下单失败，也应该结束当前订单的监控，因为主订单已经成交
-                    return True
         
         except Exception as e:
             logger.error(f"处理已成交订单时出错: {str(e)}")
             logger.exception(e)
-            # 发生异常时也应该结束监控线程，因为继续监控可能会导致重复处理
-            return True
+
+    def stop(self):
+        """停止订单监控调度器"""
+        logger.info("正在停止订单监控调度器...")
+        with self._condition:
+            self._should_run = False
+            self._condition.notify_all()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        logger.info("订单监控调度器已停止")
 
     def check_pending_orders(self) -> None:
         """
@@ -410,12 +900,12 @@ class OrderMonitor:
             config = self.get_config()
             
             for order in pending_orders:
-                # 如果订单已经超时，直接标记为失败
-                if order.create_time:
-                    elapsed_time = (datetime.datetime.now() - order.create_time).total_seconds()
+                # 如果订单已经超时，直接标记为失败；止损单没有超时，继续监控直到成交或撤销
+                if order.create_time and not order.is_stop_loss:
+                    elapsed_time = (timezone.now() - order.create_time).total_seconds()
                     if elapsed_time > config["cancel_timeout"] * (config["max_retries"] + 1):
                         order.status = "FAILED"
-                        async_db_handler.async_save(order)  # 使用异步保存
+                        async_db_handler.async_save(order)  # 异步保存，只写入变化的字段
                         logger.warning(f"订单 {order.order_id} 已超时，标记为失败")
                         continue
                 
@@ -0,0 +1,163 @@
+import threading
+import logging
+from asgiref.sync import sync_to_async
+from django.db.models.signals import post_save, post_delete
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceDataCache:
+    """
+    参考数据缓存（进程内）
+    缓存 TimeCycle、Strategy、ContractCode 的查询结果，信号处理和下单的热路径不再查询这些表；
+    模型保存或删除时通过 post_save/post_delete 信号清空对应的缓存，后台修改立即生效
+    缓存的是共享的模型实例，调用方只能读取，不能修改后保存
+    """
+
+    TABLES = ('time_cycle', 'strategy', 'contract')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._time_cycles = {}     # 名称 -> TimeCycle
+        self._strategies = {}      # ID -> Strategy，不存在时为 None
+        self._contracts = None     # 所有启用的 ContractCode，按 (交易所ID, symbol) 排序
+        self._hits = dict.fromkeys(self.TABLES, 0)
+        self._misses = dict.fromkeys(self.TABLES, 0)
+        # 每次清空缓存时递增，查询期间缓存被清空则不保存查询结果
+        self._generation = dict.fromkeys(self.TABLES, 0)
+
+    def _count(self, table, hit):
+        """记录命中或未命中，返回当前的缓存版本"""
+        with self._lock:
+            if hit:
+                self._hits[table] += 1
+            else:
+                self._misses[table] += 1
+            return self._generation[table]
+
+    def time_cycle(self, name):
+        """
+        按名称获取时间周期，不存在时创建
+        :return: TimeCycle 实例
+        """
+        cached = self._time_cycles.get(name)
+        generation = self._count('time_cycle', cached is not None)
+        if cached is not None:
+            return cached
+
+        from alert.models import TimeCycle
+        instance, created = TimeCycle.objects.get_or_create(name=name)
+        with self._lock:
+            if generation == self._generation['time_cycle']:
+                self._time_cycles[name] = instance
+        return instance
+
+    def strategy(self, strategy_id):
+        """
+        按 ID 获取策略
+        :return: Strategy 实例，不存在时返回 None
+        """
+        if strategy_id in self._strategies:
+            self._count('strategy', True)
+            return self._strategies[strategy_id]
+        generation = self._count('strategy', False)
+
+        from alert.models import Strategy
+        instance = Strategy.objects.select_related('strategy_time_cycle').filter(id=strategy_id).first()
+        with self._lock:
+            if generation == self._generation['strategy']:
+                self._strategies[strategy_id] = instance
+        return instance
+
+    async def atime_cycle(self, name):
+        """time_cycle 的异步版本，命中缓存时不切换线程"""
+        cached = self._time_cycles.get(name)
+        if cached is not None:
+            self._count('time_cycle', True)
+            return cached
+        return await sync_to_async(self.time_cycle)(name)
+
+    async def astrategy(self, strategy_id):
+        """strategy 的异步版本，命中缓存时不切换线程"""
+        strategies = self._strategies
+        if strategy_id in strategies:
+            self._count('strategy', True)
+            return strategies[strategy_id]
+        return await sync_to_async(self.strategy)(strategy_id)
+
+    def _active_contracts(self):
+        contracts = self._contracts
+        generation = self._count('contract', contracts is not None)
+        if contracts is not None:
+            return contracts
+
+        from alert.models import ContractCode
+        # 交易对配置数量很少，一次加载所有启用的配置
+        contracts = list(ContractCode.objects.select_related('exchange').filter(is_active=True)
+                         .order_by('exchange', 'symbol'))
+        with self._lock:
+            if generation == self._generation['contract']:
+                self._contracts = contracts
+        return contracts
+
+    def contract(self, symbol, exchange_id=None):
+        """
+        获取启用的交易对配置
+        :param symbol: 交易对符号
+        :param exchange_id: 交易所ID，None 表示任意交易所（取排序后的第一个）
+        :return: ContractCode 实例，不存在时返回 None
+        """
+        for contract in self._active_contracts():
+            if contract.symbol == symbol and (exchange_id is None or contract.exchange_id == exchange_id):
+                return contract
+        return None
+
+    def invalidate(self, table=None):
+        """
+        清空缓存
+        :param table: 'time_cycle'、'strategy'、'contract'，None 表示全部
+        """
+        with self._lock:
+            if table in (None, 'time_cycle'):
+                self._time_cycles = {}
+            if table in (None, 'strategy'):
+                self._strategies = {}
+            if table in (None, 'contract'):
+                self._contracts = None
+            for name in self.TABLES:
+                if table in (None, name):
+                    self._generation[name] += 1
+        logger.debug(f"参考数据缓存已清空: {table or '全部'}")
+
+    def stats(self):
+        """
+        获取缓存命中统计
+        :return: {表名: {'hits': 命中次数, 'misses': 未命中次数}}
+        """
+        with self._lock:
+            return {table: {'hits': self._hits[table], 'misses': self._misses[table]} for table in self.TABLES}
+
+
+# 创建全局单例实例
+ref_cache = ReferenceDataCache()
+
+# 模型 -> 需要清空的缓存；策略引用时间周期，交易对配置引用交易所
+_INVALIDATE_TABLES = {
+    'alert.TimeCycle': ('time_cycle', 'strategy'),
+    'alert.Strategy': ('strategy',),
+    'alert.ContractCode': ('contract',),
+    'alert.Exchange': ('contract',),
+}
+
+
+def _make_invalidator(tables):
+    def invalidate(sender, **kwargs):
+        for table in tables:
+            ref_cache.invalidate(table)
+    return invalidate
+
+
+for _sender, _tables in _INVALIDATE_TABLES.items():
+    _handler = _make_invalidator(_tables)
+    post_save.connect(_handler, sender=_sender, weak=False, dispatch_uid=f'ref_cache_save_{_sender}')
+    post_delete.connect(_handler, sender=_sender, weak=False, dispatch_uid=f'ref_cache_delete_{_sender}')
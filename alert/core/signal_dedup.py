@@ -0,0 +1,106 @@
+import hashlib
+import json
+import threading
+import logging
+from collections import OrderedDict
+from django.conf import settings
+import time
+
+logger = logging.getLogger(__name__)
+
+# 信号中可作为幂等键的字段，按顺序取第一个非空值
+IDEMPOTENCY_FIELDS = ('idempotency_key', 'signal_id', 'id')
+# 没有显式 id 时，以信号内容哈希作为幂等键
+CONTENT_KEY_PREFIX = 'sha256:'
+
+
+class SignalDedupCache:
+    """
+    信号幂等缓存（有界，超出容量时淘汰最早的条目；条目在 TTL 后过期）
+    以信号的幂等键（显式 id 字段，或去掉密钥后的信号内容哈希）记录处理结果，
+    TradingView 超时重发的相同信号直接返回第一次的结果，不再执行数据库和策略操作；
+    内容哈希无法区分重发和下一根K线上内容相同的新信号，只在很短的重发窗口（content_ttl）内有效，
+    信号中带有K线时间（如 {{time}}）时该时间也是哈希的一部分
+    """
+
+    # 第一次请求仍在处理时，重复请求得到的结果
+    IN_PROGRESS = object()
+
+    def __init__(self, max_size=None, ttl=None, content_ttl=None):
+        """
+        :param ttl: 显式 id 的有效期（秒）
+        :param content_ttl: 内容哈希的有效期（秒），应覆盖发送方的重发窗口
+        """
+        self.max_size = max_size if max_size is not None else getattr(settings, 'SIGNAL_DEDUP_MAX_SIZE', 10000)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'SIGNAL_DEDUP_TTL', 600)
+        self.content_ttl = content_ttl if content_ttl is not None else getattr(settings, 'SIGNAL_DEDUP_CONTENT_TTL', 30)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()    # 幂等键 -> (过期时间, 结果)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(json_data):
+        """
+        计算信号的幂等键
+        :param json_data: 单个信号的 JSON 对象
+        """
+        for field in IDEMPOTENCY_FIELDS:
+            value = json_data.get(field)
+            if value not in (None, ''):
+                return f"{field}:{value}"
+        content = {k: v for k, v in json_data.items() if k != 'secretkey'}
+        digest = hashlib.sha256(json.dumps(content, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+        return f"{CONTENT_KEY_PREFIX}{digest.hexdigest()}"
+
+    def _ttl(self, key):
+        return self.content_ttl if key.startswith(CONTENT_KEY_PREFIX) else self.ttl
+
+    def _expire(self, now):
+        """删除过期条目（调用方持有锁），从最早写入的条目开始，遇到未过期的条目停止"""
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._entries.popitem(last=False)
+
+    def claim(self, key):
+        """
+        登记一个幂等键
+        :return: (是否为新信号, 之前的结果)；新信号返回 (True, None)，
+                 重复信号返回 (False, 结果)，第一次请求仍在处理时结果为 IN_PROGRESS
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return False, entry[1]
+            # 两种有效期混在一起时过期条目不一定在最前面，这里单独删除
+            self._entries.pop(key, None)
+            self.misses += 1
+            self._entries[key] = (now + self._ttl(key), self.IN_PROGRESS)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return True, None
+
+    def complete(self, key, result):
+        """记录信号的处理结果，之后的重复信号返回该结果"""
+        with self._lock:
+            if key in self._entries:
+                expires_at, _ = self._entries[key]
+                self._entries[key] = (expires_at, result)
+
+    def release(self, key):
+        """处理失败时删除幂等键，允许重发的信号重新处理"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# 创建全局单例实例
+signal_dedup = SignalDedupCache()
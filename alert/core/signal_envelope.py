@@ -0,0 +1,102 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+# 价格定点数的小数位数，与 stra_Alert.price 的精度一致
+PRICE_DECIMALS = 5
+PRICE_SCALE = 10 ** PRICE_DECIMALS
+
+
+def to_fixed_price(price):
+    """
+    价格转换为定点整数（乘以 10^5 后取整）
+    :raises ValueError: 价格不是数值
+    """
+    try:
+        value = Decimal(str(price))
+    except Exception:
+        raise ValueError(f"无效的价格: {price}")
+    if not value.is_finite():
+        raise ValueError(f"无效的价格: {price}")
+    return int((value * PRICE_SCALE).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+class SignalEnvelope:
+    """
+    交易信号
+    在接收、策略过滤、处理队列和下单之间传递，只包含基本类型字段，可以序列化（pickle）；
+    策略和时间周期只保存 ID，需要时从参考数据缓存读取；
+    数据库记录（stra_Alert）由异步写入线程调用 to_model() 生成
+    """
+    __slots__ = ('alert_title', 'symbol', 'scode', 'action', 'price_fp', 'contract_type',
+                 'strategy_id', 'time_circle_id', 'received_ns', 'status', 'save_token')
+
+    MODEL_LABEL = 'alert.stra_Alert'
+
+    def __init__(self, symbol, action, price_fp, contract_type, strategy_id, time_circle_id,
+                 scode=None, alert_title=None, received_ns=None, status=False):
+        self.alert_title = alert_title
+        self.symbol = symbol
+        self.scode = scode
+        self.action = action
+        self.price_fp = price_fp                # 定点价格，price 属性返回 Decimal
+        self.contract_type = contract_type
+        self.strategy_id = strategy_id
+        self.time_circle_id = time_circle_id
+        self.received_ns = received_ns if received_ns is not None else time.time_ns()    # 接收时间（纳秒时间戳）
+        self.status = status                    # 是否有效
+        self.save_token = None                  # 异步保存使用的写入键
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name in self.__slots__:
+            setattr(self, name, state.get(name))
+
+    def __repr__(self):
+        return f"SignalEnvelope({self.symbol} {self.action} {self.price} strategy={self.strategy_id})"
+
+    @property
+    def price(self):
+        return Decimal(self.price_fp).scaleb(-PRICE_DECIMALS)
+
+    @property
+    def created_at(self):
+        """接收时间（UTC）"""
+        return datetime.fromtimestamp(self.received_ns / 1e9, tz=dt_timezone.utc)
+
+    def field_values(self):
+        """stra_Alert 的字段值（字段名 -> 数据库列值，外键为 ID）"""
+        return {
+            'alert_title': self.alert_title,
+            'symbol': self.symbol,
+            'scode': self.scode,
+            'contractType': self.contract_type,
+            'price': self.price,
+            'action': self.action,
+            'status': self.status,
+            'created_at': self.created_at,
+            'time_circle': self.time_circle_id,
+            'strategy': self.strategy_id,
+            'save_token': self.save_token,
+        }
+
+    def to_model(self):
+        """生成 stra_Alert 实例（未保存）"""
+        from alert.models import stra_Alert
+
+        values = self.field_values()
+        return stra_Alert(
+            alert_title=values['alert_title'],
+            symbol=values['symbol'],
+            scode=values['scode'],
+            contractType=values['contractType'],
+            price=values['price'],
+            action=values['action'],
+            status=values['status'],
+            created_at=values['created_at'],
+            time_circle_id=values['time_circle'],
+            strategy_id=values['strategy'],
+            save_token=values['save_token'],
+        )
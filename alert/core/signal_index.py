@@ -0,0 +1,125 @@
+import threading
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# 缓存中表示"数据库中没有之前信号"的占位值
+_NO_SIGNAL = (None, None)
+
+
+class LastSignalIndex:
+    """
+    最近信号索引: (scode, 时间周期ID) -> (交易方向, 触发时间)
+    启动时从数据库预热最近的信号，之后每个信号在入队保存时更新索引，
+    因此即使异步写入尚未落库，重复信号判断也能看到前一个信号；
+    索引中没有的键回退到数据库查询（由 scode/time_circle/created_at 复合索引支撑）并缓存结果
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = {}
+
+    @staticmethod
+    def _key(scode, time_circle):
+        time_circle_id = getattr(time_circle, 'pk', time_circle)
+        return scode, time_circle_id
+
+    def warm_up(self, days=None):
+        """
+        从数据库加载最近 days 天内每个 (scode, 时间周期) 的最后一个信号
+        :return: 加载的键数量
+        """
+        from alert.models import stra_Alert
+
+        if days is None:
+            days = getattr(settings, 'SIGNAL_INDEX_WARM_DAYS', 7)
+        since = timezone.now() - timedelta(days=days)
+        latest = stra_Alert.objects.filter(
+            scode=OuterRef('scode'),
+            time_circle=OuterRef('time_circle'),
+        ).order_by('-created_at').values('id')[:1]
+        rows = stra_Alert.objects.filter(
+            created_at__gte=since,
+            id=Subquery(latest),
+        ).values_list('scode', 'time_circle_id', 'action', 'created_at')
+
+        count = 0
+        with self._lock:
+            for scode, time_circle_id, action, created_at in rows:
+                self._update((scode, time_circle_id), action, created_at)
+                count += 1
+        logger.info(f"最近信号索引预热完成: {count} 个交易代码/周期")
+        return count
+
+    def _update(self, key, action, created_at):
+        """只保留更晚的信号（调用方持有锁）"""
+        current = self._index.get(key)
+        if current is None or current[1] is None or created_at >= current[1]:
+            self._index[key] = (action, created_at)
+
+    def _load(self, key, before):
+        """从数据库查询 before 之前的最后一个信号"""
+        from alert.models import stra_Alert
+
+        scode, time_circle_id = key
+        previous = stra_Alert.objects.filter(
+            scode=scode,
+            time_circle_id=time_circle_id,
+            created_at__lt=before,
+        ).order_by('-created_at').values_list('action', 'created_at').first()
+        return previous or _NO_SIGNAL
+
+    def previous_signal(self, scode, time_circle, before):
+        """
+        获取 before 之前的最后一个信号
+        :return: (交易方向, 触发时间)，没有之前的信号时返回 (None, None)
+        """
+        key = self._key(scode, time_circle)
+        with self._lock:
+            cached = self._index.get(key)
+        if cached is not None and (cached[1] is None or cached[1] < before):
+            return cached
+
+        # 索引中没有该键，或缓存的信号不早于当前信号（乱序到达），查询数据库
+        previous = self._load(key, before)
+        if cached is None:
+            with self._lock:
+                if key not in self._index:
+                    self._index[key] = previous
+        return previous
+
+    def check_and_record(self, scode, time_circle, action, created_at):
+        """
+        判断信号是否与前一个信号方向相同，并把当前信号记入索引
+        同一键的判断和记录在锁内完成，并发到达的重复信号也能被识别
+        :return: (交易方向, 触发时间)，即当前信号之前的最后一个信号
+        """
+        key = self._key(scode, time_circle)
+        with self._lock:
+            cached = self._index.get(key)
+            if cached is not None and (cached[1] is None or cached[1] < created_at):
+                self._update(key, action, created_at)
+                return cached
+
+        previous = self.previous_signal(scode, time_circle, created_at)
+        self.record(scode, time_circle, action, created_at)
+        return previous
+
+    def record(self, scode, time_circle, action, created_at):
+        """记录一个已接收（将被保存）的信号"""
+        key = self._key(scode, time_circle)
+        with self._lock:
+            # 新信号总是该键最后的信号，之后的判断只需要它
+            self._update(key, action, created_at)
+
+    def clear(self):
+        with self._lock:
+            self._index.clear()
+
+
+# 创建全局单例实例
+last_signal_index = LastSignalIndex()
@@ -0,0 +1,81 @@
+import threading
+from queue import Queue, Full, Empty
+import logging
+from django.conf import settings
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SignalIntake:
+    """
+    信号接收队列
+    异步 webhook 解析完请求后把信号放入队列立即返回，由一个接收线程按到达顺序执行过滤、入队和保存，
+    请求处理不再占用线程；按顺序执行保证重复信号判断看到的是前一个到达的信号
+    接收线程在第一次 submit 时启动，导入模块（如 manage.py 命令、自动重载的父进程）不会启动线程
+    """
+
+    def __init__(self, handler, name="SignalIntake"):
+        """
+        :param handler: 处理单个信号的函数
+        """
+        self.handler = handler
+        self.name = name
+        self.queue = Queue(maxsize=getattr(settings, 'SIGNAL_INTAKE_MAX_SIZE', 10000))
+        self._should_run = True
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        """首次使用时启动接收线程"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            thread = threading.Thread(target=self._run, name=self.name)
+            thread.daemon = True
+            thread.start()
+            self._thread = thread
+
+    def submit(self, item):
+        """
+        放入一个信号，不阻塞
+        :return: 是否成功放入，队列已满时返回 False
+        """
+        if not self._should_run:
+            logger.warning("信号接收队列已停止，无法添加新信号")
+            return False
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except Full:
+            logger.error(f"信号接收队列已满({self.queue.maxsize})，拒绝新信号")
+            return False
+
+    def _run(self):
+        while self._should_run or not self.queue.empty():
+            try:
+                item = self.queue.get(timeout=1)
+            except Empty:
+                continue
+            try:
+                self.handler(item)
+            except Exception as e:
+                logger.error(f"处理接收的信号时出错: {str(e)}", exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    def stop(self, timeout=30):
+        """停止接收，等待已接收的信号处理完成"""
+        logger.info("正在停止信号接收队列...")
+        self._should_run = False
+        if self._thread is None:
+            return
+        deadline = time.time() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks and time.time() < deadline:
+                self.queue.all_tasks_done.wait(timeout=deadline - time.time())
+        if self._thread.is_alive():
+            self._thread.join(timeout=max(deadline - time.time(), 0))
@@ -1,4 +1,6 @@
 import threading
+import itertools
+from collections import deque
 from queue import PriorityQueue, Empty
 from datetime import datetime
 import logging
@@ -12,7 +14,24 @@ import time
 
 logger = logging.getLogger(__name__)
 
+class SignalLane:
+    """单个交易对的执行通道，通道内的信号严格按顺序执行"""
+
+    def __init__(self, key):
+        self.key = key
+        self.pending = deque()
+        self.running = False      # 是否已有任务在线程池中执行该通道
+        self.processed = 0
+        self.max_depth = 0
+        self.last_active = time.monotonic()    # 最后一次入队或执行完成的时间，用于清理闲置通道
+
+
 class SignalQueueProcessor:
+    """
+    信号处理器
+    信号按交易对分到不同的执行通道：同一交易对的信号严格按顺序执行，
+    避免并发读取持仓和开平仓判断；不同交易对在线程池中并行执行
+    """
     _instance = None
     _lock = threading.Lock()
 
@@ -28,9 +47,18 @@ class SignalQueueProcessor:
             self.max_workers = getattr(settings, 'SIGNAL_QUEUE_MAX_WORKERS', 5)
             self.queue_size = getattr(settings, 'SIGNAL_QUEUE_MAX_SIZE', 1000)
             
+            self.lane_depth_warning = getattr(settings, 'SIGNAL_LANE_DEPTH_WARNING', 10)
+            self.lane_idle_timeout = getattr(settings, 'SIGNAL_LANE_IDLE_TIMEOUT', 600)
+            
             # 使用限制大小的优先级队列
             self.signal_queue = PriorityQueue(maxsize=self.queue_size)
+            self._sequence = itertools.count()  # 相同优先级时按入队顺序，避免比较信号对象
             self._should_run = True
+            
+            # 按交易对划分的执行通道
+            self._lanes = {}
+            self._lanes_lock = threading.Lock()
+            self._last_prune = time.monotonic()
             self.initialized = True
             
             # 创建线程池
@@ -57,7 +85,7 @@ class SignalQueueProcessor:
             if self.signal_queue.full():
                 logger.warning("信号队列已满，等待处理空间...")
             
-            self.signal_queue.put((priority, signal_data), timeout=5)
+            self.signal_queue.put((priority, next(self._sequence), signal_data), timeout=5)
             logger.info(f"信号已加入队列: {signal_data.symbol} {signal_data.action}")
             return True
             
@@ -71,7 +99,7 @@ class SignalQueueProcessor:
             logger.info(f"开始处理信号: {signal_data.symbol} {signal_data.action}")
             
             # 信号在添加到队列前已经过滤过，这里直接处理
-            if signal_data.contractType == 3:  # 虚拟货币
+            if signal_data.contract_type == 3:  # 虚拟货币
                 success = place_hyperliquid_order(signal_data)
                 if success:
                     logger.info(f"信号处理成功: {signal_data.symbol}")
@@ -83,18 +111,103 @@ class SignalQueueProcessor:
         except Exception as e:
             logger.error(f"处理信号时出错: {str(e)}", exc_info=True)
 
+    @staticmethod
+    def _lane_key(signal_data):
+        """信号所属的执行通道：同一交易对（基础币种）共用一个通道"""
+        symbol = str(signal_data.symbol or '')
+        symbol_base = symbol.split('-')[0] if '-' in symbol else symbol
+        return symbol_base.upper()
+
+    def _dispatch_to_lane(self, signal_data):
+        """将信号放入所属通道，通道空闲时提交到线程池"""
+        key = self._lane_key(signal_data)
+        with self._lanes_lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = SignalLane(key)
+                self._lanes[key] = lane
+            lane.pending.append(signal_data)
+            lane.last_active = time.monotonic()
+            depth = len(lane.pending)
+            lane.max_depth = max(lane.max_depth, depth)
+            start_lane = not lane.running
+            if start_lane:
+                lane.running = True
+
+        if depth >= self.lane_depth_warning:
+            logger.warning(f"交易对 {key} 的信号通道积压: {depth} 个信号待处理")
+        if start_lane:
+            self.thread_pool.submit(self._run_lane, lane)
+
+    def _run_lane(self, lane):
+        """执行通道中的下一个信号，完成后如仍有积压则重新提交，保证各通道公平占用线程池"""
+        with self._lanes_lock:
+            signal_data = lane.pending.popleft()
+        try:
+            self._process_single_signal(signal_data)
+        finally:
+            lane.processed += 1
+            self.signal_queue.task_done()
+            with self._lanes_lock:
+                lane.last_active = time.monotonic()
+                if lane.pending:
+                    resubmit = True
+                else:
+                    resubmit = False
+                    lane.running = False
+            if resubmit:
+                self.thread_pool.submit(self._run_lane, lane)
+
+    def _prune_idle_lanes(self):
+        """
+        删除闲置超过 lane_idle_timeout 秒且没有积压的通道（及其指标），交易对再次出现时重新创建
+        """
+        now = time.monotonic()
+        if self.lane_idle_timeout <= 0 or now - self._last_prune < min(self.lane_idle_timeout, 60):
+            return
+        self._last_prune = now
+        with self._lanes_lock:
+            idle = [key for key, lane in self._lanes.items()
+                    if not lane.running and not lane.pending and now - lane.last_active >= self.lane_idle_timeout]
+            for key in idle:
+                del self._lanes[key]
+        if idle:
+            logger.debug(f"已清理闲置的信号通道: {', '.join(idle)}")
+
+    def get_lane_metrics(self):
+        """
+        获取执行通道指标
+        :return: {"queue_size": 待分发信号数, "pending": 各通道待处理信号总数,
+                  "lanes": {交易对: {"depth", "max_depth", "running", "processed"}}}
+        """
+        with self._lanes_lock:
+            lanes = {
+                key: {
+                    "depth": len(lane.pending),
+                    "max_depth": lane.max_depth,
+                    "running": lane.running,
+                    "processed": lane.processed,
+                }
+                for key, lane in self._lanes.items()
+            }
+        return {
+            "queue_size": self.signal_queue.qsize(),
+            "pending": sum(lane["depth"] for lane in lanes.values()),
+            "lanes": lanes,
+        }
+
     def _monitor_queue(self):
-        """监控队列并分发任务到线程池"""
-        while self._should_run:
+        """监控队列并将信号分发到各交易对的执行通道"""
+        while self._should_run or not self.signal_queue.empty():
             try:
-                # 从队列获取信号，设置1秒超时
-                priority, signal_data = self.signal_queue.get(timeout=1)
+                # 清理闲置通道（内部限制了执行频率）
+                self._prune_idle_lanes()
                 
-                # 提交到线程池处理
-                self.thread_pool.submit(self._process_single_signal, signal_data)
+                # 从队列获取信号，设置1秒超时
+                priority, _, signal_data = self.signal_queue.get(timeout=1)
                 
-                # 标记任务完成
-                self.signal_queue.task_done()
+                # 分发到交易对通道，信号执行完成后再标记任务完成
+                self._dispatch_to_lane(signal_data)
                 
             except Empty:
                 # 队列为空，正常情况，继续等待
@@ -111,13 +224,18 @@ class SignalQueueProcessor:
         
         try:
             # 等待所有任务完成，设置超时时间
-            if self.signal_queue.all_tasks_done.wait(timeout=30):
+            deadline = time.time() + 30
+            with self.signal_queue.all_tasks_done:
+                while self.signal_queue.unfinished_tasks and time.time() < deadline:
+                    self.signal_queue.all_tasks_done.wait(timeout=deadline - time.time())
+                all_done = not self.signal_queue.unfinished_tasks
+            if all_done:
                 logger.info("所有信号处理任务已完成")
             else:
-                logger.warning("等待信号处理任务完成超时")
+                logger.warning(f"等待信号处理任务完成超时，通道状态: {self.get_lane_metrics()}")
             
             # 关闭线程池
-            self.thread_pool.shutdown(wait=True, timeout=30)
+            self.thread_pool.shutdown(wait=True)
             
             if self.queue_monitor_thread.is_alive():
                 self.queue_monitor_thread.join(timeout=30)
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2025-03-24 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alert', '0025_rename_strategy_id_stra_alert_strategy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FillRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wallet_address', models.CharField(max_length=66, verbose_name='钱包地址')),
+                ('tid', models.BigIntegerField(verbose_name='成交ID')),
+                ('oid', models.BigIntegerField(db_index=True, verbose_name='订单ID')),
+                ('cloid', models.CharField(blank=True, db_index=True, max_length=50, null=True, verbose_name='渠道订单ID')),
+                ('coin', models.CharField(max_length=20, verbose_name='交易对')),
+                ('side', models.CharField(max_length=10, verbose_name='方向')),
+                ('price', models.DecimalField(decimal_places=8, max_digits=18, verbose_name='成交价格')),
+                ('size', models.DecimalField(decimal_places=8, max_digits=18, verbose_name='成交数量')),
+                ('fee', models.DecimalField(decimal_places=8, default=0, max_digits=18, verbose_name='手续费')),
+                ('fee_token', models.CharField(blank=True, max_length=20, verbose_name='手续费币种')),
+                ('direction', models.CharField(blank=True, help_text='例如 Open Long、Close Short', max_length=30, verbose_name='成交类型')),
+                ('closed_pnl', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True, verbose_name='平仓盈亏')),
+                ('fill_time', models.BigIntegerField(help_text='交易所返回的毫秒时间戳', verbose_name='成交时间戳')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '成交明细',
+                'verbose_name_plural': '成交明细',
+                'db_table': 'fill_record',
+                'indexes': [models.Index(fields=['wallet_address', 'fill_time'], name='fill_record_wallet_time_idx')],
+                'unique_together': {('wallet_address', 'tid', 'oid')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2025-03-25 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alert', '0026_fillrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderrecord',
+            name='attached_stop_cloid',
+            field=models.CharField(blank=True, help_text='与开仓单一起提交的止损单cloid，成交后不再单独下止损单', max_length=50, null=True, verbose_name='附带止损单ID'),
+        ),
+    ]
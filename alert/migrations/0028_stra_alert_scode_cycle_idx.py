@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2025-03-26 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alert', '0027_orderrecord_attached_stop_cloid'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stra_alert',
+            index=models.Index(fields=['scode', 'time_circle', 'created_at'], name='stra_alert_scode_cycle_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2025-03-27 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alert', '0028_stra_alert_scode_cycle_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stra_alert',
+            name='save_token',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True, unique=True, verbose_name='写入键'),
+        ),
+    ]
@@ -3,6 +3,72 @@ from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 
 
+class DirtyFieldsMixin:
+    """
+    字段变更跟踪
+    从数据库加载时记录各字段的值，save() 时只更新发生变化的字段，没有变化则跳过写入
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_fields()
+        return instance
+
+    def snapshot_fields(self, fields=None, values=None):
+        """
+        记录字段当前值作为比较基准
+        :param fields: 需要记录的字段名，None 表示所有已加载的字段
+        :param values: 字段名 -> 值，记录这些值而不是当前值（如异步写入提交的值），此时忽略 fields
+        """
+        loaded = dict(getattr(self, '_loaded_values', None) or {})
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            if values is not None:
+                if field.name in values:
+                    loaded[field.attname] = values[field.name]
+            elif fields is None or field.name in fields or field.attname in fields:
+                loaded[field.attname] = getattr(self, field.attname)
+        # 赋值新字典而不是原地修改，对象副本之间不共享基准
+        self._loaded_values = loaded
+
+    def has_snapshot(self):
+        """是否有可用于比较的基准（从数据库加载或保存过的对象）"""
+        return getattr(self, '_loaded_values', None) is not None
+
+    def get_dirty_fields(self):
+        """
+        获取与基准相比发生变化的字段
+        :return: 字段名集合；没有基准时返回 None，表示无法判断
+        """
+        if not self.has_snapshot():
+            return None
+        dirty = set()
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            if field.attname not in self._loaded_values \
+                    or self._loaded_values[field.attname] != getattr(self, field.attname):
+                dirty.add(field.name)
+        return dirty
+
+    def save(self, *args, **kwargs):
+        if kwargs.get('update_fields') is None and not self._state.adding and self.has_snapshot():
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            # auto_now 字段（如更新时间）随变更一起写入
+            dirty.update(field.name for field in self._meta.concrete_fields if getattr(field, 'auto_now', False))
+            kwargs['update_fields'] = dirty
+        super().save(*args, **kwargs)
+        self.snapshot_fields(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.snapshot_fields(kwargs.get('fields'))
+
+
 class TimeCycle(models.Model):
     name = models.CharField(max_length=20, verbose_name="应用周期名称")
 
@@ -68,7 +134,7 @@ class Strategy(models.Model):
     def __str__(self):
         return self.strategy_name
 
-class stra_Alert(models.Model):
+class stra_Alert(DirtyFieldsMixin, models.Model):
     alert_title = models.CharField(null=True, max_length=255, verbose_name="信号描述")
     symbol = models.CharField(null=True, max_length=70, verbose_name="名称")
     scode = models.CharField(null=True, max_length=30, verbose_name="代码")
@@ -85,6 +151,8 @@ class stra_Alert(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="触发时间")
     time_circle = models.ForeignKey(TimeCycle, on_delete=models.CASCADE, null=True, blank=True, verbose_name="时间周期")
     strategy = models.ForeignKey(Strategy, on_delete=models.CASCADE, null=True, blank=True, verbose_name="策略ID")
+    # 异步写入时生成的写入键，重放预写日志时用来判断记录是否已经写入
+    save_token = models.CharField(null=True, blank=True, unique=True, editable=False, max_length=32, verbose_name="写入键")
 
     def __str__(self):
         return self.scode
@@ -93,6 +161,9 @@ class stra_Alert(models.Model):
         db_table = 'stra_Alert'
         verbose_name = '交易信号提醒'
         verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['scode', 'time_circle', 'created_at'], name='stra_alert_scode_cycle_idx'),
+        ]
 
 
 # 商户类型表
@@ -183,7 +254,7 @@ class ContractCode(models.Model):
 
 
 
-class OrderRecord(models.Model):
+class OrderRecord(DirtyFieldsMixin, models.Model):
     """订单记录表"""
     ORDER_TYPES = (
         ('OPEN', '开仓单'),
@@ -218,6 +289,7 @@ class OrderRecord(models.Model):
     fee = models.DecimalField('手续费', max_digits=18, decimal_places=2, null=True, blank=True, help_text='订单成交的手续费')
     order_type = models.CharField('订单类型', max_length=20, choices=ORDER_TYPES, default='UNKNOWN', help_text='订单类型：开仓单，平仓单')
     filled_time = models.DateTimeField('成交时间', null=True, blank=True, help_text='订单成交时间')
+    attached_stop_cloid = models.CharField('附带止损单ID', max_length=50, null=True, blank=True, help_text='与开仓单一起提交的止损单cloid，成交后不再单独下止损单')
 
     class Meta:
         db_table = 'order_record'
@@ -229,4 +301,33 @@ class OrderRecord(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.symbol} - {self.order_id}"
\ No newline at end of file
+        return f"{self.symbol} - {self.order_id}"
+
+class FillRecord(models.Model):
+    """成交明细表（交易所逐笔成交的本地索引）"""
+    wallet_address = models.CharField('钱包地址', max_length=66)
+    tid = models.BigIntegerField('成交ID')
+    oid = models.BigIntegerField('订单ID', db_index=True)
+    cloid = models.CharField('渠道订单ID', max_length=50, null=True, blank=True, db_index=True)
+    coin = models.CharField('交易对', max_length=20)
+    side = models.CharField('方向', max_length=10)
+    price = models.DecimalField('成交价格', max_digits=18, decimal_places=8)
+    size = models.DecimalField('成交数量', max_digits=18, decimal_places=8)
+    fee = models.DecimalField('手续费', max_digits=18, decimal_places=8, default=0)
+    fee_token = models.CharField('手续费币种', max_length=20, blank=True)
+    direction = models.CharField('成交类型', max_length=30, blank=True, help_text='例如 Open Long、Close Short')
+    closed_pnl = models.DecimalField('平仓盈亏', max_digits=18, decimal_places=8, null=True, blank=True)
+    fill_time = models.BigIntegerField('成交时间戳', help_text='交易所返回的毫秒时间戳')
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+
+    class Meta:
+        db_table = 'fill_record'
+        verbose_name = '成交明细'
+        verbose_name_plural = verbose_name
+        unique_together = ['wallet_address', 'tid', 'oid']
+        indexes = [
+            models.Index(fields=['wallet_address', 'fill_time'], name='fill_record_wallet_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.coin} - {self.oid} - {self.tid}"
@@ -1,5 +1,5 @@
 from django.views.decorators.csrf import csrf_exempt
-from alert.models import stra_Alert
+from alert.core.signal_index import last_signal_index
 from rest_framework.response import Response
 from rest_framework import status
 import logging
@@ -21,20 +21,18 @@ def default_strategy(strategy_id, alert_data):
     try:
         # 获取信号基本信息
         scode = alert_data.scode
-        time_circle = alert_data.time_circle
+        time_circle = alert_data.time_circle_id
         action = alert_data.action
         
-        # 查询数据库中相同scode的之前一个信号，按照created_at倒序排列
-        previous_signal = stra_Alert.objects.filter(
-            scode=scode, 
-            time_circle=time_circle,
-            created_at__lt=alert_data.created_at
-        ).order_by('-created_at').first()
+        # 从最近信号索引获取相同scode和周期的之前一个信号，并记录当前信号
+        previous_action, previous_created_at = last_signal_index.check_and_record(
+            scode, time_circle, action, alert_data.created_at
+        )
 
         # 如果找到之前一个信号，比较它们的action
-        if previous_signal and previous_signal.action == action:
+        if previous_action is not None and previous_action == action:
             # 如果两个信号的action相同，则将当前信号标记为无效
-            logger.warning(f"检测到重复信号: {scode} {action} {time_circle}, 之前信号创建于 {previous_signal.created_at}")
+            logger.warning(f"检测到重复信号: {scode} {action} {time_circle}, 之前信号创建于 {previous_created_at}")
             return False
 
         # 如果没有找到之前一个信号，或者两个信号的action不同，将当前信号标记为有效
@@ -1,3 +1,570 @@
-from django.test import TestCase
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from alert.models import OrderRecord
+from alert.core.db_journal import WriteJournal
+from alert.core.net_check import WebSocketManager
+from alert.core.ordertask import OrderMonitor, MonitoredOrder
+from alert.core.signal_dedup import SignalDedupCache
+from alert.core.signal_envelope import SignalEnvelope, to_fixed_price
+from alert.trade.fills_store import FillsStore, normalize_cloid
+from alert.trade.hyperliquid_api import HyperliquidTrader
+from logs.log import make_cursor, make_record_filter, parse_cursor, read_records_since, tail_records
+
+
+def make_fill(tid, oid, size, price, cloid=None, fee=0, fill_time=None):
+    """构造与 user_fills_by_time 返回格式一致的成交，默认成交时间为当前时间"""
+    if fill_time is None:
+        fill_time = int(time.time() * 1000)
+    return {
+        "tid": tid,
+        "oid": oid,
+        "cloid": cloid,
+        "coin": "BTC",
+        "side": "B",
+        "px": str(price),
+        "sz": str(size),
+        "fee": str(fee),
+        "feeToken": "USDC",
+        "dir": "Open Long",
+        "closedPnl": "0",
+        "time": fill_time,
+    }
+
+
+def make_fills_store():
+    """不访问数据库和交易所的成交索引"""
+    info = mock.Mock()
+    info.user_fills_by_time.return_value = []
+    store = FillsStore(info, "0xabc")
+    store._loaded = True
+    return store
+
+
+class FillsStoreTests(SimpleTestCase):
+    """成交索引：ingest 去重与 get_order_fills 累计"""
+
+    def test_ingest_aggregates_by_cloid_and_oid(self):
+        store = make_fills_store()
+        new_fills = store.ingest([
+            make_fill(1, 100, 2, 10.0, cloid="0xAA", fee=0.1, fill_time=1000),
+            make_fill(2, 100, 3, 20.0, cloid="0xAA", fee=0.2, fill_time=2000),
+        ], persist=False)
+        self.assertEqual(len(new_fills), 2)
+
+        by_cloid = store.get_order_fills(cloid="0xaa")
+        self.assertAlmostEqual(by_cloid["filled_quantity"], 5.0)
+        self.assertAlmostEqual(by_cloid["avg_price"], (2 * 10.0 + 3 * 20.0) / 5)
+        self.assertAlmostEqual(by_cloid["fee"], 0.3)
+        self.assertEqual(by_cloid["fill_count"], 2)
+        self.assertEqual(by_cloid["first_time"], 1000)
+        self.assertEqual(by_cloid["last_time"], 2000)
+        self.assertEqual(by_cloid["last_price"], 20.0)
+
+        by_oid = store.get_order_fills(oid="100")
+        self.assertAlmostEqual(by_oid["filled_quantity"], 5.0)
+
+    def test_ingest_ignores_duplicate_fills(self):
+        store = make_fills_store()
+        fill = make_fill(1, 100, 2, 10.0, cloid="0xaa")
+        store.ingest([fill], persist=False)
+        self.assertEqual(store.ingest([dict(fill)], persist=False), [])
+        self.assertAlmostEqual(store.get_order_fills(cloid="0xaa")["filled_quantity"], 2.0)
+
+    def test_ingest_skips_invalid_fills(self):
+        store = make_fills_store()
+        new_fills = store.ingest([{"tid": "x", "oid": 1}, make_fill(1, 100, 1, 10.0)], persist=False)
+        self.assertEqual(len(new_fills), 1)
+
+    def test_ingest_advances_cursor(self):
+        store = make_fills_store()
+        store.ingest([make_fill(1, 100, 1, 10.0, fill_time=5000), make_fill(2, 100, 1, 10.0, fill_time=3000)],
+                     persist=False)
+        self.assertEqual(store._cursor, 5000)
+
+    def test_get_order_fills_falls_back_to_oid(self):
+        store = make_fills_store()
+        store.ingest([make_fill(1, 100, 1, 10.0)], persist=False)
+        self.assertIsNone(store.get_order_fills(cloid="0xbb"))
+        self.assertAlmostEqual(store.get_order_fills(cloid="0xbb", oid=100)["filled_quantity"], 1.0)
+
+    def test_unknown_order_returns_none(self):
+        store = make_fills_store()
+        self.assertIsNone(store.get_order_fills(cloid="0xaa", oid=1))
+
+    def test_normalize_cloid(self):
+        self.assertEqual(normalize_cloid("0xABC"), "0xabc")
+        self.assertIsNone(normalize_cloid(None))
+
+
+class OrderStatusBatchTests(SimpleTestCase):
+    """批量轮询：一次挂单查询 + 一次成交同步后的订单状态分类"""
+
+    def setUp(self):
+        self.trader = mock.Mock()
+        self.trader.order_epoch = 0
+        self.trader.fills_store = make_fills_store()
+        self.trader.get_open_orders_by_cloid.return_value = {"status": "success", "orders": {}}
+        patcher = mock.patch('alert.core.ordertask.get_trader', return_value=self.trader)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.monitor = OrderMonitor()
+
+    def make_state(self, record_id, cloid, order_id, quantity=5):
+        state = MonitoredOrder(record_id)
+        state.order_record = OrderRecord(id=record_id, order_id=order_id, cloid=cloid, symbol="BTC-USDC",
+                                         side="buy", price=100, quantity=quantity)
+        return state
+
+    def statuses(self, *states):
+        results = self.monitor._get_order_status_batch(list(states))
+        return {order_record_id: result["order_status"] for order_record_id, result in results.items()}
+
+    def test_open_orders_are_pending_or_partially_filled(self):
+        self.trader.get_open_orders_by_cloid.return_value = {"status": "success", "orders": {
+            "0xaa": {"oid": 11, "origSz": "5", "sz": "5"},
+            "0xbb": {"oid": 12, "origSz": "5", "sz": "3"},
+        }}
+        pending = self.make_state(1, "0xAA", "11")
+        partial = self.make_state(2, "0xbb", "12")
+        self.assertEqual(self.statuses(pending, partial), {1: "PENDING", 2: "PARTIALLY_FILLED"})
+        self.assertTrue(pending.seen_open)
+
+    def test_fills_decide_orders_that_left_the_open_list(self):
+        self.trader.fills_store.ingest([
+            make_fill(1, 11, 5, 100.0, cloid="0xaa"),
+            make_fill(2, 12, 2, 100.0, cloid="0xbb"),
+        ], persist=False)
+        filled = self.make_state(1, "0xaa", "11")
+        canceled = self.make_state(2, "0xbb", "12")
+        self.assertEqual(self.statuses(filled, canceled), {1: "FILLED", 2: "CANCELED"})
+
+    def test_seen_open_order_without_fills_is_not_cancelled_unconfirmed(self):
+        state = self.make_state(1, "0xaa", "11")
+        state.seen_open = True
+        self.assertEqual(self.statuses(state), {1: "NOT_FOUND"})
+
+    def test_fills_are_synced_after_the_open_orders_snapshot(self):
+        calls = []
+        self.trader.get_open_orders_by_cloid.side_effect = lambda: calls.append("open") or {
+            "status": "success", "orders": {}}
+        with mock.patch.object(self.trader.fills_store, 'sync',
+                               side_effect=lambda force=False: calls.append(("sync", force))):
+            self.statuses(self.make_state(1, "0xaa", "11"))
+        self.assertEqual(calls, ["open", ("sync", True)])
+
+    def test_open_orders_query_failure_returns_none(self):
+        self.trader.get_open_orders_by_cloid.return_value = {"status": "error", "error": "timeout"}
+        self.assertIsNone(self.monitor._get_order_status_batch([self.make_state(1, "0xaa", "11")]))
+
+
+class BulkCancelTests(SimpleTestCase):
+    """批量撤单：results 与请求一一对应，OrderMonitor 按位置匹配撤单结果"""
+
+    def make_trader(self, response):
+        trader = HyperliquidTrader.__new__(HyperliquidTrader)
+        trader._user_state_cache = mock.Mock()
+        trader.exchange = mock.Mock()
+        trader.exchange.bulk_cancel.return_value = response
+        return trader
+
+    def test_results_keep_input_order_with_invalid_order_id(self):
+        trader = self.make_trader({"status": "ok", "response": {"data": {"statuses": [
+            "success", {"error": "Order was never placed, already canceled, or filled."}
+        ]}}})
+        result = trader.bulk_cancel([("BTC-USDC", "1"), ("BTC-USDC", "bad"), ("ETH", "3")])
+
+        trader.exchange.bulk_cancel.assert_called_once_with([{"coin": "BTC", "oid": 1}, {"coin": "ETH", "oid": 3}])
+        self.assertEqual([item["order_id"] for item in result["results"]], ["1", "bad", "3"])
+        self.assertEqual([item["status"] for item in result["results"]], ["success", "error", "error"])
+        self.assertEqual(result["status"], "partial")
+
+    def test_request_failure_marks_every_order(self):
+        trader = self.make_trader({"status": "err", "response": "User or API Wallet does not exist."})
+        result = trader.bulk_cancel([("BTC", "1"), ("BTC", "2")])
+        self.assertEqual(result["status"], "error")
+        self.assertTrue(all("does not exist" in item["error"] for item in result["results"]))
+
+    def test_missing_statuses_are_errors(self):
+        trader = self.make_trader({"status": "ok", "response": {"data": {"statuses": ["success"]}}})
+        result = trader.bulk_cancel([("BTC", "1"), ("BTC", "2")])
+        self.assertEqual([item["status"] for item in result["results"]], ["success", "error"])
+
+    def test_monitor_pairs_results_with_orders(self):
+        trader = self.make_trader({"status": "ok", "response": {"data": {"statuses": [
+            {"error": "Order was never placed, already canceled, or filled."}, "success"
+        ]}}})
+        states = []
+        for record_id, order_id in ((1, "bad"), (2, "21"), (3, "22")):
+            state = MonitoredOrder(record_id)
+            state.order_record = OrderRecord(id=record_id, order_id=order_id, cloid=f"0x{record_id}",
+                                             symbol="BTC-USDC", side="buy", price=100, quantity=1)
+            states.append(state)
+
+        monitor = OrderMonitor()
+        config = {'retry_interval': 5}
+        with mock.patch('alert.core.ordertask.get_trader', return_value=trader), \
+                mock.patch('alert.core.ordertask.async_db_handler') as db_handler:
+            next_delays = monitor._cancel_orders(states, config)
+
+        self.assertEqual(next_delays, {1: 5, 2: 5, 3: None})
+        self.assertEqual([state.order_record.status for state in states], ["PENDING", "PENDING", "CANCELLED"])
+        db_handler.async_save.assert_called_once_with(states[2].order_record)
+
+
+class WriteJournalTests(SimpleTestCase):
+    """预写日志：重放未完成的记录、全部完成时截断、检查点压缩"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.path = os.path.join(self.directory, 'async_db.journal')
+
+    def open_journal(self, **kwargs):
+        journal = WriteJournal(self.path, sync_mode='always', **kwargs)
+        self.addCleanup(lambda: journal._file.closed or journal.close())
+        return journal
+
+    def append(self, journal, pk, status):
+        return journal.append('alert.OrderRecord', ['alert.OrderRecord', pk], pk, ['status'], {'status': status})
+
+    def test_replay_returns_outstanding_records_after_restart(self):
+        journal = self.open_journal()
+        first = self.append(journal, 1, 'FILLED')
+        second = self.append(journal, 2, 'CANCELLED')
+        third = self.append(journal, 3, 'FILLED')
+        journal.mark_done([second])
+        journal.sync(third)
+        journal.close()
+
+        reopened = self.open_journal()
+        self.assertEqual(reopened.outstanding, 2)
+        records = reopened.pending_records()
+        self.assertEqual([record['seq'] for record in records], [first, third])
+        self.assertEqual(records[0]['values'], {'status': 'FILLED'})
+        self.assertEqual([record['seq'] for record in reopened.pending_records(exclude={first})], [third])
+        self.assertEqual(len(reopened.pending_records(limit=1)), 1)
+        # 重启后的序号从日志中最大的序号继续
+        self.assertEqual(self.append(reopened, 4, 'FILLED'), third + 1)
+
+    def test_truncates_when_every_record_is_done(self):
+        journal = self.open_journal()
+        seqs = [self.append(journal, pk, 'FILLED') for pk in range(3)]
+        journal.mark_done(seqs)
+        self.assertEqual(journal.outstanding, 0)
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+    def test_checkpoint_compaction_keeps_only_outstanding_records(self):
+        journal = self.open_journal(compact_bytes=1024)
+        live = []
+        for pk in range(200):
+            live.append(self.append(journal, pk, 'FILLED'))
+            if len(live) > 3:
+                journal.mark_done([live.pop(0)])
+
+        # 持续有未完成的记录时文件大小仍然有界
+        self.assertLess(os.path.getsize(self.path), 2048)
+        self.assertEqual([record['seq'] for record in journal.pending_records()], live)
+        journal.close()
+
+        reopened = self.open_journal()
+        self.assertEqual(reopened.outstanding, len(live))
+        self.assertEqual([record['seq'] for record in reopened.pending_records()], live)
+
+    def test_ignores_partially_written_last_line(self):
+        journal = self.open_journal()
+        seq = self.append(journal, 1, 'FILLED')
+        journal.close()
+        with open(self.path, 'a', encoding='utf8') as f:
+            f.write('{"seq": 2, "model": "alert.Ord')
+
+        reopened = self.open_journal()
+        self.assertEqual([record['seq'] for record in reopened.pending_records()], [seq])
+
+    def test_rejects_unknown_sync_mode(self):
+        with self.assertRaises(ValueError):
+            WriteJournal(self.path, sync_mode='sometimes')
+
+
+class SignalDedupCacheTests(SimpleTestCase):
+    """信号幂等缓存：claim / complete / release 与两种有效期"""
+
+    def test_claim_complete_and_release(self):
+        cache = SignalDedupCache(max_size=10, ttl=600, content_ttl=30)
+        key = SignalDedupCache.make_key({"signal_id": "abc", "secretkey": "s"})
+        self.assertEqual(key, "signal_id:abc")
+
+        self.assertEqual(cache.claim(key), (True, None))
+        self.assertEqual(cache.claim(key), (False, SignalDedupCache.IN_PROGRESS))
+
+        result = {'status_code': 200, 'status': 'success', 'message': 'ok'}
+        cache.complete(key, result)
+        self.assertEqual(cache.claim(key), (False, result))
+
+        cache.release(key)
+        self.assertEqual(cache.claim(key), (True, None))
+        self.assertEqual(cache.stats(), {'size': 1, 'hits': 2, 'misses': 2})
+
+    def test_content_key_ignores_secret_and_field_order(self):
+        first = SignalDedupCache.make_key({"symbol": "BTC", "action": "buy", "secretkey": "a"})
+        second = SignalDedupCache.make_key({"action": "buy", "symbol": "BTC", "secretkey": "b"})
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith("sha256:"))
+
+    def test_content_keys_expire_before_explicit_ids(self):
+        cache = SignalDedupCache(max_size=10, ttl=600, content_ttl=30)
+        content_key = SignalDedupCache.make_key({"symbol": "BTC", "action": "buy"})
+        id_key = "signal_id:abc"
+        with mock.patch('alert.core.signal_dedup.time.monotonic', return_value=1000.0):
+            cache.claim(content_key)
+            cache.claim(id_key)
+        with mock.patch('alert.core.signal_dedup.time.monotonic', return_value=1031.0):
+            self.assertEqual(cache.claim(content_key), (True, None))
+            self.assertEqual(cache.claim(id_key), (False, SignalDedupCache.IN_PROGRESS))
+
+    def test_evicts_oldest_entry_when_full(self):
+        cache = SignalDedupCache(max_size=2, ttl=600, content_ttl=30)
+        for key in ("id:1", "id:2", "id:3"):
+            cache.claim(key)
+        self.assertEqual(cache.claim("id:1"), (True, None))
+        self.assertEqual(cache.claim("id:3")[0], False)
+
+
+class SignalEnvelopeTests(SimpleTestCase):
+    """交易信号：定点价格、序列化往返和生成 stra_Alert"""
+
+    def make_envelope(self):
+        return SignalEnvelope(symbol="BTC-USDC", action="buy", price_fp=to_fixed_price("65000.123456"),
+                              contract_type=3, strategy_id=7, time_circle_id=2, scode="BTC",
+                              alert_title="test", received_ns=1700000000123456789, status=True)
+
+    def test_to_fixed_price(self):
+        self.assertEqual(to_fixed_price("1.234565"), 123457)
+        self.assertEqual(to_fixed_price(2), 200000)
+        for price in ("abc", "NaN", "Infinity", None):
+            with self.assertRaises(ValueError):
+                to_fixed_price(price)
+
+    def test_price_and_created_at(self):
+        envelope = self.make_envelope()
+        self.assertEqual(envelope.price, Decimal("65000.12346"))
+        self.assertEqual(envelope.created_at.timestamp(), 1700000000.123457)
+
+    def test_pickle_round_trip_keeps_every_field(self):
+        envelope = self.make_envelope()
+        envelope.save_token = "token"
+        restored = pickle.loads(pickle.dumps(envelope))
+        for name in SignalEnvelope.__slots__:
+            self.assertEqual(getattr(restored, name), getattr(envelope, name), name)
+
+    def test_to_model_matches_field_values(self):
+        envelope = self.make_envelope()
+        envelope.save_token = "token"
+        values = envelope.field_values()
+        alert = envelope.to_model()
+        self.assertIsNone(alert.pk)
+        self.assertEqual(alert.price, values['price'])
+        self.assertEqual(alert.contractType, 3)
+        self.assertEqual(alert.strategy_id, 7)
+        self.assertEqual(alert.time_circle_id, 2)
+        self.assertEqual(alert.created_at, envelope.created_at)
+        self.assertEqual(alert.save_token, "token")
+
+
+class LogTailTests(SimpleTestCase):
+    """日志读取：tail_records 倒序读取与 read_records_since 游标增量读取"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.path = os.path.join(self.directory, 'order7.log')
+
+    def write(self, *lines):
+        with open(self.path, 'a', encoding='utf8', newline='') as f:
+            f.write(''.join(lines))
+
+    @staticmethod
+    def line(level, message, module='ordertask'):
+        return f"{level} 2025-03-27 10:00:00,000 {module} 1 2 {message}\n"
+
+    def test_tail_returns_newest_first_with_continuation_lines(self):
+        self.write(self.line("INFO", "first"),
+                   self.line("ERROR", "failed"), "Traceback (most recent call last):\n", "  boom\n",
+                   self.line("DEBUG", "BTC-USDC tick"))
+        records, cursor, truncated = tail_records(self.path)
+        self.assertEqual([record['message'] for record in records],
+                         ["BTC-USDC tick", "failed\nTraceback (most recent call last):\n  boom", "first"])
+        self.assertEqual(records[1]['level'], "ERROR")
+        self.assertFalse(truncated)
+        self.assertEqual(parse_cursor(self.path, cursor), os.path.getsize(self.path))
+
+    def test_tail_limit_and_filter(self):
+        self.write(self.line("INFO", "BTC one"), self.line("DEBUG", "BTC two"),
+                   self.line("WARNING", "ETH three"), self.line("ERROR", "btc four"))
+        records, _, _ = tail_records(self.path, limit=1)
+        self.assertEqual([record['message'] for record in records], ["btc four"])
+
+        accept = make_record_filter(level="INFO", symbol="btc")
+        records, _, _ = tail_records(self.path, accept=accept)
+        self.assertEqual([record['message'] for record in records], ["btc four", "BTC one"])
+
+    def test_tail_skips_unfinished_last_line(self):
+        self.write(self.line("INFO", "done"), "INFO 2025-03-27 10:00:01,000 ordertask 1 2 half")
+        records, cursor, _ = tail_records(self.path)
+        self.assertEqual([record['message'] for record in records], ["done"])
+        self.assertEqual(parse_cursor(self.path, cursor), len(self.line("INFO", "done").encode('utf8')))
+
+    def test_tail_missing_and_empty_file(self):
+        self.assertEqual(tail_records(self.path), ([], None, False))
+        self.write()
+        records, cursor, _ = tail_records(self.path)
+        self.assertEqual(records, [])
+        self.assertEqual(parse_cursor(self.path, cursor), 0)
+
+    def test_read_since_cursor_returns_only_new_records(self):
+        self.write(self.line("INFO", "old"))
+        _, cursor, _ = tail_records(self.path)
+
+        self.write(self.line("INFO", "new one"), self.line("ERROR", "new two"), "  detail\n",
+                   "INFO 2025-03-27 10:00:01,000 ordertask 1 2 partial")
+        records, cursor = read_records_since(self.path, cursor)
+        self.assertEqual([record['message'] for record in records], ["new one", "new two\n  detail"])
+
+        # 未写完的行留到下次读取
+        self.write(" line\n")
+        records, cursor = read_records_since(self.path, cursor)
+        self.assertEqual([record['message'] for record in records], ["partial line"])
+        self.assertEqual(read_records_since(self.path, cursor), ([], cursor))
+
+    def test_read_since_limit_resumes_from_cursor(self):
+        self.write(*(self.line("INFO", f"record {index}") for index in range(5)))
+        records, cursor = read_records_since(self.path, make_cursor(self.path, 0), limit=2)
+        self.assertEqual([record['message'] for record in records], ["record 0", "record 1"])
+        records, cursor = read_records_since(self.path, cursor)
+        self.assertEqual([record['message'] for record in records], ["record 2", "record 3", "record 4"])
+
+    def test_cursor_from_rotated_file_restarts_at_beginning(self):
+        self.write(self.line("INFO", "after rotation"))
+        self.assertEqual(parse_cursor(self.path, make_cursor(self.path, 10)), 10)
+        # 游标来自轮转前的文件（inode 不同）或超出文件大小时从头读取
+        self.assertEqual(parse_cursor(self.path, f"{os.stat(self.path).st_ino + 1}:10"), 0)
+        self.assertEqual(parse_cursor(self.path, make_cursor(self.path, 10 ** 6)), 0)
+        with self.assertRaises(ValueError):
+            parse_cursor(self.path, "garbage")
+
+
+class WebSocketSubscriptionTests(SimpleTestCase):
+    """WebSocket订阅登记表：引用计数、按频道分发和重连后恢复订阅"""
+
+    def setUp(self):
+        self.manager = WebSocketManager("wss://example.invalid/ws", heartbeat_interval=0)
+        # 模拟已建立的连接，不启动连接线程
+        self.manager._ws = mock.Mock()
+        self.manager._ws_connected = True
+
+    @staticmethod
+    def trades(coin):
+        return {"method": "subscribe", "subscription": {"type": "trades", "coin": coin}}
+
+    def sent(self):
+        return [json.loads(call.args[0]) for call in self.manager._ws.send.call_args_list]
+
+    def test_same_subscription_is_sent_once_and_unsubscribed_by_last_subscriber(self):
+        self.assertTrue(self.manager.subscribe(self.trades("BTC")))
+        self.assertTrue(self.manager.subscribe(self.trades("BTC")))
+        self.assertEqual(self.sent(), [self.trades("BTC")])
+        self.assertEqual(list(self.manager.subscriptions().values()), [2])
+
+        self.manager.unsubscribe(self.trades("BTC"))
+        self.assertEqual(len(self.sent()), 1)
+        self.manager.unsubscribe(self.trades("BTC"))
+        self.assertEqual(self.sent()[-1], {"method": "unsubscribe", "subscription": {"type": "trades", "coin": "BTC"}})
+        self.assertEqual(self.manager.subscriptions(), {})
+        # 多余的取消订阅不发送消息
+        self.assertTrue(self.manager.unsubscribe(self.trades("BTC")))
+        self.assertEqual(len(self.sent()), 2)
+
+    def test_messages_are_routed_by_channel(self):
+        trades_handler = mock.Mock()
+        fallback = mock.Mock()
+        self.manager.on_message_callback = fallback
+        self.manager.subscribe(self.trades("BTC"), handler=trades_handler)
+
+        self.manager._on_ws_message(None, json.dumps({"channel": "trades", "data": [{"coin": "BTC"}]}))
+        self.manager._on_ws_message(None, json.dumps({"channel": "pong"}))
+        self.manager._on_ws_message(None, json.dumps({"channel": "user", "data": {}}))
+        trades_handler.assert_called_once_with({"channel": "trades", "data": [{"coin": "BTC"}]})
+        fallback.assert_called_once_with({"channel": "user", "data": {}})
+
+        self.manager.unsubscribe(self.trades("BTC"), handler=trades_handler)
+        self.manager._on_ws_message(None, json.dumps({"channel": "trades", "data": []}))
+        trades_handler.assert_called_once()
+
+    def test_reconnect_restores_registered_subscriptions(self):
+        self.manager.subscribe(self.trades("BTC"))
+        self.manager.subscribe(self.trades("ETH"))
+        self.manager.subscribe(self.trades("ETH"))
+
+        ws = mock.Mock()
+        self.manager._ws = ws
+        self.manager._ws_connected = False
+        self.manager._on_ws_open(ws)
+        restored = sorted(json.loads(call.args[0])["subscription"]["coin"] for call in ws.send.call_args_list)
+        self.assertEqual(restored, ["BTC", "ETH"])
+        self.assertTrue(self.manager.is_connected())
+
+
+class ScheduledCancelTests(SimpleTestCase):
+    """交易所定时撤单：下单前清除，基于旧挂单快照的设置被拒绝"""
+
+    def setUp(self):
+        self.trader = HyperliquidTrader.__new__(HyperliquidTrader)
+        self.trader.exchange = mock.Mock()
+        self.trader.exchange.schedule_cancel.return_value = {"status": "ok", "response": {"type": "default"}}
+        self.trader._schedule_lock = threading.Lock()
+        self.trader._scheduled_cancel_time = None
+        self.trader._order_epoch = 0
+        self.trader._orders_in_flight = 0
+
+    def future_ms(self, seconds=60):
+        return int((time.time() + seconds) * 1000)
+
+    def test_order_submission_clears_active_schedule(self):
+        target = self.future_ms()
+        epoch = self.trader.order_epoch
+        self.assertEqual(self.trader.schedule_cancel(target, epoch=epoch)["status"], "success")
+        self.assertEqual(self.trader.scheduled_cancel_time, target)
+
+        self.trader._begin_order_submission()
+        self.trader.exchange.schedule_cancel.assert_called_with(None)
+        self.assertIsNone(self.trader.scheduled_cancel_time)
+        self.trader._end_order_submission()
+
+    def test_schedule_from_stale_snapshot_is_skipped(self):
+        epoch = self.trader.order_epoch
+        self.trader._begin_order_submission()
+        # 提交中和提交完成后，基于旧快照的设置都不生效
+        self.assertEqual(self.trader.schedule_cancel(self.future_ms(), epoch=self.trader.order_epoch)["status"],
+                         "skipped")
+        self.trader._end_order_submission()
+        self.assertEqual(self.trader.schedule_cancel(self.future_ms(), epoch=epoch)["status"], "skipped")
+        self.trader.exchange.schedule_cancel.assert_not_called()
+
+        # 清除不受订单纪元限制
+        self.assertEqual(self.trader.schedule_cancel(None, epoch=epoch)["status"], "success")
+
+    def test_expired_schedule_is_not_reported(self):
+        self.trader._scheduled_cancel_time = self.future_ms(-1)
+        self.assertIsNone(self.trader.scheduled_cancel_time)
+        self.trader._begin_order_submission()
+        self.trader._end_order_submission()
+        self.trader.exchange.schedule_cancel.assert_not_called()
@@ -0,0 +1,288 @@
+import logging
+import threading
+import time
+from decimal import Decimal
+from alert.models import FillRecord
+from alert.core.async_db import async_db_handler
+
+logger = logging.getLogger(__name__)
+
+# user_fills_by_time 单次返回的最大条数
+FILLS_PAGE_SIZE = 2000
+
+
+def normalize_cloid(cloid):
+    """统一cloid格式，便于作为索引键"""
+    if cloid is None:
+        return None
+    return str(cloid).lower()
+
+
+class FillsStore:
+    """
+    本地成交索引
+    1. 内存中按 cloid / oid 建立索引，O(1)查询单个订单的累计成交
+    2. 通过 user_fills_by_time 按时间游标增量同步，不再全量下载成交历史
+    3. 新成交异步落库到 fill_record 表，重启后从数据库恢复
+    """
+
+    def __init__(self, info, wallet_address, lookback_days=7, min_sync_interval=1.0):
+        """
+        :param info: Hyperliquid Info对象
+        :param wallet_address: 钱包地址
+        :param lookback_days: 内存中保留的成交天数
+        :param min_sync_interval: 两次增量同步之间的最小间隔（秒）
+        """
+        self.info = info
+        self.wallet_address = wallet_address
+        self.lookback_ms = int(lookback_days * 24 * 3600 * 1000)
+        self.min_sync_interval = min_sync_interval
+
+        self._lock = threading.Lock()        # 保护内存索引
+        self._sync_lock = threading.Lock()   # 保证同一时间只有一个同步请求
+        self._fills = {}       # (tid, oid) -> fill
+        self._by_cloid = {}    # cloid -> 订单累计成交
+        self._by_oid = {}      # oid -> 订单累计成交
+        self._cursor = None    # 已同步到的最新成交时间（毫秒）
+        self._coverage_start = None  # 内存索引覆盖的最早时间（毫秒）
+        self._loaded = False
+        self._last_sync = 0.0
+
+    def _ensure_loaded(self):
+        """首次使用时从数据库恢复回看窗口内的成交"""
+        if self._loaded:
+            return
+        with self._sync_lock:
+            if self._loaded:
+                return
+            now_ms = int(time.time() * 1000)
+            self._coverage_start = now_ms - self.lookback_ms
+            try:
+                records = FillRecord.objects.filter(
+                    wallet_address=self.wallet_address,
+                    fill_time__gte=self._coverage_start
+                ).order_by('fill_time')
+                fills = [self._record_to_fill(record) for record in records]
+                self.ingest(fills, persist=False)
+                logger.info(f"成交索引已从数据库恢复 {len(fills)} 条成交")
+            except Exception as e:
+                logger.error(f"从数据库恢复成交索引失败: {str(e)}")
+            if self._cursor is None:
+                self._cursor = self._coverage_start
+            self._loaded = True
+
+    @staticmethod
+    def _record_to_fill(record):
+        """将数据库记录转换为与API一致的成交格式"""
+        return {
+            "tid": record.tid,
+            "oid": record.oid,
+            "cloid": record.cloid,
+            "coin": record.coin,
+            "side": record.side,
+            "px": str(record.price),
+            "sz": str(record.size),
+            "fee": str(record.fee),
+            "feeToken": record.fee_token,
+            "dir": record.direction,
+            "closedPnl": str(record.closed_pnl) if record.closed_pnl is not None else None,
+            "time": record.fill_time,
+        }
+
+    def _fill_to_record(self, fill):
+        """将API返回的成交转换为数据库记录"""
+        closed_pnl = fill.get("closedPnl")
+        return FillRecord(
+            wallet_address=self.wallet_address,
+            tid=int(fill.get("tid", 0)),
+            oid=int(fill.get("oid", 0)),
+            cloid=normalize_cloid(fill.get("cloid")),
+            coin=fill.get("coin", ""),
+            side=fill.get("side", ""),
+            price=Decimal(str(fill.get("px", 0))),
+            size=Decimal(str(fill.get("sz", 0))),
+            fee=Decimal(str(fill.get("fee", 0))),
+            fee_token=fill.get("feeToken", "") or "",
+            direction=fill.get("dir", "") or "",
+            closed_pnl=Decimal(str(closed_pnl)) if closed_pnl is not None else None,
+            fill_time=int(fill.get("time", 0)),
+        )
+
+    @staticmethod
+    def _add_to_aggregate(index, key, fill):
+        """将一笔成交累加到订单汇总中"""
+        aggregate = index.get(key)
+        if aggregate is None:
+            aggregate = {
+                "oid": int(fill.get("oid", 0)),
+                "cloid": normalize_cloid(fill.get("cloid")),
+                "coin": fill.get("coin"),
+                "side": fill.get("side"),
+                "filled_quantity": 0.0,
+                "notional": 0.0,
+                "fee": 0.0,
+                "fill_count": 0,
+                "first_time": None,
+                "last_time": 0,
+                "last_price": 0.0,
+            }
+            index[key] = aggregate
+
+        size = float(fill.get("sz", 0))
+        price = float(fill.get("px", 0))
+        fill_time = int(fill.get("time", 0))
+        aggregate["filled_quantity"] += size
+        aggregate["notional"] += size * price
+        aggregate["fee"] += float(fill.get("fee", 0))
+        aggregate["fill_count"] += 1
+        if aggregate["first_time"] is None or fill_time < aggregate["first_time"]:
+            aggregate["first_time"] = fill_time
+        if fill_time >= aggregate["last_time"]:
+            aggregate["last_time"] = fill_time
+            aggregate["last_price"] = price
+
+    def ingest(self, fills, persist=True):
+        """
+        写入成交到内存索引，已存在的成交会被忽略
+        :param fills: API格式的成交列表
+        :param persist: 是否异步落库
+        :return: 新增的成交列表
+        """
+        new_fills = []
+        with self._lock:
+            for fill in fills or []:
+                try:
+                    key = (int(fill.get("tid", 0)), int(fill.get("oid", 0)))
+                except (TypeError, ValueError):
+                    logger.warning(f"无效的成交数据: {fill}")
+                    continue
+                if key in self._fills:
+                    continue
+
+                self._fills[key] = fill
+                self._add_to_aggregate(self._by_oid, key[1], fill)
+                cloid = normalize_cloid(fill.get("cloid"))
+                if cloid:
+                    self._add_to_aggregate(self._by_cloid, cloid, fill)
+
+                fill_time = int(fill.get("time", 0))
+                if self._cursor is None or fill_time > self._cursor:
+                    self._cursor = fill_time
+                new_fills.append(fill)
+
+        if persist:
+            for fill in new_fills:
+                async_db_handler.async_save(self._fill_to_record(fill))
+
+        if new_fills:
+            logger.debug(f"成交索引新增 {len(new_fills)} 条成交")
+        return new_fills
+
+    def sync(self, force=False):
+        """
+        按时间游标增量同步成交
+        :param force: 是否忽略最小同步间隔
+        :return: 新增成交数量
+        """
+        self._ensure_loaded()
+        if not force and time.monotonic() - self._last_sync < self.min_sync_interval:
+            return 0
+
+        with self._sync_lock:
+            # 等待锁期间其他线程可能已经完成同步
+            if not force and time.monotonic() - self._last_sync < self.min_sync_interval:
+                return 0
+
+            new_count = 0
+            start_time = self._cursor
+            while True:
+                fills = self.info.user_fills_by_time(self.wallet_address, start_time)
+                if not fills:
+                    break
+                new_count += len(self.ingest(fills))
+                if len(fills) < FILLS_PAGE_SIZE:
+                    break
+                # 翻页：以本页最新成交时间作为下一页起点
+                last_time = max(int(fill.get("time", 0)) for fill in fills)
+                start_time = last_time if last_time > start_time else start_time + 1
+
+            self._last_sync = time.monotonic()
+            self._prune()
+            if new_count:
+                logger.info(f"成交索引增量同步完成，新增 {new_count} 条成交")
+            return new_count
+
+    def _prune(self):
+        """清理超出回看窗口的成交，控制内存占用"""
+        cutoff = int(time.time() * 1000) - self.lookback_ms
+        if self._coverage_start is not None and cutoff - self._coverage_start < 3600 * 1000:
+            return
+        with self._lock:
+            expired = [key for key, fill in self._fills.items() if int(fill.get("time", 0)) < cutoff]
+            for key in expired:
+                del self._fills[key]
+            self._by_oid = {oid: agg for oid, agg in self._by_oid.items() if agg["last_time"] >= cutoff}
+            self._by_cloid = {cloid: agg for cloid, agg in self._by_cloid.items() if agg["last_time"] >= cutoff}
+            self._coverage_start = cutoff
+        if expired:
+            logger.debug(f"成交索引清理过期成交 {len(expired)} 条")
+
+    @staticmethod
+    def _format_aggregate(aggregate):
+        """输出订单累计成交，附带成交均价(VWAP)"""
+        result = dict(aggregate)
+        filled = result["filled_quantity"]
+        result["avg_price"] = result["notional"] / filled if filled else 0.0
+        return result
+
+    def get_order_fills(self, cloid=None, oid=None, sync=False):
+        """
+        查询单个订单的累计成交
+        :param cloid: 客户端订单ID
+        :param oid: 交易所订单ID
+        :param sync: 查询前是否先增量同步
+        :return: 累计成交信息（filled_quantity、avg_price、fee、fill_count、last_time等），未成交返回None
+        """
+        if sync:
+            self.sync()
+        else:
+            self._ensure_loaded()
+
+        with self._lock:
+            aggregate = None
+            if cloid is not None:
+                aggregate = self._by_cloid.get(normalize_cloid(cloid))
+            if aggregate is None and oid is not None:
+                aggregate = self._by_oid.get(int(oid))
+            return self._format_aggregate(aggregate) if aggregate else None
+
+    def get_fills(self, start_time=None, end_time=None, coin=None):
+        """
+        查询时间范围内的成交
+        :param start_time: 开始时间戳（毫秒）
+        :param end_time: 结束时间戳（毫秒）
+        :param coin: 可选，只返回该币种的成交
+        :return: 按时间升序排列的成交列表
+        """
+        self.sync()
+
+        # 超出本地索引覆盖范围时直接查询交易所
+        if start_time is not None and self._coverage_start is not None and start_time < self._coverage_start:
+            logger.debug("查询范围超出本地成交索引，直接查询交易所")
+            fills = self.info.user_fills_by_time(self.wallet_address, start_time, end_time) or []
+        else:
+            with self._lock:
+                fills = list(self._fills.values())
+
+        result = []
+        for fill in fills:
+            fill_time = int(fill.get("time", 0))
+            if start_time is not None and fill_time < start_time:
+                continue
+            if end_time is not None and fill_time > end_time:
+                continue
+            if coin and str(fill.get("coin", "")).upper() != coin.upper():
+                continue
+            result.append(fill)
+        result.sort(key=lambda fill: int(fill.get("time", 0)))
+        return result
@@ -1,21 +1,64 @@
 import logging
-from alert.models import ContractCode, OrderRecord
-from alert.trade.hyperliquid_api import HyperliquidTrader
+from alert.models import OrderRecord
+from alert.core.ref_cache import ref_cache
+from alert.trade.hyperliquid_api import get_trader
 from alert.core.ordertask import order_monitor
-import threading
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
-def place_hyperliquid_order(alert_data, quantity=None):
+def calculate_stop_loss_price(contract, side, entry_price):
+    """
+    根据交易对配置计算止损价格
+    附带止损单和成交后单独下的止损单使用同一个计算，同一个交易对的止损限价不随下单方式变化
+    :param contract: ContractCode对象
+    :param side: 开仓方向，"buy" 或 "sell"
+    :param entry_price: 开仓价格
+    :return: (触发价格, 限价, 止损方向)，限价在触发价格基础上让出 stop_loss_slippage
+    """
+    stop_loss_percentage = float(contract.stop_loss_percentage)
+    stop_loss_slippage = float(contract.stop_loss_slippage)
+
+    # 使用全局配置中的默认杠杆值
+    leverage = float(settings.HYPERLIQUID_CONFIG.get('default_leverage', 1.0))
+    logger.info(f"使用全局默认杠杆倍数: {leverage}")
+
+    if side.lower() == "buy":
+        # 多单止损价格 = 开仓价格 - (开仓价格 * 止损百分比 / 100 / 杠杆)
+        stop_loss_price = entry_price - (entry_price * stop_loss_percentage / 100 / leverage)
+        stop_loss_side = "sell"  # 多单止损方向为卖出
+    else:
+        # 空单止损价格 = 开仓价格 + (开仓价格 * 止损百分比 / 100 / 杠杆)
+        stop_loss_price = entry_price + (entry_price * stop_loss_percentage / 100 / leverage)
+        stop_loss_side = "buy"  # 空单止损方向为买入
+
+    # 根据交易对的价格精度进行四舍五入
+    # price_precision 表示小数点后的位数
+    precision = contract.price_precision
+    stop_loss_price = round(stop_loss_price, precision)
+
+    # 止损限价在触发价格基础上让出滑点，保证触发后能够成交
+    if stop_loss_side == "sell":
+        limit_price = stop_loss_price * (1 - stop_loss_slippage / 100)
+    else:
+        limit_price = stop_loss_price * (1 + stop_loss_slippage / 100)
+    limit_price = round(limit_price, precision)
+
+    return stop_loss_price, limit_price, stop_loss_side
+
+def place_hyperliquid_order(alert_data, quantity=None, attach_stop_loss=None):
     """
     在Hyperliquid交易所下单
+    :param alert_data: 信号数据
+    :param quantity: 下单数量（未使用，数量由持仓和交易对配置决定）
+    :param attach_stop_loss: 开仓时是否在同一请求中附带止损单，None 时使用
+                             ORDER_MANAGEMENT['default']['attach_stop_loss'] 配置
     """
     try:
-        logger.info(f"开始处理下单请求: symbol={alert_data.symbol}, action={alert_data.action}, contractType={alert_data.contractType}")
+        logger.info(f"开始处理下单请求: symbol={alert_data.symbol}, action={alert_data.action}, contractType={alert_data.contract_type}")
         
-        # 初始化交易接口
-        trader = HyperliquidTrader()
+        # 获取共享的交易接口
+        trader = get_trader()
         
         # 获取当前持仓
         position_result = trader.get_position(alert_data.symbol)
@@ -24,7 +67,7 @@ def place_hyperliquid_order(alert_data, quantity=None):
             return False
             
         current_position = position_result.get("position")
-        logger.info(f"当前持仓信息: {current_position}")
+        logger.info("当前持仓信息: %s", current_position)
         
         # 判断开平仓
         reduce_only = False
@@ -33,11 +76,8 @@ def place_hyperliquid_order(alert_data, quantity=None):
         symbol_base = alert_data.symbol.split('-')[0] if '-' in alert_data.symbol else alert_data.symbol
         logger.info(f"查询交易对配置: symbol_base={symbol_base}, 原始symbol={alert_data.symbol}")
         
-        # 查询数据库中的默认下单配置
-        contract = ContractCode.objects.filter(
-            symbol=symbol_base,
-            is_active=True
-        ).first()
+        # 从参考数据缓存获取默认下单配置
+        contract = ref_cache.contract(symbol_base)
         
         if not contract:
             logger.error(f"未找到交易对 {symbol_base} 的配置,请先在后台设置默认下单数量")
@@ -71,18 +111,37 @@ def place_hyperliquid_order(alert_data, quantity=None):
         logger.info(f"准备下单: symbol={alert_data.symbol}, action={alert_data.action}, "
                    f"quantity={quantity}, price={alert_data.price}, reduce_only={reduce_only}")
         
-        order_response = trader.place_order(
-            symbol=alert_data.symbol,
-            side=alert_data.action,
-            quantity=int(quantity),
-            price=float(alert_data.price),
-            reduce_only=reduce_only
-        )
+        if attach_stop_loss is None:
+            attach_stop_loss = settings.ORDER_MANAGEMENT['default'].get('attach_stop_loss', False)
+
+        stop_loss_info = None
+        if attach_stop_loss and not reduce_only:
+            # 开仓单和止损单一次提交，止损价格按委托价格预先计算
+            stop_trigger_price, stop_limit_price, _ = calculate_stop_loss_price(
+                contract, alert_data.action, float(alert_data.price)
+            )
+            order_response = trader.place_order_with_stop_loss(
+                symbol=alert_data.symbol,
+                side=alert_data.action,
+                quantity=int(quantity),
+                price=float(alert_data.price),
+                stop_trigger_price=stop_trigger_price,
+                stop_limit_price=stop_limit_price
+            )
+            stop_loss_info = order_response.get("stop_loss_info")
+        else:
+            order_response = trader.place_order(
+                symbol=alert_data.symbol,
+                side=alert_data.action,
+                quantity=int(quantity),
+                price=float(alert_data.price),
+                reduce_only=reduce_only
+            )
         
         if order_response["status"] == "success":
             response_data = order_response.get("response", {})
             order_info = order_response.get("order_info", {})
-            logger.info(f"下单成功: {order_info}")
+            logger.info("下单成功: %s", order_info)
             
             # 检查订单状态和订单ID
             if response_data.get("status") == "ok" and order_info.get("order_id"):
@@ -99,16 +158,16 @@ def place_hyperliquid_order(alert_data, quantity=None):
                         reduce_only=reduce_only,
                         is_stop_loss=False,  # 这不是止损单
                         order_type="CLOSE" if reduce_only else "OPEN",  # 根据reduce_only标志设置订单类型
-                        cloid=str(order_info["cloid"])  # 交易所的订单号（从API的cloid字段获取）
+                        cloid=str(order_info["cloid"]),  # 交易所的订单号（从API的cloid字段获取）
+                        attached_stop_cloid=stop_loss_info["cloid"] if stop_loss_info else None
                     )
                     
-                    # 启动订单监控线程
-                    monitor_thread = threading.Thread(
-                        target=order_monitor.monitor_order,
-                        args=(order_record.id,)
-                    )
-                    monitor_thread.daemon = True
-                    monitor_thread.start()
+                    if stop_loss_info:
+                        # 止损单在开仓单成交后才生效，由订单监控按已成交数量写入止损单记录
+                        logger.info(f"附带止损单已提交: cloid={stop_loss_info['cloid']}")
+                    
+                    # 加入订单监控调度
+                    order_monitor.monitor_order(order_record.id)
                     
                     logger.info(f"订单已创建并开始监控: order_id={order_info['order_id']}")
                     return True
@@ -143,58 +202,31 @@ def place_stop_loss_order(original_order_record):
     try:
         logger.info(f"开始为订单 {original_order_record.order_id} 创建止损单")
         
-        # 初始化交易接口
-        trader = HyperliquidTrader()
+        # 获取共享的交易接口
+        trader = get_trader()
         
         # 获取交易对配置
         symbol_base = original_order_record.symbol.split('-')[0] if '-' in original_order_record.symbol else original_order_record.symbol
-        contract = ContractCode.objects.filter(
-            symbol=symbol_base,
-            is_active=True
-        ).first()
+        contract = ref_cache.contract(symbol_base)
         
         if not contract:
             error_msg = f"未找到交易对 {symbol_base} 的配置，无法下止损单"
             logger.error(error_msg)
             return False, error_msg
         
-        # 获取止损百分比和滑点
-        stop_loss_percentage = float(contract.stop_loss_percentage)
-        stop_loss_slippage = float(contract.stop_loss_slippage)
-        
-        # 计算止损价格
-        # 使用全局配置中的默认杠杆值
-        from django.conf import settings
-        leverage = float(settings.HYPERLIQUID_CONFIG.get('default_leverage', 1.0))
-        logger.info(f"使用全局默认杠杆倍数: {leverage}")
-
         # 使用实际成交价格而非委托价格
         # 如果有成交均价，使用成交均价；否则使用原始价格
         actual_price = float(original_order_record.avg_price) if original_order_record.avg_price else float(original_order_record.price)
         logger.info(f"使用实际成交价格: {actual_price}")
 
-        if original_order_record.side.lower() == "buy":
-            # 多单止损价格 = 开仓价格 - (开仓价格 * 止损百分比 / 100 / 杠杆)
-            stop_loss_price = actual_price - (actual_price * stop_loss_percentage / 100 / leverage)
-            stop_loss_side = "sell"  # 多单止损方向为卖出
-        else:
-            # 空单止损价格 = 开仓价格 + (开仓价格 * 止损百分比 / 100 / 杠杆)
-            stop_loss_price = actual_price + (actual_price * stop_loss_percentage / 100 / leverage)
-            stop_loss_side = "buy"  # 空单止损方向为买入
-
-        # 根据交易对的价格精度进行四舍五入
-        # price_precision 表示小数点后的位数
-        precision = contract.price_precision
-        # 使用交易对的价格精度进行四舍五入
-        stop_loss_price = round(stop_loss_price, precision)
-        
-        # 对于限价止损单，将触发价格和限价设置为相同的值
-        # 这样当价格达到触发价格时，会以相同的价格执行订单
-        limit_price = stop_loss_price
+        # 计算止损价格
+        stop_loss_price, limit_price, stop_loss_side = calculate_stop_loss_price(
+            contract, original_order_record.side, actual_price
+        )
         
         logger.info(f"准备下止损单: 原订单ID={original_order_record.order_id}, 方向={stop_loss_side}, "
                    f"数量={original_order_record.filled_quantity if original_order_record.filled_quantity else original_order_record.quantity}, 触发价格={stop_loss_price}, 限价={limit_price}, "
-                   f"原价格={actual_price}, 止损百分比={stop_loss_percentage}%")
+                   f"原价格={actual_price}")
         
         # 下止损单
         order_response = trader.place_stop_loss_order(
@@ -208,7 +240,7 @@ def place_stop_loss_order(original_order_record):
         
         if order_response["status"] == "success":
             order_info = order_response.get("order_info", {})
-            logger.info(f"止损单下单成功: {order_info}")
+            logger.info("止损单下单成功: %s", order_info)
             
             # 创建止损单记录
             try:
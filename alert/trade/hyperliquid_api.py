@@ -14,8 +14,11 @@ import time
 import json
 import datetime
 import sys
+import threading
 from alert.models import Exchange as ExchangeModel, ContractCode, OrderRecord
 from alert.core.net_check import WebSocketManager, create_hyperliquid_ws_manager
+from alert.trade.fills_store import FillsStore, normalize_cloid
+from alert.core.ref_cache import ref_cache
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +34,9 @@ def is_migration_command():
             return True
     return False
 
+# 附带止损单的cloid偏移量，与时间戳生成的开仓单cloid区分
+STOP_LOSS_CLOID_OFFSET = 1 << 64
+
 def timeout_handler(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -47,6 +53,95 @@ def timeout_handler(func):
             return {"status": "error", "error": str(e)}
     return wrapper
 
+def suspends_scheduled_cancel(func):
+    """
+    装饰器：提交订单前清除交易所定时撤单（定时撤单会撤销账户全部挂单，包括新提交的止损单），
+    提交期间和提交完成后使订单监控基于旧挂单快照计算的定时撤单失效，由下一轮对账重新评估
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        self._begin_order_submission()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            self._end_order_submission()
+    return wrapper
+
+class UserStateCache:
+    """
+    账户清算状态(user_state)快照缓存
+    1. 在TTL内复用同一份快照，持仓、账户、订单查询共享
+    2. 自身下单/撤单后显式失效
+    3. 并发请求合并为一次在途查询（single-flight）
+    """
+
+    def __init__(self, fetcher, ttl=1.0, wait_timeout=10):
+        """
+        :param fetcher: 实际查询user_state的函数
+        :param ttl: 快照有效期（秒），0表示不缓存
+        :param wait_timeout: 等待在途查询的最长时间（秒）
+        """
+        self._fetcher = fetcher
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._fetched_at = 0.0
+        self._generation = 0
+        self._inflight = None
+
+    def get(self, force_refresh=False):
+        """
+        获取快照，过期或强制刷新时重新查询
+        :param force_refresh: 是否忽略缓存
+        :return: user_state字典
+        """
+        with self._lock:
+            if (not force_refresh and self._snapshot is not None
+                    and time.monotonic() - self._fetched_at < self.ttl):
+                return self._snapshot
+
+            # 已有同代的在途查询时直接等待其结果
+            call = self._inflight
+            if call is not None and call["generation"] == self._generation:
+                is_leader = False
+            else:
+                call = {"generation": self._generation, "event": threading.Event(),
+                        "result": None, "error": None}
+                self._inflight = call
+                is_leader = True
+
+        if not is_leader:
+            if call["event"].wait(self.wait_timeout):
+                if call["error"] is not None:
+                    raise call["error"]
+                return call["result"]
+            logger.warning("等待在途的user_state查询超时，直接查询")
+            return self._fetcher()
+
+        try:
+            call["result"] = self._fetcher()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight is call:
+                    self._inflight = None
+                # 查询期间发生过失效的结果不写入缓存
+                if call["error"] is None and call["generation"] == self._generation:
+                    self._snapshot = call["result"]
+                    self._fetched_at = time.monotonic()
+            call["event"].set()
+
+    def invalidate(self):
+        """使当前快照失效，下一次读取会重新查询"""
+        with self._lock:
+            self._snapshot = None
+            self._generation += 1
+
+
 class HyperliquidTrader:
     def __init__(self, wallet_address=None, api_secret=None):
         """
@@ -61,6 +156,14 @@ class HyperliquidTrader:
             self.exchange = None
             self.exchange_instance = None
             self._ws_manager = None
+            self._user_state_cache = None
+            self.fills_store = None
+            self._account_listeners = []
+            self._account_stream_started = False
+            self._schedule_lock = threading.Lock()
+            self._scheduled_cancel_time = None
+            self._order_epoch = 0
+            self._orders_in_flight = 0
             return
             
         try:
@@ -85,12 +188,13 @@ class HyperliquidTrader:
             
             while retry_count < max_retries:
                 try:
-                    self.info = Info(self.api_url)
                     self.exchange = Exchange(
                         self.account,
                         self.api_url,
                         account_address=self.wallet_address
                     )
+                    # 复用Exchange内部的Info对象（skip_ws=True），避免重复拉取元数据和额外的SDK WebSocket线程
+                    self.info = self.exchange.info
                     break  # 成功初始化，跳出循环
                 except ConnectionResetError as e:
                     retry_count += 1
@@ -112,11 +216,38 @@ class HyperliquidTrader:
             # 获取交易所实例
             self.exchange_instance = None  # Initialize as None, will be loaded lazily
             
+            # 账户状态快照缓存
+            self._user_state_cache = UserStateCache(
+                lambda: self.info.user_state(self.wallet_address),
+                ttl=getattr(settings, 'USER_STATE_CACHE_TTL', 1.0)
+            )
+            
+            # 本地成交索引，按时间游标增量同步
+            fills_config = getattr(settings, 'FILLS_STORE_CONFIG', {})
+            self.fills_store = FillsStore(
+                self.info,
+                self.wallet_address,
+                lookback_days=fills_config.get('lookback_days', 7),
+                min_sync_interval=fills_config.get('min_sync_interval', 1.0)
+            )
+            
+            # 账户推送事件的监听者
+            self._account_listeners = []
+            self._account_stream_started = False
+            
+            # 交易所定时撤单状态：每次提交订单时递增订单纪元，定时撤单只按最新纪元的挂单快照设置
+            self._schedule_lock = threading.Lock()
+            self._scheduled_cancel_time = None
+            self._order_epoch = 0
+            self._orders_in_flight = 0
+            
             # 初始化WebSocket管理器
             self._ws_manager = create_hyperliquid_ws_manager(
                 env=self.env,
                 on_message=self._on_ws_message,
-                idle_timeout=getattr(settings, 'WEBSOCKET_IDLE_TIMEOUT', 60)  # 使用settings中的闲置超时时间
+                idle_timeout=getattr(settings, 'WEBSOCKET_IDLE_TIMEOUT', 0),  # 使用settings中的闲置超时时间
+                heartbeat_interval=getattr(settings, 'WEBSOCKET_HEARTBEAT_INTERVAL', 30),
+                reconnect_max_delay=getattr(settings, 'WEBSOCKET_RECONNECT_MAX_DELAY', 60)
             )
             
             logger.info(f"HyperliquidTrader initialized in {self.env} environment")
@@ -137,81 +268,136 @@ class HyperliquidTrader:
                 logger.error("HYPERLIQUID exchange not found in database")
         return self.exchange_instance
 
-    def _ensure_ws_connection(self):
-        """
-        确保WebSocket连接已建立，仅在需要时建立连接
-        现在使用WebSocketManager来管理连接
-        """
-        return self._ws_manager.ensure_connected()
-
     def _on_ws_message(self, data):
         """
-        处理WebSocket消息
+        处理没有登记频道处理函数的WebSocket消息
         这个方法将作为回调函数传递给WebSocketManager
         
         Args:
             data: 解析后的JSON数据
         """
-        try:
-            logger.debug(f"处理WebSocket消息: {data}")
-            # 在这里实现具体的消息处理逻辑
-            # 例如，处理市场数据、订单更新等
-            pass
-        except Exception as e:
-            logger.warning(f"处理WebSocket消息时出错: {str(e)}")
-
-    def _on_ws_open(self, ws):
-        """WebSocket连接建立时的回调"""
-        with self._ws_lock:
-            self._ws_connected = True
-        logger.info("WebSocket连接已建立")
-
-    def _on_ws_close(self, ws, close_status_code, close_msg):
-        """WebSocket连接关闭时的回调"""
-        with self._ws_lock:
-            self._ws_connected = False
-        
-        close_info = f"状态码: {close_status_code}" if close_status_code else "无状态码"
-        close_info += f", 消息: {close_msg}" if close_msg else ", 无消息"
-        logger.info(f"WebSocket连接已关闭 ({close_info})")
-
-    def _on_ws_error(self, ws, error):
-        """WebSocket错误时的回调"""
-        if isinstance(error, ConnectionResetError):
-            logger.warning(f"WebSocket连接被重置: {error}")
-        else:
-            logger.warning(f"WebSocket错误: {error}")
-        
-        # 不在回调中直接修改连接状态，因为websocket-client库会自动调用on_close
+        logger.debug(f"处理WebSocket消息: {data}")
 
-    def _on_ws_message(self, ws, message):
-        """WebSocket消息处理"""
-        try:
-            data = json.loads(message)
-            logger.debug(f"收到WebSocket消息: {data}")
-        except Exception as e:
-            logger.warning(f"处理WebSocket消息时出错: {str(e)}")
+    def _on_order_updates(self, data):
+        """orderUpdates 频道：订单状态更新"""
+        self.invalidate_user_state()
+        for update in data.get("data") or []:
+            self._dispatch_account_event("order", update)
 
-    def _subscribe_market_data(self):
-        """订阅市场数据"""
-        try:
-            # 构建订阅消息
+    def _on_user_fills(self, data):
+        """userFills 频道：账户成交"""
+        self._on_ws_fills((data.get("data") or {}).get("fills", []))
+
+    def _on_user_events(self, data):
+        """userEvents 订阅的推送：成交和非用户发起的撤单（如保证金不足）"""
+        payload = data.get("data") or {}
+        if "fills" in payload:
+            self._on_ws_fills(payload["fills"])
+        for cancel in payload.get("nonUserCancel", []):
+            self.invalidate_user_state()
+            self._dispatch_account_event("cancel", cancel)
+
+    def _on_ws_fills(self, fills):
+        """推送的成交写入成交索引，只转发新增的成交"""
+        new_fills = self.fills_store.ingest(fills)
+        if new_fills:
+            self.invalidate_user_state()
+            self._dispatch_account_event("fills", new_fills)
+
+    def _dispatch_account_event(self, event_type, payload):
+        """将账户推送事件转发给所有监听者"""
+        for listener in list(self._account_listeners):
+            try:
+                listener(event_type, payload)
+            except Exception as e:
+                logger.error(f"处理账户推送事件 {event_type} 时出错: {str(e)}")
+
+    def start_account_stream(self, listener=None):
+        """
+        订阅账户的 orderUpdates / userFills / userEvents 频道
+        连接长期保持，断线重连后自动恢复订阅；重复调用只添加监听者，不重复订阅
+        :param listener: 回调函数 listener(event_type, payload)，
+                         event_type 为 "order"（订单状态更新）、"fills"（新增成交列表）或 "cancel"（非用户撤单）
+        :return: 连接是否成功
+        """
+        if listener is not None and listener not in self._account_listeners:
+            self._account_listeners.append(listener)
+
+        if self._account_stream_started:
+            return self._ws_manager.ensure_connected()
+        self._account_stream_started = True
+
+        # userEvents 订阅的推送频道名为 "user"
+        channels = (
+            ("orderUpdates", "orderUpdates", self._on_order_updates),
+            ("userFills", "userFills", self._on_user_fills),
+            ("userEvents", "user", self._on_user_events),
+        )
+        connected = True
+        for subscription_type, channel, handler in channels:
             subscribe_msg = {
                 "method": "subscribe",
                 "subscription": {
-                    "type": "trades",
-                    "coins": ["HYPE"]  # 可以根据需要添加其他币种
+                    "type": subscription_type,
+                    "user": self.wallet_address
                 }
             }
-            
-            # 使用WebSocketManager发送订阅请求
-            success = self._ws_manager.subscribe(subscribe_msg)
-            if success:
-                logger.info("已发送市场数据订阅请求")
-            else:
-                logger.warning("发送市场数据订阅请求失败")
-        except Exception as e:
-            logger.warning(f"订阅市场数据失败: {str(e)}")
+            connected = self._ws_manager.subscribe(subscribe_msg, handler=handler, channel=channel) and connected
+        if connected:
+            logger.info("已订阅账户推送频道: orderUpdates, userFills, userEvents")
+        else:
+            logger.warning("账户推送频道暂未连接，连接建立后将自动订阅")
+        return connected
+
+    def is_account_stream_connected(self):
+        """账户推送频道当前是否可用"""
+        return bool(self._account_listeners) and self._ws_manager.is_connected()
+
+    @staticmethod
+    def _trades_subscription(coin):
+        return {
+            "method": "subscribe",
+            "subscription": {
+                "type": "trades",
+                "coin": coin
+            }
+        }
+
+    def subscribe_trades(self, coins, handler):
+        """
+        订阅市场成交数据，与账户推送共用同一条连接
+        :param coins: 币种列表，如 ["HYPE", "BTC"]
+        :param handler: 处理函数 handler(data)，trades 频道的所有推送都会交给它（data["data"] 中的 coin 区分币种）
+        :return: 订阅是否已生效
+        """
+        success = True
+        for coin in coins:
+            success = self._ws_manager.subscribe(self._trades_subscription(coin), handler=handler) and success
+        if success:
+            logger.info(f"已订阅市场成交数据: {', '.join(coins)}")
+        else:
+            logger.warning(f"市场成交数据暂未订阅，连接建立后将自动订阅: {', '.join(coins)}")
+        return success
+
+    def unsubscribe_trades(self, coins, handler):
+        """取消订阅市场成交数据，其他订阅者仍在使用的币种不会退订"""
+        for coin in coins:
+            self._ws_manager.unsubscribe(self._trades_subscription(coin), handler=handler)
+
+    def get_user_state(self, force_refresh=False):
+        """
+        获取账户清算状态快照
+        :param force_refresh: 是否忽略缓存直接查询
+        :return: user_state字典
+        """
+        return self._user_state_cache.get(force_refresh=force_refresh)
+
+    def invalidate_user_state(self):
+        """
+        使账户状态快照失效，在自身下单/撤单后调用
+        """
+        if self._user_state_cache is not None:
+            self._user_state_cache.invalidate()
 
     def get_default_symbols(self):
         """
@@ -228,33 +414,30 @@ class HyperliquidTrader:
 
     def get_contract_config(self, symbol):
         """
-        从数据库获取合约配置
+        获取合约配置（读取参考数据缓存）
         :param symbol: 交易对符号
         :return: 合约配置信息
         """
         if not self.exchange_instance:
             return {}
             
-        try:
-            contract = ContractCode.objects.get(
-                exchange=self.exchange_instance,
-                symbol=symbol,
-                is_active=True
-            )
-            return {
-                "symbol": contract.symbol,
-                "name": contract.name,
-                "description": contract.description,
-                "price_precision": contract.price_precision,
-                "size_precision": contract.size_precision,
-                "min_size": float(contract.min_size),
-                "size_increment": float(contract.size_increment)
-            }
-        except ContractCode.DoesNotExist:
+        # 从参考数据缓存读取，格式化持仓和订单时不再逐行查询数据库
+        contract = ref_cache.contract(symbol, exchange_id=self.exchange_instance.pk)
+        if contract is None:
             logger.warning(f"Contract config not found for symbol: {symbol}")
             return {}
+        return {
+            "symbol": contract.symbol,
+            "name": contract.name,
+            "description": contract.description,
+            "price_precision": contract.price_precision,
+            "size_precision": contract.size_precision,
+            "min_size": float(contract.min_size),
+            "size_increment": float(contract.size_increment)
+        }
 
     @timeout_handler
+    @suspends_scheduled_cancel
     def place_order(self, symbol: str, side: str, quantity: int, price: float, 
                      position_type: str = "open", leverage: int = None, reduce_only: bool = False):
         """
@@ -275,9 +458,6 @@ class HyperliquidTrader:
         :return: 下单结果
         """
         try:
-            # 尝试建立WebSocket连接，但连接失败不影响下单
-            self._ensure_ws_connection()
-            
             # 检查订单最小价值
             order_value = quantity * price
             if order_value < 10:
@@ -348,7 +528,8 @@ class HyperliquidTrader:
                     cloid=cloid,  # 可选的客户端订单ID
                     reduce_only=reduce_only  # 是否只减仓
                 )
-                logger.info(f"订单响应: {response}")
+                self.invalidate_user_state()
+                logger.info("订单响应: %s", response)
                 
                 if response.get("status") == "ok":
                     # 检查是否有错误信息
@@ -412,10 +593,11 @@ class HyperliquidTrader:
                 "error": str(e)
             }
 
-    def get_position(self, symbol):
+    def get_position(self, symbol, user_state=None):
         """
         获取永续合约持仓信息
         :param symbol: 交易对符号，例如 "S"
+        :param user_state: 可选，已获取的账户状态快照，不传则从缓存读取
         :return: 持仓信息，包含：
                 - symbol: 合约符号
                 - size: 持仓量
@@ -430,7 +612,8 @@ class HyperliquidTrader:
                 - cum_funding: 累计资金费用 (USDC)
         """
         try:
-            user_state = self.info.user_state(self.wallet_address)
+            if user_state is None:
+                user_state = self.get_user_state()
             if not user_state:
                 logger.warning(f"No user state found for {self.wallet_address}")
                 return {"status": "success", "position": None}
@@ -489,9 +672,16 @@ class HyperliquidTrader:
         if symbols is None:
             symbols = self.get_default_symbols()
             
+        # 所有交易对共享同一份账户状态快照
+        try:
+            user_state = self.get_user_state()
+        except Exception as e:
+            logger.error(f"Error getting user state: {str(e)}")
+            return {"status": "error", "error": f"User state error: {str(e)}"}
+            
         positions = {}
         for symbol in symbols:
-            pos = self.get_position(symbol)
+            pos = self.get_position(symbol, user_state=user_state)
             if pos["status"] == "success" and pos.get("position"):
                 positions[symbol] = pos["position"]
                 
@@ -511,7 +701,7 @@ class HyperliquidTrader:
                 - withdrawable: 可提现金额 (USDC)
         """
         try:
-            user_state = self.info.user_state(self.wallet_address)
+            user_state = self.get_user_state()
             
             if user_state:
                 # 尝试获取不同的余额字段
@@ -661,9 +851,9 @@ class HyperliquidTrader:
                 end_time = int(datetime.datetime.now().timestamp() * 1000)
                 
             # 获取当前挂单
-            current_orders = self.info.user_state(self.wallet_address).get("orders", [])
-            # 获取历史成交
-            filled_orders = self.info.user_fills(self.wallet_address)
+            current_orders = self.get_user_state().get("orders", [])
+            # 获取历史成交（来自本地成交索引）
+            filled_orders = self.fills_store.get_fills(start_time, end_time)
             
             result = []
             
@@ -761,8 +951,9 @@ class HyperliquidTrader:
                 symbol=symbol,
                 order_id=order_id
             )
+            self.invalidate_user_state()
             
-            logger.info(f"Order cancelled successfully: {response}")
+            logger.info("Order cancelled successfully: %s", response)
             return {
                 "status": "success",
                 "order_id": order_id,
@@ -777,51 +968,13 @@ class HyperliquidTrader:
                 "error": error_msg
             }
             
-    @timeout_handler
-    def cancel_all_orders(self, symbol=None):
-        """
-        撤销所有订单
-        :param symbol: 交易对符号，如果为None则撤销所有交易对的订单
-        :return: 撤单结果
-        """
-        try:
-            if symbol:
-                symbols = [symbol]
-            else:
-                symbols = self.get_default_symbols()
-                
-            cancelled = []
-            failed = []
-            
-            for sym in symbols:
-                try:
-                    response = self.exchange.cancel_all_orders(symbol=sym)
-                    cancelled.append(sym)
-                except Exception as e:
-                    logger.error(f"Error cancelling orders for {sym}: {str(e)}")
-                    failed.append(sym)
-            
-            return {
-                "status": "success" if not failed else "partial",
-                "cancelled": cancelled,
-                "failed": failed
-            }
-            
-        except Exception as e:
-            error_msg = f"Error cancelling all orders: {str(e)}"
-            logger.error(error_msg)
-            return {
-                "status": "error",
-                "error": error_msg
-            }
-
     def _check_margin(self, symbol: str, quantity: int, price: float) -> dict:
         """
         检查是否有足够的保证金
         """
         try:
             # 获取账户信息
-            account_info = self.info.user_state(self.wallet_address)
+            account_info = self.get_user_state()
             if not account_info:
                 return {
                     "status": "error",
@@ -873,7 +1026,8 @@ class HyperliquidTrader:
             
             # 使用SDK的cancel方法
             response = self.exchange.cancel(coin, order_id_int)
-            logger.info(f"撤单响应: {response}")
+            self.invalidate_user_state()
+            logger.info("撤单响应: %s", response)
             
             # 检查响应
             if response is None:
@@ -927,7 +1081,8 @@ class HyperliquidTrader:
             
             # 发送撤单请求
             response = self.exchange.cancel_by_cloid(coin, cloid)
-            logger.info(f"撤单响应: {response}")
+            self.invalidate_user_state()
+            logger.info("撤单响应: %s", response)
             
             if response.get("status") == "ok":
                 return {
@@ -947,40 +1102,214 @@ class HyperliquidTrader:
                 "error": str(e)
             }
             
+    @staticmethod
+    def _parse_bulk_cancel_response(response, count):
+        """
+        解析批量撤单响应
+        :param response: SDK返回的响应
+        :param count: 撤单请求数量
+        :return: 每个撤单请求的错误信息列表，成功为None
+        """
+        if not isinstance(response, dict) or response.get("status") != "ok":
+            error_msg = response.get("response", str(response)) if isinstance(response, dict) else str(response)
+            return [str(error_msg)] * count
+        statuses = response.get("response", {}).get("data", {}).get("statuses", [])
+        errors = []
+        for index in range(count):
+            status = statuses[index] if index < len(statuses) else None
+            if isinstance(status, dict) and "error" in status:
+                errors.append(status["error"])
+            elif status is None:
+                errors.append("撤单响应缺少状态")
+            else:
+                errors.append(None)
+        return errors
+
+    def _bulk_cancel(self, cancel_requests, keys, send):
+        """
+        批量撤单的公共流程
+        :param cancel_requests: [(请求, 结果字段), ...]，请求为None表示参数无效
+        :param keys: 结果中标识订单的字段名
+        :param send: 发送撤单请求的函数
+        :return: results 按位置与 cancel_requests 一一对应
+        """
+        results = [None] * len(cancel_requests)
+        valid_requests = []
+        for index, (request, item) in enumerate(cancel_requests):
+            if request is None:
+                results[index] = dict(item, status="error", error="无效的订单号")
+            else:
+                valid_requests.append((index, request, item))
+
+        if valid_requests:
+            try:
+                logger.info(f"发送批量撤单请求: {len(valid_requests)} 个订单")
+                response = send([request for _, request, _ in valid_requests])
+                self.invalidate_user_state()
+                logger.info("批量撤单响应: %s", response)
+                errors = self._parse_bulk_cancel_response(response, len(valid_requests))
+            except Exception as e:
+                logger.error(f"批量撤单过程中出错: {str(e)}")
+                errors = [str(e)] * len(valid_requests)
+
+            for (index, _, item), error_msg in zip(valid_requests, errors):
+                if error_msg:
+                    logger.error(f"撤单失败 {', '.join(f'{key}={item[key]}' for key in keys)}: {error_msg}")
+                    results[index] = dict(item, status="error", error=error_msg)
+                else:
+                    results[index] = dict(item, status="success")
+
+        failed = sum(1 for result in results if result["status"] != "success")
+        return {
+            "status": "success" if not failed else ("error" if failed == len(results) else "partial"),
+            "results": results
+        }
+
+    def bulk_cancel(self, orders):
+        """
+        一次签名请求撤销多个订单
+        :param orders: [(symbol, order_id), ...]
+        :return: {"status": "success"/"partial"/"error", "results": [{"symbol", "order_id", "status", "error"}, ...]}
+                 results 与 orders 顺序一致
+        """
+        cancel_requests = []
+        for symbol, order_id in orders:
+            coin = symbol.split('-')[0] if '-' in symbol else symbol
+            item = {"symbol": symbol, "order_id": order_id}
+            try:
+                cancel_requests.append(({"coin": coin, "oid": int(order_id)}, item))
+            except (TypeError, ValueError):
+                cancel_requests.append((None, item))
+        if not cancel_requests:
+            return {"status": "success", "results": []}
+        return self._bulk_cancel(cancel_requests, ("symbol", "order_id"), self.exchange.bulk_cancel)
+
+    def bulk_cancel_by_cloid(self, orders):
+        """
+        一次签名请求按客户端订单ID撤销多个订单
+        :param orders: [(symbol, cloid), ...]
+        :return: {"status": "success"/"partial"/"error", "results": [{"symbol", "cloid", "status", "error"}, ...]}
+                 results 与 orders 顺序一致
+        """
+        cancel_requests = []
+        for symbol, cloid in orders:
+            coin = symbol.split('-')[0] if '-' in symbol else symbol
+            item = {"symbol": symbol, "cloid": cloid}
+            try:
+                cancel_requests.append(({"coin": coin, "cloid": Cloid.from_str(str(cloid))}, item))
+            except Exception:
+                cancel_requests.append((None, item))
+        if not cancel_requests:
+            return {"status": "success", "results": []}
+        return self._bulk_cancel(cancel_requests, ("symbol", "cloid"), self.exchange.bulk_cancel_by_cloid)
+
+    @property
+    def order_epoch(self):
+        """订单纪元，每次开始和结束提交订单时递增"""
+        return self._order_epoch
+
+    @property
+    def scheduled_cancel_time(self):
+        """当前生效的交易所定时撤单时间（毫秒时间戳），没有或已执行时为 None"""
+        cancel_time = self._scheduled_cancel_time
+        if cancel_time is not None and cancel_time <= int(time.time() * 1000):
+            return None
+        return cancel_time
+
+    def _begin_order_submission(self):
+        """提交订单前递增订单纪元，并清除已设置的定时撤单"""
+        with self._schedule_lock:
+            self._orders_in_flight += 1
+            self._order_epoch += 1
+            if self.scheduled_cancel_time is None:
+                return
+            result = self._send_schedule_cancel(None)
+            if result["status"] == "success":
+                self._scheduled_cancel_time = None
+                logger.info("提交订单前已清除交易所定时撤单")
+            else:
+                # 仍然提交订单，由订单监控下一轮重新清除
+                logger.error(f"提交订单前清除交易所定时撤单失败: {result.get('error')}")
+
+    def _end_order_submission(self):
+        """订单提交完成，使提交期间取得的挂单快照失效"""
+        with self._schedule_lock:
+            self._orders_in_flight -= 1
+            self._order_epoch += 1
+
+    def schedule_cancel(self, cancel_time_ms=None, epoch=None):
+        """
+        设置交易所定时撤单：到达指定时间时交易所撤销账户的全部挂单（包括止损单）
+        交易所每天最多执行10次定时撤单（UTC 0点重置计数），达到上限后无法再设置，由本地超时撤单兜底；
+        设置和清除本身不计入次数
+        :param cancel_time_ms: 撤单时间（毫秒时间戳），至少在当前时间5秒之后；None 表示清除定时撤单
+        :param epoch: 计算撤单时间所依据的挂单快照的订单纪元，之后有订单提交时不设置
+        :return: 设置结果，因有订单提交而未设置时 status 为 skipped
+        """
+        with self._schedule_lock:
+            if cancel_time_ms is not None and epoch is not None \
+                    and (self._orders_in_flight or epoch != self._order_epoch):
+                return {
+                    "status": "skipped",
+                    "error": "挂单快照之后有订单提交，等待重新评估"
+                }
+            result = self._send_schedule_cancel(cancel_time_ms)
+            if result["status"] == "success":
+                self._scheduled_cancel_time = cancel_time_ms
+            return result
+
+    def _send_schedule_cancel(self, cancel_time_ms):
+        """发送定时撤单请求（调用方需持有 self._schedule_lock）"""
+        try:
+            response = self.exchange.schedule_cancel(cancel_time_ms)
+            logger.info("定时撤单响应: time=%s, response=%s", cancel_time_ms, response)
+            if isinstance(response, dict) and response.get("status") == "ok":
+                return {
+                    "status": "success",
+                    "cancel_time": cancel_time_ms,
+                    "response": response
+                }
+            return {
+                "status": "error",
+                "error": response.get("response", str(response)) if isinstance(response, dict) else str(response)
+            }
+        except Exception as e:
+            logger.error(f"设置定时撤单时出错: {str(e)}")
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+
     def cancel_all_orders(self, symbol: str = None):
         """
-        撤销所有订单
+        撤销所有订单（一次查询挂单 + 一次批量撤单）
         :param symbol: 可选，交易对名称。如果不指定，则撤销所有交易对的订单
         :return: 撤单结果
         """
         try:
-            # 获取当前未成交订单
-            orders = self.get_orders("S")  # 获取当天订单
-            if orders["status"] != "success":
+            # 获取当前挂单（包括止损等触发单）
+            open_orders = self.get_open_orders_by_cloid()
+            if open_orders["status"] != "success":
                 return {
                     "status": "error",
                     "error": "获取订单列表失败"
                 }
-                
-            cancel_results = []
-            for order in orders["orders"]:
+            
+            coin = (symbol.split('-')[0] if '-' in symbol else symbol) if symbol else None
+            orders = []
+            for order in open_orders["orders"].values():
                 # 如果指定了symbol，只撤销该symbol的订单
-                if symbol and order["symbol"] != symbol:
+                if coin and order.get("coin") != coin:
                     continue
-                    
-                # 只撤销未完全成交的订单
-                if order["status"] in ["NEW", "PARTIALLY_FILLED"]:
-                    result = self.cancel_order_by_id(order["symbol"], order["order_id"])
-                    cancel_results.append({
-                        "symbol": order["symbol"],
-                        "order_id": order["order_id"],
-                        "result": result
-                    })
+                orders.append((order.get("coin"), order.get("oid")))
             
-            return {
-                "status": "success",
-                "results": cancel_results
-            }
+            if not orders:
+                return {
+                    "status": "success",
+                    "results": []
+                }
+            
+            return self.bulk_cancel(orders)
                 
         except Exception as e:
             logger.error(f"批量撤单过程中出错: {str(e)}")
@@ -1032,14 +1361,9 @@ class HyperliquidTrader:
                 status="SUBMITTED"
             )
             
-            # 启动订单监控线程
+            # 加入订单监控调度
             from alert.core.ordertask import order_monitor
-            monitor_thread = threading.Thread(
-                target=order_monitor.monitor_order,
-                args=(order_record.id,)
-            )
-            monitor_thread.daemon = True  # 设置为守护线程
-            monitor_thread.start()
+            order_monitor.monitor_order(order_record.id)
             
             return {
                 "status": "success",
@@ -1214,54 +1538,32 @@ class HyperliquidTrader:
     
     def _check_fills_for_completed_order(self, cloid):
         """
-        从历史成交记录中查找已完成的订单
+        从本地成交索引中查找已完成的订单
         
         :param cloid: 交易所的订单号（从API的cloid字段获取）
         :return: 订单状态信息
         """
         try:
-            # 查询历史成交记录
-            filled_orders = self.info.user_fills(self.wallet_address)
-            logger.debug(f"获取到 {len(filled_orders)} 条历史成交记录")
-            
-            # 查找所有匹配的订单记录（处理拆分成交的情况）
-            matching_fills = []
-            for fill in filled_orders:
-                if str(fill.get("cloid")) == str(cloid):  # 使用cloid匹配交易所订单号
-                    matching_fills.append(fill)
-                    logger.debug(f"在历史成交记录中找到订单 cloid={cloid}: {fill}")
+            # 增量同步后按cloid直接查找（已处理拆分成交的累计）
+            order_fills = self.fills_store.get_order_fills(cloid=cloid, sync=True)
             
             # 如果找到匹配的成交记录
-            if matching_fills:
-                # 初始化累计值
-                total_filled_quantity = 0.0
-                # 使用最新的成交价格
-                latest_price = 0.0
-                latest_time = 0
-                
-                # 累加所有匹配记录的数量
-                for fill in matching_fills:
-                    quantity = float(fill.get("sz", 0))
-                    total_filled_quantity += quantity
-                    
-                    # 使用最新的成交价格
-                    current_time = int(fill.get("time", 0))
-                    if current_time > latest_time:
-                        latest_time = current_time
-                        latest_price = float(fill.get("px", 0))
-                
-                logger.info(f"订单 {order_id} 拆分成 {len(matching_fills)} 笔成交，总成交数量: {total_filled_quantity}，最新成交价格: {latest_price}")
+            if order_fills:
+                logger.info(f"订单 {cloid} 拆分成 {order_fills['fill_count']} 笔成交，总成交数量: {order_fills['filled_quantity']}，"
+                            f"成交均价: {order_fills['avg_price']}，手续费: {order_fills['fee']}")
                 
                 return {
                     "status": "success",
                     "order_status": "FILLED",
-                    "filled_quantity": total_filled_quantity,
-                    "total_quantity": total_filled_quantity,
-                    "price": latest_price
+                    "filled_quantity": order_fills["filled_quantity"],
+                    "total_quantity": order_fills["filled_quantity"],
+                    "price": order_fills["avg_price"],
+                    "fee": order_fills["fee"],
+                    "filled_time": order_fills["last_time"]
                 }
             
             # 如果所有查询都未找到订单
-            logger.debug(f"未找到订单 {order_id}")
+            logger.debug(f"未找到订单 {cloid}")
             return {
                 "status": "success",
                 "order_status": "NOT_FOUND",
@@ -1276,7 +1578,33 @@ class HyperliquidTrader:
                 "error": f"查询历史成交记录时出错: {str(e)}"
             }
 
+    def get_open_orders_by_cloid(self):
+        """
+        一次性查询账户所有挂单（包括止损等触发单），按cloid建立索引
+        :return: {"status": "success", "orders": {cloid: order, ...}}
+                 没有cloid的挂单以 "oid:<oid>" 作为键
+        """
+        try:
+            open_orders = self.info.frontend_open_orders(self.wallet_address) or []
+            orders = {}
+            for order in open_orders:
+                cloid = normalize_cloid(order.get("cloid"))
+                key = cloid if cloid else f"oid:{order.get('oid')}"
+                orders[key] = order
+            logger.debug(f"查询到 {len(orders)} 个挂单")
+            return {
+                "status": "success",
+                "orders": orders
+            }
+        except Exception as e:
+            logger.error(f"查询挂单列表时出错: {str(e)}")
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+
     @timeout_handler
+    @suspends_scheduled_cancel
     def place_stop_loss_order(self, symbol: str, side: str, quantity: int, trigger_price: float, 
                              limit_price: float = None, reduce_only: bool = True):
         """
@@ -1290,9 +1618,6 @@ class HyperliquidTrader:
         :return: 下单结果
         """
         try:
-            # 尝试建立WebSocket连接，但连接失败不影响下单
-            self._ensure_ws_connection()
-            
             # 检查订单最小价值
             order_value = quantity * trigger_price
             if order_value < 10:
@@ -1353,7 +1678,8 @@ class HyperliquidTrader:
                     cloid=cloid,  # 可选的客户端订单ID
                     reduce_only=reduce_only  # 是否只减仓
                 )
-                logger.info(f"止损单响应: {response}")
+                self.invalidate_user_state()
+                logger.info("止损单响应: %s", response)
                 
                 if response.get("status") == "ok":
                     # 检查是否有错误信息
@@ -1422,4 +1748,250 @@ class HyperliquidTrader:
             return {
                 "status": "error",
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+
+    @staticmethod
+    def _parse_order_status(status):
+        """
+        从下单响应的单个状态中取出交易所订单号
+        :return: (order_id, error)，止损子单等待开仓单成交时没有订单号，返回 (None, None)
+        """
+        if isinstance(status, dict):
+            if "error" in status:
+                return None, status["error"]
+            for key in ("resting", "filled", "triggered"):
+                if key in status:
+                    return status[key].get("oid"), None
+        return None, None
+
+    @timeout_handler
+    @suspends_scheduled_cancel
+    def place_order_with_stop_loss(self, symbol: str, side: str, quantity: int, price: float,
+                                   stop_trigger_price: float, stop_limit_price: float = None,
+                                   leverage: int = None):
+        """
+        开仓限价单与止损触发单在一次 bulk_orders 请求中提交（normalTpsl 分组）
+        止损单在开仓单成交后由交易所激活，成交与止损之间没有无保护窗口
+        :param symbol: 交易对名称，例如 "HYPE-USDC"
+        :param side: 开仓方向，"buy"（做多）或"sell"（做空）
+        :param quantity: 交易数量（正整数）
+        :param price: 开仓限价
+        :param stop_trigger_price: 止损触发价格
+        :param stop_limit_price: 止损限价，如果不指定则使用市价止损单
+        :param leverage: 杠杆倍数，如果不指定则使用默认杠杆
+        :return: 下单结果，order_info 中包含开仓单信息，stop_loss_info 中包含止损单信息
+        """
+        try:
+            # 检查订单最小价值
+            order_value = quantity * price
+            if order_value < 10:
+                return {
+                    "status": "error",
+                    "error": f"订单价值（{order_value:.2f} USDC）低于交易所最小要求（10 USDC）"
+                }
+            
+            # 确保数量为正数
+            if quantity <= 0:
+                return {
+                    "status": "error",
+                    "error": "交易数量必须为正数"
+                }
+            
+            actual_leverage = leverage if leverage is not None else self.default_leverage
+            
+            # 生成订单ID，止损单在开仓单cloid基础上加偏移，避免与其他订单冲突
+            timestamp_ms = int(time.time() * 1000)
+            cloid = Cloid.from_int(timestamp_ms)
+            stop_cloid = Cloid.from_int(STOP_LOSS_CLOID_OFFSET + timestamp_ms)
+            
+            # 获取交易对的基础币种
+            coin = symbol.split('-')[0] if '-' in symbol else symbol
+            is_buy = side.lower() == "buy"
+            stop_side = "sell" if is_buy else "buy"
+            
+            direction = "多" if is_buy else "空"
+            logger.info(f"准备开仓{direction}单并附带止损: {quantity}张 @ {price} USDC, "
+                        f"止损触发价格={stop_trigger_price}, 止损限价={stop_limit_price}")
+            logger.info(f"订单参数: leverage={actual_leverage}")
+            
+            if stop_limit_price is None:
+                stop_order_type = {"trigger": {"triggerPx": stop_trigger_price, "isMarket": True, "tpsl": "sl"}}
+            else:
+                stop_order_type = {"trigger": {"triggerPx": stop_trigger_price, "isMarket": False, "tpsl": "sl"}}
+            
+            order_requests = [
+                {
+                    "coin": coin,
+                    "is_buy": is_buy,
+                    "sz": quantity,
+                    "limit_px": price,
+                    "order_type": {"limit": {"tif": "Gtc"}},
+                    "reduce_only": False,
+                    "cloid": cloid,
+                },
+                {
+                    "coin": coin,
+                    "is_buy": not is_buy,
+                    "sz": quantity,
+                    # 市价止损单的限价使用触发价格，由交易所按滑点成交
+                    "limit_px": stop_limit_price if stop_limit_price is not None else stop_trigger_price,
+                    "order_type": stop_order_type,
+                    "reduce_only": True,
+                    "cloid": stop_cloid,
+                },
+            ]
+            
+            try:
+                response = self.exchange.bulk_orders(order_requests, grouping="normalTpsl")
+                self.invalidate_user_state()
+                logger.info("开仓+止损订单响应: %s", response)
+            except Exception as e:
+                logger.error(f"发送开仓+止损订单时出错: {str(e)}")
+                return {
+                    "status": "error",
+                    "error": str(e)
+                }
+            
+            if response.get("status") != "ok":
+                return {
+                    "status": "error",
+                    "error": response.get("response", response.get("error", "Unknown error"))
+                }
+            
+            order_statuses = response.get("response", {}).get("data", {}).get("statuses", [])
+            order_id, error_msg = self._parse_order_status(order_statuses[0] if order_statuses else None)
+            if error_msg:
+                logger.error(f"下单失败: {error_msg}")
+                return {
+                    "status": "error",
+                    "error": error_msg
+                }
+            if not order_id:
+                logger.error("下单成功但未获取到订单ID")
+                return {
+                    "status": "error",
+                    "error": "下单成功但未获取到订单ID"
+                }
+            
+            stop_order_id, stop_error = (None, "未返回止损单状态")
+            if len(order_statuses) > 1:
+                stop_order_id, stop_error = self._parse_order_status(order_statuses[1])
+            if stop_error:
+                # 开仓单已提交，止损单失败时由订单监控在成交后补下止损单
+                logger.error(f"附带止损单提交失败: {stop_error}")
+            
+            return {
+                "status": "success",
+                "response": response,
+                "order_info": {
+                    "symbol": symbol,
+                    "side": side,
+                    "quantity": quantity,
+                    "price": price,
+                    "reduce_only": False,
+                    "position_type": "open",
+                    "direction": direction,
+                    "cloid": str(cloid),
+                    "order_id": order_id
+                },
+                "stop_loss_info": None if stop_error else {
+                    "symbol": symbol,
+                    "side": stop_side,
+                    "quantity": quantity,
+                    "trigger_price": stop_trigger_price,
+                    "limit_price": stop_limit_price,
+                    "reduce_only": True,
+                    "cloid": str(stop_cloid),
+                    "order_id": stop_order_id,  # 等待开仓单成交时为None
+                    "order_type": "stop_loss"
+                },
+                "stop_loss_error": stop_error
+            }
+            
+        except Exception as e:
+            logger.error(f"开仓+止损下单过程中出错: {str(e)}")
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+
+class HyperliquidTraderPool:
+    """
+    交易接口会话池
+    每个(环境, 账户)只创建一个HyperliquidTrader实例，进程内所有调用方共享，
+    避免每次下单/查询都重新拉取元数据、建立HTTP会话和WebSocket管理器
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(HyperliquidTraderPool, cls).__new__(cls)
+            return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'initialized'):
+            self._traders = {}
+            self._pool_lock = threading.Lock()
+            self.initialized = True
+
+    def _make_key(self, wallet_address=None, api_secret=None):
+        """根据环境和账户生成会话键"""
+        env = settings.HYPERLIQUID_CONFIG.get('env', 'mainnet')
+        env_config = settings.HYPERLIQUID_CONFIG.get(env, {})
+        return (
+            env,
+            wallet_address or env_config.get('wallet_address'),
+            api_secret or env_config.get('api_secret'),
+        )
+
+    def get_trader(self, wallet_address=None, api_secret=None):
+        """
+        获取共享的交易接口实例，不存在时创建
+        :param wallet_address: 钱包地址，默认使用配置中的地址
+        :param api_secret: API密钥，默认使用配置中的密钥
+        :return: HyperliquidTrader实例
+        """
+        key = self._make_key(wallet_address, api_secret)
+        trader = self._traders.get(key)
+        if trader is not None:
+            return trader
+
+        with self._pool_lock:
+            # 双重检查，避免并发时重复创建
+            trader = self._traders.get(key)
+            if trader is None:
+                trader = HyperliquidTrader(wallet_address=wallet_address, api_secret=api_secret)
+                self._traders[key] = trader
+                logger.info(f"交易接口会话已创建并加入会话池 ({key[0]})")
+            return trader
+
+    def warm_up(self):
+        """
+        预热默认账户的交易接口，应在应用启动时调用
+        :return: bool 预热是否成功
+        """
+        try:
+            trader = self.get_trader()
+            trader.get_exchange_instance()
+            logger.info("交易接口会话池预热完成")
+            return True
+        except Exception as e:
+            logger.error(f"交易接口会话池预热失败: {str(e)}")
+            return False
+
+    def reset(self):
+        """清空会话池，下次获取时重新创建"""
+        with self._pool_lock:
+            self._traders.clear()
+        logger.info("交易接口会话池已清空")
+
+
+# 创建全局会话池实例
+trader_pool = HyperliquidTraderPool()
+
+
+def get_trader(wallet_address=None, api_secret=None):
+    """获取共享的HyperliquidTrader实例"""
+    return trader_pool.get_trader(wallet_address=wallet_address, api_secret=api_secret)
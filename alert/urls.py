@@ -1,10 +1,12 @@
 from django.urls import path
 from rest_framework.authtoken import views
-from alert.view import signal, stra_view, merchant, user
+from alert.view import signal, stra_view, merchant, user, log_tail
 from alert.web import page
 
 urlpatterns = [
     path('webhook/', signal.webhook, name='webhook'),
+    path('webhook/async/', signal.webhook_async, name='webhook_async'),
+    path('webhook/batch/', signal.webhook_batch, name='webhook_batch'),
     # 策略相关路由
     path('stra/list/', stra_view.strategy_list, name='Strategy List'),
     path('stra/detail/<int:pk>/', stra_view.strategy_detail, name='Strategy Detail'),
@@ -13,6 +15,9 @@ urlpatterns = [
     path('merchant/detail/<int:pk>/', merchant.merchantdetail, name='Merchant Detail'),
 
     path('api/token-auth/', views.obtain_auth_token, name='Token Create'),
+    # 日志查看
+    path('api/logs/tail/', log_tail.log_tail, name='Log Tail'),
+    path('api/logs/stream/', log_tail.log_stream, name='Log Stream'),
     path('login/', user.LoginView.as_view(), name='User Login'),
 
     #前端页面功能
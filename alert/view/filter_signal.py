@@ -1,5 +1,5 @@
 from django.views.decorators.csrf import csrf_exempt
-from alert.models import Strategy
+from alert.core.ref_cache import ref_cache
 from rest_framework.response import Response
 from rest_framework import status
 import logging
@@ -10,7 +10,8 @@ from alert.strategy import RunStrategy
 logger = logging.getLogger(__name__)
 
 def filter_trade_signal(alert_data):
-    strategy = alert_data.strategy
+    # 信号只携带策略ID，策略从参考数据缓存读取
+    strategy = ref_cache.strategy(alert_data.strategy_id) if alert_data.strategy_id else None
     
     # 检查策略ID是否提供
     if not strategy:
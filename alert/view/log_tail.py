@@ -0,0 +1,128 @@
+import json
+import os
+import time
+import logging
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
+from logs.log import tail_records, read_records_since, make_record_filter, make_cursor
+
+logger = logging.getLogger(__name__)
+
+LOG_TAIL_CONFIG = getattr(settings, 'LOG_TAIL_CONFIG', {})
+MAX_LINES = LOG_TAIL_CONFIG.get('max_lines', 5000)
+MAX_SCAN_BYTES = LOG_TAIL_CONFIG.get('max_scan_bytes', 32 * 1024 * 1024)
+POLL_INTERVAL = LOG_TAIL_CONFIG.get('poll_interval', 0.5)
+MAX_WAIT = LOG_TAIL_CONFIG.get('max_wait', 10)
+STREAM_DURATION = LOG_TAIL_CONFIG.get('stream_duration', 15)
+# SSE 断开后客户端的重连间隔（毫秒）
+STREAM_RETRY_MS = 1000
+
+
+def _log_path():
+    return LOG_TAIL_CONFIG.get('filename') or os.path.join(settings.LOG_DIR, 'order7.log')
+
+
+def _int_param(request, name, default, maximum):
+    try:
+        value = int(request.query_params.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(0, min(value, maximum))
+
+
+def _record_filter(request):
+    return make_record_filter(
+        level=request.query_params.get('level'),
+        module=request.query_params.get('module'),
+        symbol=request.query_params.get('symbol'),
+    )
+
+
+def _wait_for_records(path, cursor, accept, limit, timeout):
+    """长轮询：等待游标之后出现匹配的新记录，最多等待 timeout 秒"""
+    deadline = time.monotonic() + timeout
+    while True:
+        records, cursor = read_records_since(path, cursor, limit=limit, accept=accept)
+        if records or time.monotonic() >= deadline:
+            return records, cursor
+        time.sleep(POLL_INTERVAL)
+
+
+# 日志查看接口
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def log_tail(request):
+    """
+    查看日志
+    不带 cursor 时返回最新的 lines 条记录（最新的在前）；
+    带 cursor 时返回游标之后的新记录（按时间顺序），follow=1 时没有新记录会等待最多 timeout 秒（不超过 max_wait）；
+    level/module/symbol 过滤日志级别（最低级别）、模块名和交易对；
+    返回的 cursor 用于下一次请求
+    """
+    path = _log_path()
+    if not os.path.exists(path):
+        return Response({'message': '日志文件不存在'}, status=status.HTTP_404_NOT_FOUND)
+
+    limit = _int_param(request, 'lines', 200, MAX_LINES)
+    accept = _record_filter(request)
+    cursor = request.query_params.get('cursor')
+
+    try:
+        if cursor:
+            if request.query_params.get('follow') in ('1', 'true'):
+                timeout = _int_param(request, 'timeout', MAX_WAIT, MAX_WAIT)
+                records, cursor = _wait_for_records(path, cursor, accept, limit, timeout)
+            else:
+                records, cursor = read_records_since(path, cursor, limit=limit, accept=accept)
+            return Response({'records': records, 'cursor': cursor}, status=status.HTTP_200_OK)
+
+        records, cursor, truncated = tail_records(path, limit=limit, accept=accept, max_scan_bytes=MAX_SCAN_BYTES)
+        return Response({'records': records, 'cursor': cursor, 'truncated': truncated}, status=status.HTTP_200_OK)
+    except ValueError as e:
+        return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+# 日志实时推送接口（Server-Sent Events）
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def log_stream(request):
+    """
+    以 SSE 推送新写入的日志记录，每个事件的 id 为游标，断线后可用 Last-Event-ID 或 cursor 参数继续；
+    连接最长保持 stream_duration 秒（WSGI 下占用一个工作线程），客户端（EventSource）在 retry 毫秒后自动重连
+    """
+    path = _log_path()
+    if not os.path.exists(path):
+        return Response({'message': '日志文件不存在'}, status=status.HTTP_404_NOT_FOUND)
+
+    accept = _record_filter(request)
+    cursor = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('cursor') \
+        or make_cursor(path, os.path.getsize(path))
+
+    def events(cursor):
+        deadline = time.monotonic() + STREAM_DURATION
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        idle_since = time.monotonic()
+        while time.monotonic() < deadline:
+            try:
+                records, cursor = read_records_since(path, cursor, limit=MAX_LINES, accept=accept)
+            except (OSError, ValueError) as e:
+                yield f"event: error\ndata: {json.dumps({'message': str(e)}, ensure_ascii=False)}\n\n"
+                return
+            for record in records:
+                yield f"id: {cursor}\ndata: {json.dumps(record, ensure_ascii=False)}\n\n"
+            if records:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= 15:
+                # 心跳，避免代理断开空闲连接
+                yield ": keep-alive\n\n"
+                idle_since = time.monotonic()
+            time.sleep(POLL_INTERVAL)
+
+    response = StreamingHttpResponse(events(cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,18 +1,163 @@
-from django.utils import timezone
+from asgiref.sync import markcoroutinefunction
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse
-from alert.models import stra_Alert, TimeCycle, ContractCode, OrderRecord, Strategy
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 import json
-from rest_framework.response import Response
 from rest_framework import status
 import logging
 from alert.core.signal_queue import signal_processor
 from alert.core.async_db import async_db_handler
+from alert.core.signal_index import last_signal_index
+from alert.core.ref_cache import ref_cache
+from alert.core.signal_intake import SignalIntake
+from alert.core.signal_dedup import signal_dedup
+from alert.core.signal_envelope import SignalEnvelope, to_fixed_price
 
 logger = logging.getLogger(__name__)
 
+# 默认的 webhook 密钥
+WEBHOOK_SECRET_KEY = "senaiqijdaklsdjadhjaskdjadkasdasdasd"
+
+
+class SignalPayloadError(Exception):
+    """信号数据无效，message 和 status 作为响应返回"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def parse_signal_payload(json_data, local_secret_key=WEBHOOK_SECRET_KEY):
+    """
+    校验密钥并提取信号字段
+    :param json_data: 解析后的 JSON 数据
+    :return: 信号字段字典
+    :raises SignalPayloadError: 密钥错误或字段无效
+    """
+    if not isinstance(json_data, dict):
+        raise SignalPayloadError('无效的JSON数据')
+
+    # 验证密钥
+    if json_data.get('secretkey') != local_secret_key:
+        raise SignalPayloadError('信号无效请重试', status=300)
+
+    return parse_signal_fields(json_data)
+
+
+def parse_signal_fields(json_data):
+    """
+    提取信号字段（不校验密钥）
+    :raises SignalPayloadError: 字段无效
+    """
+    if not isinstance(json_data, dict):
+        raise SignalPayloadError('无效的JSON数据')
+
+    try:
+        contract_type = int(json_data.get('contractType'))  # 确保合约类型是整数
+        strategy_id = int(json_data.get('strategy_id'))
+    except (ValueError, TypeError):
+        raise SignalPayloadError('contractType 或 strategy_id 无效')
+
+    # 价格转换为定点数
+    price = json_data.get('price')
+    try:
+        price_fp = to_fixed_price(price)
+    except ValueError:
+        raise SignalPayloadError(f'价格无效: {price}')
+
+    return {
+        'alert_title': json_data.get('alert_title'),
+        'symbol': json_data.get('symbol'),
+        'scode': json_data.get('scode'),
+        'contractType': contract_type,
+        'price': price,
+        'price_fp': price_fp,
+        'strategy_id': strategy_id,
+        'action': json_data.get('action'),
+        'time_circle': json_data.get('time_circle'),
+    }
+
+
+def build_alert(payload, time_circle_instance, strategy_instance):
+    """根据信号字段创建信号对象，status默认为False，表示无效"""
+    return SignalEnvelope(
+        alert_title=payload['alert_title'],
+        symbol=payload['symbol'],
+        scode=payload['scode'],
+        contract_type=payload['contractType'],
+        price_fp=payload['price_fp'],
+        action=payload['action'],
+        time_circle_id=time_circle_instance.pk,
+        strategy_id=strategy_instance.pk,
+    )
+
+
+def filter_and_queue_signal(alert):
+    """
+    过滤信号，有效信号加入处理队列（不保存）
+    :return: (是否有效, 原因)
+    """
+    # 检查信号是否有效（避免重复处理相同方向的信号）
+    from alert.view.filter_signal import filter_trade_signal
+    response = filter_trade_signal(alert)
+
+    if response.status_code == status.HTTP_200_OK:
+        # 信号有效，设置状态为True
+        alert.status = True
+        logger.info(f"信号有效，状态设置为True: {alert.symbol} {alert.action}")
+
+        # 异步处理有效信号（添加到处理队列）
+        # 注意：这里我们直接将信号添加到处理队列，因为信号处理器会在单独的线程中处理
+        signal_processor.add_signal(alert)
+        logger.info(f"信号已添加到处理队列: {alert.symbol} {alert.action}")
+        reason = None
+    else:
+        # 信号无效，状态保持默认的False；无效信号同样会保存，作为之后重复判断的前一个信号
+        last_signal_index.record(alert.scode, alert.time_circle_id, alert.action, alert.created_at)
+        reason = response.data.get('message', '未知原因')
+        logger.warning(f"信号无效，状态保持为False: {alert.symbol} {alert.action}, 原因: {reason}")
+    return alert.status, reason
+
+
+def accept_signal(alert):
+    """
+    过滤信号，有效信号加入处理队列，所有信号异步保存
+    :return: (是否有效, 原因)
+    """
+    valid, reason = filter_and_queue_signal(alert)
+
+    # 异步保存信号
+    # async_save 返回时信号已写入预写日志（落盘方式见 ASYNC_DB_CONFIG['journal_sync']），此时即可确认接收
+    kind = '有效' if alert.status else '无效'
+    if async_db_handler.async_save(alert):
+        logger.info(f"异步保存{kind}信号: {alert.symbol} {alert.action}")
+    else:
+        logger.error(f"保存{kind}信号失败: {alert.symbol} {alert.action}")
+    return valid, reason
+
+
+# 异步 webhook 接收的信号由接收线程按到达顺序处理（线程在第一个请求时启动）
+signal_intake = SignalIntake(accept_signal)
+
+
+def _signal_result(status_code, result_status, message):
+    """
+    信号的处理结果，三个 webhook 都以这个格式写入幂等缓存，重发到其他接口时也能读取
+    :param result_status: accepted、filtered 或 received（异步接收，尚未过滤）
+    """
+    return {'status_code': status_code, 'status': result_status, 'message': message}
+
+
+def _duplicate_response(cached):
+    """重复信号直接返回第一次的结果"""
+    if cached is signal_dedup.IN_PROGRESS:
+        return HttpResponse('重复信号，之前的相同信号正在处理', status=202)
+    return HttpResponse(cached['message'], status=cached['status_code'])
+
+
 @csrf_exempt
-def webhook(request, local_secret_key="senaiqijdaklsdjadhjaskdjadkasdasdasd"):
+def webhook(request, local_secret_key=WEBHOOK_SECRET_KEY):
     if request.method == 'POST':
         try:
             # 从POST请求中获取JSON数据
@@ -20,92 +165,45 @@ def webhook(request, local_secret_key="senaiqijdaklsdjadhjaskdjadkasdasdasd"):
             if not data:
                 return HttpResponse('没有数据接收到', status=400)
 
-            # 解析JSON数据
+            # 解析JSON数据并校验密钥
             json_data = json.loads(data)
-            secretkey = json_data.get('secretkey')
+            payload = parse_signal_payload(json_data, local_secret_key)
 
-            # 验证密钥
-            if secretkey != local_secret_key:
-                return HttpResponse('信号无效请重试', status=300)
+            # 重发的相同信号直接返回第一次的结果，不再执行数据库和策略操作
+            dedup_key = signal_dedup.make_key(json_data)
+            is_new, cached = signal_dedup.claim(dedup_key)
+            if not is_new:
+                logger.warning(f"收到重复信号: {payload['symbol']} {payload['action']}，返回之前的结果")
+                return _duplicate_response(cached)
 
             logger.info("信号接收成功，开始处理")
+            logger.info(f"处理交易信号: symbol={payload['symbol']}, action={payload['action']}, "
+                        f"contractType={payload['contractType']}, price={payload['price']}")
 
-            # 获取信号数据
-            alert_title1 = json_data.get('alert_title')
-            alert_symbol = json_data.get('symbol')
-            alert_scode = json_data.get('scode')
-            alert_contractType = int(json_data.get('contractType'))  # 确保合约类型是整数
-            alert_price = json_data.get('price')
-            alert_strategy_id = int(json_data.get('strategy_id'))
-            # 确保价格保由5位小数精度
-            try:
-                alert_price = float(alert_price)
-                # alert_price = round(alert_price, 5)
-            except (ValueError, TypeError):
-                pass
-
-            
-            
-
-            alert_action = json_data.get('action')
-            time_circle_name = json_data.get('time_circle')
-
-            logger.info(f"处理交易信号: symbol={alert_symbol}, action={alert_action}, contractType={alert_contractType}, price={alert_price}")
+            # 从参考数据缓存获取（或创建）对应的 TimeCycle 实例
+            time_circle_instance = ref_cache.time_cycle(payload['time_circle'])
 
-            # 查询或创建对应的 TimeCycle 实例
-            time_circle_instance, created = TimeCycle.objects.get_or_create(name=time_circle_name)
-            
             # 获取对应的 Strategy 实例
+            strategy_instance = ref_cache.strategy(payload['strategy_id'])
+            if strategy_instance is None:
+                signal_dedup.release(dedup_key)
+                logger.error(f"策略ID {payload['strategy_id']} 不存在")
+                return HttpResponse(f"策略ID {payload['strategy_id']} 不存在", status=400)
+
             try:
-                strategy_instance = Strategy.objects.get(id=alert_strategy_id)
-            except Strategy.DoesNotExist:
-                logger.error(f"策略ID {alert_strategy_id} 不存在")
-                return HttpResponse(f'策略ID {alert_strategy_id} 不存在', status=400)
-
-            # 创建信号对象
-            trading_view_alert_data = stra_Alert(
-                alert_title=alert_title1,
-                symbol=alert_symbol,
-                scode=alert_scode,
-                contractType=alert_contractType,
-                price=alert_price,
-                action=alert_action,
-                created_at=timezone.now(),
-                time_circle=time_circle_instance,
-                strategy=strategy_instance,  # 使用Strategy实例而不是ID值
-                # status默认为False，表示无效
-            )
-            
-            # 检查信号是否有效（避免重复处理相同方向的信号）
-            from alert.view.filter_signal import filter_trade_signal
-            response = filter_trade_signal(trading_view_alert_data)
-            
-            if response.status_code == status.HTTP_200_OK:
-                # 信号有效，设置状态为True
-                trading_view_alert_data.status = True
-                logger.info(f"信号有效，状态设置为True: {alert_symbol} {alert_action}")
-                
-                
-                # 异步处理有效信号（添加到处理队列）
-                # 注意：这里我们直接将信号添加到处理队列，因为信号处理器会在单独的线程中处理
-                signal_processor.add_signal(trading_view_alert_data)
-                logger.info(f"信号已添加到处理队列: {alert_symbol} {alert_action}")
-                
-                # 异步保存有效信号
-                async_db_handler.async_save(trading_view_alert_data)
-                logger.info(f"异步保存有效信号: {alert_symbol} {alert_action}")
-                
-                return HttpResponse('信号已接收并加入处理队列', status=200)
+                valid, reason = accept_signal(build_alert(payload, time_circle_instance, strategy_instance))
+            except Exception:
+                signal_dedup.release(dedup_key)
+                raise
+            if valid:
+                result = _signal_result(200, 'accepted', '信号已接收并加入处理队列')
             else:
-                # 信号无效，状态保持默认的False
-                logger.warning(f"信号无效，状态保持为False: {alert_symbol} {alert_action}, 原因: {response.data.get('message', '未知原因')}")
-                
-                # 异步保存无效信号
-                async_db_handler.async_save(trading_view_alert_data)
-                logger.info(f"异步保存无效信号: {alert_symbol} {alert_action}")
-                
-                return HttpResponse(f"信号已接收但未加入处理队列: {response.data.get('message', '未知原因')}", status=200)
+                result = _signal_result(200, 'filtered', f"信号已接收但未加入处理队列: {reason}")
+            signal_dedup.complete(dedup_key, result)
+            return HttpResponse(result['message'], status=result['status_code'])
 
+        except SignalPayloadError as e:
+            return HttpResponse(e.message, status=e.status)
         except json.JSONDecodeError:
             logger.error("JSON解析错误")
             return HttpResponse('无效的JSON数据', status=400)
@@ -114,3 +212,170 @@ def webhook(request, local_secret_key="senaiqijdaklsdjadhjaskdjadkasdasdasd"):
             return HttpResponse('处理信号时发生错误', status=500)
 
     return HttpResponse('不支持的请求方法', status=405)
+
+
+# Django 4.1 的 csrf_exempt 返回同步的包装函数，用 markcoroutinefunction 标记后仍按异步视图调用
+@markcoroutinefunction
+@csrf_exempt
+async def webhook_async(request, local_secret_key=WEBHOOK_SECRET_KEY):
+    """
+    异步 webhook（在 ASGI 服务器如 uvicorn、daphne 下运行）
+    只解析和校验请求，参考数据从缓存读取，信号交给接收线程处理后立即返回 202，
+    过滤结果不在响应中返回
+    """
+    if request.method != 'POST':
+        return HttpResponse('不支持的请求方法', status=405)
+
+    try:
+        data = request.body.decode('utf-8')
+        if not data:
+            return HttpResponse('没有数据接收到', status=400)
+
+        json_data = json.loads(data)
+        payload = parse_signal_payload(json_data, local_secret_key)
+
+        dedup_key = signal_dedup.make_key(json_data)
+        is_new, cached = signal_dedup.claim(dedup_key)
+        if not is_new:
+            logger.warning(f"收到重复信号: {payload['symbol']} {payload['action']}，返回之前的结果")
+            return _duplicate_response(cached)
+
+        try:
+            time_circle_instance = await ref_cache.atime_cycle(payload['time_circle'])
+            strategy_instance = await ref_cache.astrategy(payload['strategy_id'])
+        except Exception:
+            signal_dedup.release(dedup_key)
+            raise
+        if strategy_instance is None:
+            signal_dedup.release(dedup_key)
+            logger.error(f"策略ID {payload['strategy_id']} 不存在")
+            return HttpResponse(f"策略ID {payload['strategy_id']} 不存在", status=400)
+
+        alert = build_alert(payload, time_circle_instance, strategy_instance)
+        if not signal_intake.submit(alert):
+            signal_dedup.release(dedup_key)
+            return HttpResponse('信号接收队列已满，请稍后重试', status=503)
+
+        signal_dedup.complete(dedup_key, _signal_result(202, 'received', '信号已接收'))
+        logger.info(f"信号已接收: symbol={payload['symbol']}, action={payload['action']}")
+        return HttpResponse('信号已接收', status=202)
+
+    except SignalPayloadError as e:
+        return HttpResponse(e.message, status=e.status)
+    except json.JSONDecodeError:
+        logger.error("JSON解析错误")
+        return HttpResponse('无效的JSON数据', status=400)
+    except Exception as e:
+        logger.error(f"处理信号时发生错误: {str(e)}")
+        return HttpResponse('处理信号时发生错误', status=500)
+
+
+
+@csrf_exempt
+def webhook_batch(request, local_secret_key=WEBHOOK_SECRET_KEY):
+    """
+    批量 webhook
+    请求体为 {"secretkey": "...", "signals": [信号, ...]}，或信号数组（密钥取第一个信号的 secretkey）；
+    密钥只校验一次，时间周期和策略在批次内共享查询，信号按数组顺序过滤和入队，所有信号一次保存
+    :return: 每个信号的处理结果 {"results": [{"index", "symbol", "action", "status", "message"}]}，
+             status 为 accepted（有效并加入处理队列）、filtered（被策略过滤）或 error（数据无效）；
+             重复信号返回第一次的 status 和 message 并带 duplicate，第一次由异步接口接收时 status 为 received
+    """
+    if request.method != 'POST':
+        return HttpResponse('不支持的请求方法', status=405)
+
+    claimed = []    # 已登记的 (幂等键, 结果)
+    try:
+        data = request.body.decode('utf-8')
+        if not data:
+            return HttpResponse('没有数据接收到', status=400)
+        json_data = json.loads(data)
+
+        if isinstance(json_data, dict):
+            secretkey = json_data.get('secretkey')
+            items = json_data.get('signals')
+        elif isinstance(json_data, list) and json_data and isinstance(json_data[0], dict):
+            secretkey = json_data[0].get('secretkey')
+            items = json_data
+        else:
+            return HttpResponse('无效的JSON数据', status=400)
+
+        if secretkey != local_secret_key:
+            return HttpResponse('信号无效请重试', status=300)
+        if not isinstance(items, list) or not items:
+            return HttpResponse('没有数据接收到', status=400)
+        max_size = getattr(settings, 'WEBHOOK_BATCH_MAX_SIZE', 200)
+        if len(items) > max_size:
+            return HttpResponse(f'每批最多 {max_size} 个信号', status=400)
+
+        logger.info(f"批量信号接收成功，共 {len(items)} 个信号，开始处理")
+
+        # 先校验所有信号，时间周期和策略在批次内只查询一次
+        time_cycles = {}
+        strategies = {}
+        results = []
+        alerts = []
+        for index, item in enumerate(items):
+            result = {'index': index}
+            results.append(result)
+            try:
+                payload = parse_signal_fields(item)
+            except SignalPayloadError as e:
+                result.update(status='error', message=e.message)
+                continue
+            result.update(symbol=payload['symbol'], action=payload['action'])
+
+            # 重发的相同信号（包括同一批次中的重复项）返回第一次的结果
+            dedup_key = signal_dedup.make_key(item)
+            is_new, cached = signal_dedup.claim(dedup_key)
+            if not is_new:
+                if cached is signal_dedup.IN_PROGRESS:
+                    result.update(status='duplicate', message='重复信号，之前的相同信号正在处理')
+                else:
+                    result.update(status=cached['status'], message=cached['message'], duplicate=True)
+                continue
+
+            if payload['strategy_id'] not in strategies:
+                strategies[payload['strategy_id']] = ref_cache.strategy(payload['strategy_id'])
+            strategy_instance = strategies[payload['strategy_id']]
+            if strategy_instance is None:
+                signal_dedup.release(dedup_key)
+                result.update(status='error', message=f"策略ID {payload['strategy_id']} 不存在")
+                continue
+            if payload['time_circle'] not in time_cycles:
+                time_cycles[payload['time_circle']] = ref_cache.time_cycle(payload['time_circle'])
+
+            claimed.append((dedup_key, result))
+            alerts.append((result, build_alert(payload, time_cycles[payload['time_circle']], strategy_instance)))
+
+        # 按数组顺序过滤和入队，同一批次中的重复信号也能识别
+        for result, alert in alerts:
+            valid, reason = filter_and_queue_signal(alert)
+            if valid:
+                result.update(status='accepted', message='信号已接收并加入处理队列')
+            else:
+                result.update(status='filtered', message=f"信号已接收但未加入处理队列: {reason}")
+
+        # 所有信号一次保存
+        saved = async_db_handler.async_save_many([alert for _, alert in alerts])
+        for (result, alert), ok in zip(alerts, saved):
+            if not ok:
+                logger.error(f"保存信号失败: {alert.symbol} {alert.action}")
+                result['saved'] = False
+
+        for dedup_key, result in claimed:
+            signal_dedup.complete(dedup_key, _signal_result(200, result['status'], result['message']))
+
+        accepted = sum(1 for result in results if result['status'] == 'accepted')
+        logger.info(f"批量信号处理完成: {accepted}/{len(items)} 个信号加入处理队列")
+        return JsonResponse({'results': results}, status=200, json_dumps_params={'ensure_ascii': False})
+
+    except json.JSONDecodeError:
+        logger.error("JSON解析错误")
+        return HttpResponse('无效的JSON数据', status=400)
+    except Exception as e:
+        for dedup_key, result in claimed:
+            if 'status' not in result:
+                signal_dedup.release(dedup_key)
+        logger.error(f"处理批量信号时发生错误: {str(e)}")
+        return HttpResponse('处理信号时发生错误', status=500)
@@ -1,30 +1,346 @@
+import atexit
 import logging
+import mmap
 import os
-from logging.handlers import RotatingFileHandler
-from collections import deque
-from datetime import datetime
+import queue
+import re
+import threading
+import time
+import traceback
+from logging.handlers import QueueHandler, RotatingFileHandler
+
 
 class ReverseLogHandler(RotatingFileHandler):
-    def __init__(self, filename, mode='a', maxBytes=0, backupCount=0, encoding=None, delay=False):
-        super().__init__(filename, mode, maxBytes, backupCount, encoding, delay)
-        self.buffer = deque(maxlen=1000)  # 保存最近1000条日志
-        
-    def emit(self, record):
+    """
+    日志处理器
+    日志按正常顺序追加写入，每条记录只写一次，maxBytes/backupCount 轮转生效；
+    倒序读取（最新的在前）使用 tail_records，从文件末尾用 mmap 往前查找，不需要额外的索引
+    """
+
+    def handle_batch(self, records):
         """
-        重写emit方法，实现倒序写入日志
+        写入一批日志记录，整批只 flush 一次
         """
+        self.acquire()
         try:
-            # 将新日志添加到缓冲区开头
-            msg = self.format(record)
-            self.buffer.appendleft(msg)
-            
-            # 将整个缓冲区写入文件
-            with open(self.baseFilename, 'w', encoding=self.encoding) as f:
-                for line in self.buffer:
-                    f.write(line + '\n')
-                    
-        except Exception as e:
-            self.handleError(record)
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.flush()
+            offset = os.fstat(self.stream.fileno()).st_size
+            for record in records:
+                if not self.filter(record):
+                    continue
+                try:
+                    data = self.format(record) + self.terminator
+                    size = len(data.encode(self.encoding or 'utf8'))
+                    if self.maxBytes > 0 and offset > 0 and offset + size >= self.maxBytes:
+                        self.stream.flush()
+                        self.doRollover()
+                        if self.stream is None:
+                            self.stream = self._open()
+                        offset = os.fstat(self.stream.fileno()).st_size
+                    self.stream.write(data)
+                    offset += size
+                except Exception:
+                    self.handleError(record)
+            self.stream.flush()
+        finally:
+            self.release()
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    非阻塞日志处理器
+    调用方线程只把 LogRecord 放入有界队列（不格式化消息），由一个写入线程批量格式化并交给
+    sink 日志记录器（如 order7.logwriter）上配置的处理器写入；
+    队列接近满时先丢弃 DEBUG 记录，满了以后丢弃所有新记录，丢弃数量可通过 stats() 查看
+    注意：消息参数在写入线程中才格式化，参数对象在记录日志后不应再被修改
+    """
+
+    def __init__(self, sink, queue_size=10000, debug_threshold=0.8, batch_size=256, drop_report_interval=10):
+        """
+        :param sink: 实际写入日志的记录器名称，该记录器应设置 propagate=False
+        :param queue_size: 队列容量
+        :param debug_threshold: 队列使用率达到该比例后丢弃 DEBUG 记录
+        :param batch_size: 写入线程每批最多处理的记录数
+        :param drop_report_interval: 丢弃日志时，写入线程报告丢弃数量的最小间隔（秒）
+        """
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.sink = sink
+        self.debug_limit = int(queue_size * debug_threshold)
+        self.batch_size = batch_size
+        self.drop_report_interval = drop_report_interval
+        self.dropped = {}    # 日志级别名称 -> 丢弃数量
+        self._dropped_lock = threading.Lock()
+        self._reported_dropped = 0
+        self._last_report = 0
+        self._should_run = True
+        self._thread = threading.Thread(target=self._run, name="LogWriter")
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.stop)
+
+    @property
+    def dropped_count(self):
+        with self._dropped_lock:
+            return sum(self.dropped.values())
+
+    def stats(self):
+        """
+        :return: {'queued': 队列中的记录数, 'dropped': 丢弃总数, 'dropped_by_level': {级别: 数量}}
+        """
+        with self._dropped_lock:
+            dropped = dict(self.dropped)
+        return {'queued': self.queue.qsize(), 'dropped': sum(dropped.values()), 'dropped_by_level': dropped}
+
+    def _drop(self, record):
+        with self._dropped_lock:
+            self.dropped[record.levelname] = self.dropped.get(record.levelname, 0) + 1
+
+    def prepare(self, record):
+        """不在调用方线程格式化消息，原样放入队列"""
+        return record
+
+    def enqueue(self, record):
+        if record.levelno <= logging.DEBUG and self.queue.qsize() >= self.debug_limit:
+            self._drop(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._drop(record)
+
+    def _collect(self):
+        """阻塞等待第一条记录，然后取出队列中已有的记录，最多 batch_size 条"""
+        try:
+            batch = [self.queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch(self, batch):
+        for handler in logging.getLogger(self.sink).handlers:
+            records = [record for record in batch if record.levelno >= handler.level]
+            if not records:
+                continue
+            if hasattr(handler, 'handle_batch'):
+                handler.handle_batch(records)
+            else:
+                for record in records:
+                    handler.handle(record)
+
+    def _report_dropped(self):
+        """有日志被丢弃时，按间隔写入一条警告"""
+        dropped = self.dropped_count
+        now = time.monotonic()
+        if dropped == self._reported_dropped or now - self._last_report < self.drop_report_interval:
+            return
+        record = logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0,
+            "日志队列已满，丢弃了 %d 条日志（累计 %d 条）", (dropped - self._reported_dropped, dropped), None
+        )
+        self._reported_dropped = dropped
+        self._last_report = now
+        self._dispatch([record])
+
+    def _run(self):
+        while self._should_run or not self.queue.empty():
+            batch = self._collect()
+            try:
+                if batch:
+                    self._dispatch(batch)
+                self._report_dropped()
+            except Exception:
+                # 写入线程不能退出，错误输出到 stderr
+                traceback.print_exc()
+
+    def stop(self, timeout=5):
+        """停止写入线程，写完队列中剩余的记录"""
+        if not self._should_run:
+            return
+        self._should_run = False
+        self._thread.join(timeout=timeout)
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+# verbose 格式: {levelname} {asctime} {module} {process:d} {thread:d} {message}
+RECORD_PATTERN = re.compile(
+    r'^(?P<level>DEBUG|INFO|WARNING|ERROR|CRITICAL) '
+    r'(?P<time>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) '
+    r'(?P<module>\S+) (?P<process>\d+) (?P<thread>\d+) (?P<message>.*)$',
+    re.S
+)
+TAIL_BLOCK_SIZE = 64 * 1024
+
+
+def parse_record(text):
+    """
+    解析一条 verbose 格式的日志记录
+    :return: {'level', 'time', 'module', 'message'}，无法解析时 level 和 module 为 None
+    """
+    match = RECORD_PATTERN.match(text)
+    if not match:
+        return {'level': None, 'time': None, 'module': None, 'message': text}
+    return {
+        'level': match.group('level'),
+        'time': match.group('time'),
+        'module': match.group('module'),
+        'message': match.group('message'),
+    }
+
+
+def make_record_filter(level=None, module=None, symbol=None):
+    """
+    创建日志记录过滤函数
+    :param level: 最低日志级别名称，如 INFO
+    :param module: 模块名（完全匹配）
+    :param symbol: 交易对，消息中包含即匹配（不区分大小写）
+    """
+    min_level = logging.getLevelName(level.upper()) if level else None
+    if not isinstance(min_level, int):
+        min_level = None
+    symbol = symbol.upper() if symbol else None
+
+    def accept(record):
+        if min_level is not None:
+            record_level = logging.getLevelName(record['level']) if record['level'] else None
+            if not isinstance(record_level, int) or record_level < min_level:
+                return False
+        if module and record['module'] != module:
+            return False
+        if symbol and symbol not in record['message'].upper():
+            return False
+        return True
+    return accept
+
+
+def _file_id(path):
+    """日志文件标识（inode），轮转后会变化"""
+    return os.stat(path).st_ino
+
+
+def make_cursor(path, offset):
+    return f"{_file_id(path)}:{offset}"
+
+
+def parse_cursor(path, cursor):
+    """
+    解析游标
+    :return: 在当前日志文件中的起始位置；文件已轮转（inode 不同）时从头开始
+    """
+    try:
+        file_id, offset = cursor.split(':', 1)
+        offset = int(offset)
+    except (AttributeError, ValueError):
+        raise ValueError(f"无效的游标: {cursor}")
+    if int(file_id) != _file_id(path) or offset > os.path.getsize(path):
+        return 0
+    return offset
+
+
+def _iter_lines_reverse(mm, end, stop):
+    """
+    从 end 往前逐行遍历 mmap 中的内容，直到 stop
+    每次用 rfind 在 [stop, pos) 范围内向前查找上一个换行符，只访问需要的页
+    :return: 生成 (行起始位置, 行内容字节)，行内容不含换行符
+    """
+    pos = end
+    while pos > stop:
+        newline = mm.rfind(b'\n', stop, pos - 1)
+        start = newline + 1 if newline >= 0 else stop
+        yield start, mm[start:pos - 1]
+        pos = start
+
+
+def tail_records(path, limit=200, accept=None, max_scan_bytes=32 * 1024 * 1024, encoding='utf8'):
+    """
+    从文件末尾倒序读取最新的日志记录
+    使用 mmap 从后往前查找换行，只读取需要的部分，耗时与文件大小无关；
+    不以日志级别开头的行（如异常堆栈）归入前一条记录
+    :param limit: 最多返回的记录数
+    :param accept: 过滤函数，参数为 parse_record 的结果
+    :param max_scan_bytes: 最多扫描的字节数，过滤条件很少匹配时限制开销
+    :return: (记录列表（最新的在前），游标，是否因扫描上限而提前结束)
+    """
+    if not os.path.exists(path):
+        return [], None, False
+    if os.path.getsize(path) == 0:
+        return [], make_cursor(path, 0), False
+
+    records = []
+    truncated = False
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # 最后一行可能还没写完，只读到最后一个换行符
+            end = mm.rfind(b'\n') + 1
+            cursor = make_cursor(path, end)
+            stop = max(end - max_scan_bytes, 0)
+            continuation = []     # 当前记录的续行（倒序）
+            for start, raw in _iter_lines_reverse(mm, end, stop):
+                line = raw.decode(encoding, errors='replace')
+                if not RECORD_PATTERN.match(line) and start > 0:
+                    continuation.append(line)
+                    if start == stop:
+                        truncated = True
+                    continue
+                record = parse_record('\n'.join([line] + continuation[::-1]))
+                continuation = []
+                if accept is None or accept(record):
+                    records.append(record)
+                    if len(records) >= limit:
+                        break
+                if start == stop and stop > 0:
+                    truncated = True
+    return records, cursor, truncated
+
+
+def read_records_since(path, cursor, limit=1000, accept=None, max_bytes=1024 * 1024, encoding='utf8'):
+    """
+    读取游标之后新写入的日志记录（按时间顺序）
+    :return: (记录列表, 新游标)
+    """
+    offset = parse_cursor(path, cursor)
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(max_bytes)
+    # 只处理完整的行，未写完的行留到下次读取
+    complete = data.rfind(b'\n') + 1
+    data = data[:complete]
+
+    records = []
+    consumed = 0
+    current = None
+    position = 0
+    for line in data.decode(encoding, errors='replace').split('\n')[:-1]:
+        line_bytes = len(line.encode(encoding)) + 1
+        if RECORD_PATTERN.match(line) or current is None:
+            if current is not None:
+                record = parse_record(current)
+                if accept is None or accept(record):
+                    records.append(record)
+                consumed = position
+                if len(records) >= limit:
+                    current = None
+                    break
+            current = line
+        else:
+            current += '\n' + line
+        position += line_bytes
+    if current is not None:
+        record = parse_record(current)
+        if accept is None or accept(record):
+            records.append(record)
+        consumed = position
+    return records, make_cursor(path, offset + consumed)
+
 
 def setup_logger(name='alert', log_file='order7.log', level=logging.DEBUG):
     """
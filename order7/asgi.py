@@ -3,6 +3,10 @@ ASGI config for order7 project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+异步 webhook (/webhook/async/) 需要在 ASGI 服务器下运行，例如:
+    uvicorn order7.asgi:application --host 0.0.0.0 --port 8000
+    daphne order7.asgi:application
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
@@ -12,5 +16,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'order7.settings')
+# 标记为服务进程，应用启动时预热交易接口、订阅账户推送并预热信号索引
+os.environ.setdefault('ORDER7_SERVER_PROCESS', 'asgi')
 
 application = get_asgi_application()
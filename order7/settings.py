@@ -205,6 +205,12 @@ ORDER_MANAGEMENT = {
         'retry_interval': 5,    # 订单重试间隔(秒)
         'cancel_timeout': 60,  # 撤单触发超时时间(秒)
         'max_retries': 2,      # 最大重试次数
+        'attach_stop_loss': False,  # 开仓时是否与止损单一起提交（normalTpsl分组）
+        # 超时撤单方式：client（本地撤单）或 server（交易所定时撤单，本地对账兜底）
+        # 定时撤单会撤销账户全部挂单，下单前自动清除；交易所每天最多执行10次定时撤单（UTC 0点重置），超出后只能本地撤单
+        'expiry_mode': 'client',
+        'server_expiry_tolerance': 5,  # 订单超时时间相差在此范围内(秒)时共用最早的定时撤单时间
+        'server_expiry_grace': 5,   # 交易所定时撤单后本地兜底撤单的宽限时间(秒)
     },
 }
 
@@ -214,13 +220,49 @@ ORDER_MONITOR_CONFIG = {
     'normal_interval': 10,      # 正常检查间隔（秒）
     'intensive_interval': 3,    # 密集检查间隔（秒）
     'intensive_threshold': 10,  # 开始密集检查的剩余时间阈值（秒）
-    'max_concurrent': 20,       # 最大并发监控数量
+    'worker_threads': 4,        # 执行批量轮询和成交后续处理（下止损单、更新订单详情）的工作线程数（监控数量不设上限）
+    'min_tick_interval': 1,     # 两次批量轮询之间的最小间隔（秒）
+    'push_updates': True,       # 是否订阅账户推送（orderUpdates/userFills/userEvents）
+    'reconcile_interval': 30,   # 推送可用时的对账轮询间隔（秒）
     'batch_size': 50,          # 批量查询订单数量
 }
 
 # 信号队列配置
 SIGNAL_QUEUE_MAX_WORKERS = 10  # 最大线程数
 SIGNAL_QUEUE_MAX_SIZE = 1000  # 队列最大容量
+SIGNAL_LANE_DEPTH_WARNING = 10  # 单个交易对通道积压超过此数量时告警
+SIGNAL_LANE_IDLE_TIMEOUT = 600  # 交易对通道闲置超过此时间（秒）且没有积压时删除，0 表示不删除
+SIGNAL_INDEX_WARM_DAYS = 7  # 启动时预热最近信号索引加载的天数，更早的信号按需查询
+SIGNAL_INTAKE_MAX_SIZE = 10000  # 异步webhook接收队列容量，队满时返回503
+WEBHOOK_BATCH_MAX_SIZE = 200  # 批量webhook每个请求最多包含的信号数
+SIGNAL_DEDUP_MAX_SIZE = 10000  # 信号幂等缓存最多记录的信号数
+SIGNAL_DEDUP_TTL = 600  # 带显式 id 的信号的幂等缓存有效期（秒），期间重发的相同信号直接返回之前的结果
+SIGNAL_DEDUP_CONTENT_TTL = 30  # 没有显式 id 时按信号内容去重的有效期（秒），只覆盖发送方的重发窗口，之后到达的相同信号按新信号处理
+
+# 异步数据库写入配置
+ASYNC_DB_CONFIG = {
+    'batch_size': 100,          # 每个批次最多提交的对象数量
+    'batch_wait_ms': 50,        # 收集一个批次的最长等待时间（毫秒）
+    'verify_writes': False,     # 调试模式：提交后回读OrderRecord确认写入
+    'max_pending': 10000,       # 内存中最多等待写入的行数，超过后只保存在预写日志中
+    'journal_enabled': True,    # 启用预写日志，重启后重放未写入数据库的数据
+    'journal_path': os.path.join(BASE_DIR, 'data', 'async_db.journal'),  # 预写日志文件路径
+    # 预写日志落盘方式：always 每次保存等待 fsync（最可靠，保存会阻塞在磁盘上）；
+    # interval 后台每 journal_sync_interval_ms 毫秒 fsync 一次，保存不等待，崩溃时最多丢失一个周期；
+    # off 不执行 fsync，只防止进程崩溃
+    'journal_sync': 'interval',
+    'journal_sync_interval_ms': 20,
+    'journal_compact_mb': 8,    # 预写日志超过此大小(MB)且已完成的记录不少于一半时压缩，只保留未完成的记录
+}
+
+# 账户状态(user_state)快照缓存有效期（秒），0表示每次都重新查询
+USER_STATE_CACHE_TTL = 1.0
+
+# 本地成交索引配置
+FILLS_STORE_CONFIG = {
+    'lookback_days': 7,         # 内存中保留的成交天数
+    'min_sync_interval': 1.0,   # 两次增量同步之间的最小间隔（秒）
+}
 
 import os
 
@@ -251,13 +293,26 @@ LOGGING = {
             'backupCount': 5,
             'encoding': 'utf8',
         },
+        # 调用方线程只把日志放入队列，由 LogWriter 线程批量写入 order7.logwriter 的处理器
+        'queue': {
+            'class': 'logs.log.QueueLogHandler',
+            'sink': 'order7.logwriter',
+            'queue_size': 10000,        # 队列容量，满了以后丢弃新日志
+            'debug_threshold': 0.8,     # 队列使用率达到80%后先丢弃DEBUG日志
+            'batch_size': 256,          # 每批最多写入的日志数
+        },
     },
     'loggers': {
         'alert': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': True,
         },
+        'order7.logwriter': {
+            'handlers': ['console', 'file'],
+            'level': 'DEBUG',
+            'propagate': False,
+        },
     },
 }
 
@@ -266,10 +321,22 @@ LOG_DIR = os.path.join(BASE_DIR, 'logs')
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
+# 日志查看接口配置
+LOG_TAIL_CONFIG = {
+    'max_lines': 5000,                      # 每次最多返回的记录数
+    'max_scan_bytes': 32 * 1024 * 1024,     # 倒序读取时最多扫描的字节数
+    'poll_interval': 0.5,                   # 长轮询和SSE检查新日志的间隔（秒）
+    # WSGI 部署下每个等待中的请求都占用一个工作线程，长轮询和SSE只保持很短的时间，客户端再次请求
+    'max_wait': 10,                         # 长轮询最长等待时间（秒）
+    'stream_duration': 15,                  # 单个SSE连接最长保持时间（秒），之后 EventSource 按 retry 重连
+}
+
 try:
     from .conf import *
 except ImportError:
     pass
 
 # WebSocket 配置
-WEBSOCKET_IDLE_TIMEOUT = 60  # WebSocket 闲置超时时间（秒）
+WEBSOCKET_IDLE_TIMEOUT = 0  # WebSocket 闲置超时时间（秒），0 表示保持长连接
+WEBSOCKET_HEARTBEAT_INTERVAL = 30  # 应用层心跳间隔（秒），服务器 60 秒没有收到消息会断开连接
+WEBSOCKET_RECONNECT_MAX_DELAY = 60  # 断线重连的最大退避时间（秒）
@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'order7.settings')
+# 标记为服务进程，应用启动时预热交易接口、订阅账户推送并预热信号索引
+os.environ.setdefault('ORDER7_SERVER_PROCESS', 'wsgi')
 
 application = get_wsgi_application()